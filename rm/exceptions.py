@@ -40,3 +40,25 @@ class NoEmailError(Error):
     """
     We expected an email. We don't have one.
     """
+
+class InvalidIdentifierError(Error):
+    """
+    An uploaded participant identifier isn't one we can accept.
+    """
+
+class InvalidResultsError(Error):
+    """
+    Some rows of uploaded results couldn't be used. The first argument
+    is a list of messages, one per bad row.
+    """
+
+class InvalidCursorError(Error):
+    """
+    A pagination cursor we can't make sense of.
+    """
+
+class TooManyInvitationsError(Error):
+    """
+    More people to invite at once than we'll take. The first argument
+    is the most we will.
+    """
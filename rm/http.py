@@ -3,14 +3,27 @@ Http generics.
 """
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotModified
 from django.utils.decorators import method_decorator
 from django.utils import simplejson
 
+class Download(object):
+    """
+    A file for serve_maybe to serve, along with the strong ETag
+    and filename to send with it.
+    """
+    def __init__(self, path, etag=None, name=None):
+        self.path = path
+        self.etag = etag
+        self.name = name
+
+
 def serve_maybe(meth):
     """
     Decorator to figure out if we want to serve files
     ourselves (DEBUG) or hand off to Nginx
+
+    The decorated method returns either a filename or a Download.
     """
     # Originally from Open Prescribing raw.views
 
@@ -19,7 +32,19 @@ def serve_maybe(meth):
         Internal wrapper function to figure out
         the logic
         """
-        filename = meth(self, *args, **kwargs)
+        download = meth(self, *args, **kwargs)
+        if not isinstance(download, Download):
+            download = Download(download)
+        filename = download.path
+
+        etag = None
+        if download.etag:
+            etag = '"{0}"'.format(download.etag)
+            matches = self.request.META.get('HTTP_IF_NONE_MATCH', '')
+            if etag in [m.strip() for m in matches.split(',')]:
+                resp = HttpResponseNotModified()
+                resp['ETag'] = etag
+                return resp
 
         # When we're running locally, just take the hit, otherwise
         # offload the serving of the datafile to Nginx
@@ -28,13 +53,17 @@ def serve_maybe(meth):
                 open(filename, 'rb').read(),
                 mimetype='application/force-download'
                 )
-            return resp
+        else:
+            resp = HttpResponse()
+            url = '/protected/{0}'.format(filename)
+            # let nginx determine the correct content type
+            resp['Content-Type']=""
+            resp['X-Accel-Redirect'] = url
 
-        resp = HttpResponse()
-        url = '/protected/{0}'.format(filename)
-        # let nginx determine the correct content type
-        resp['Content-Type']=""
-        resp['X-Accel-Redirect'] = url
+        if etag:
+            resp['ETag'] = etag
+        if download.name:
+            resp['Content-Disposition'] = 'attachment; filename={0}'.format(download.name)
         return resp
 
     return handoff
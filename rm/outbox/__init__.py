@@ -0,0 +1,3 @@
+"""
+Durable queue of outbound email
+"""
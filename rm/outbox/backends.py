@@ -0,0 +1,40 @@
+"""
+Django email backend that writes to the outbox.
+
+Set EMAIL_BACKEND to rm.outbox.backends.OutboxBackend and everything
+that sends mail through Django - letter, send_mail(), our own batched
+mailings - queues it instead. The worker then delivers it with
+OUTBOX_EMAIL_BACKEND.
+"""
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from rm.outbox.models import Email
+
+
+class OutboxBackend(BaseEmailBackend):
+    """
+    Queue messages in the outbox rather than sending them.
+    """
+    def send_messages(self, email_messages):
+        """
+        Add EMAIL_MESSAGES to the outbox, as part of the current
+        transaction.
+
+        Callers who ask us to fail silently - Django's error emails to
+        the admins, say - would rather their email went straight out
+        than not at all, so if we can't queue it we send it directly.
+
+        Return: int, the number of messages queued or sent
+        Exceptions: DatabaseError unless fail_silently
+        """
+        if not email_messages:
+            return 0
+        try:
+            return Email.queue(email_messages)
+        except Exception:
+            if not self.fail_silently:
+                raise
+        connection = get_connection(settings.OUTBOX_EMAIL_BACKEND, fail_silently=True)
+        return connection.send_messages(email_messages) or 0
@@ -0,0 +1,77 @@
+"""
+Measure how fast we get email out: one SMTP session per message, as we
+used to, against draining the outbox in batches.
+
+Everything goes to a LocalSMTPServer rather than a real mail server,
+slowed down by --latency seconds per reply to stand in for the network,
+and everything we queue is rolled back at the end.
+"""
+from optparse import make_option
+import time
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rm.outbox import worker
+from rm.outbox.models import Email
+from rm.outbox.smtp import LocalSMTPServer
+
+SMTP = 'django.core.mail.backends.smtp.EmailBackend'
+BODY = 'Please remember to report on your trial today.\n' * 20
+
+
+class Command(BaseCommand):
+    """
+    Our command.
+
+    Nothing special to see here.
+    """
+    option_list = BaseCommand.option_list + (
+        make_option('--messages', '-n', dest='messages', type='int', default=1000),
+        make_option('--batch-size', '-b', dest='batch_size', type='int',
+                    default=worker.BATCH_SIZE),
+        make_option('--latency', '-l', dest='latency', type='float', default=0.002),
+        make_option('--concurrency', '-c', dest='concurrency', default='1,4',
+                    help='Comma separated numbers of connections to try'),
+        )
+
+    def _messages(self, num):
+        return [EmailMultiAlternatives('Bench {0}'.format(i), BODY, 'bench@example.com',
+                                       ['participant{0}@example.com'.format(i)])
+                for i in range(num)]
+
+    def _rate(self, num, elapsed):
+        return '{0:8.3f}s ({1:7.0f} messages per second)'.format(elapsed, num / elapsed)
+
+    @transaction.commit_manually
+    def handle(self, **options):
+        num, batch_size = options['messages'], options['batch_size']
+        levels = [int(c) for c in options['concurrency'].split(',')]
+        smtp = dict(host='127.0.0.1', use_tls=False, username='', password='')
+
+        with LocalSMTPServer(latency=options['latency']) as server:
+            smtp['port'] = server.port
+            print 'Messages:          {0}'.format(num)
+
+            start = time.time()
+            for message in self._messages(num):
+                get_connection(SMTP, **smtp).send_messages([message])
+            print 'One per session:  ', self._rate(num, time.time() - start)
+
+            try:
+                for concurrency in levels:
+                    # So that we only drain our own. This is rolled back too.
+                    Email.objects.all().delete()
+                    start = time.time()
+                    Email.queue(self._messages(num))
+                    queued = time.time() - start
+                    start = time.time()
+                    sent = worker.drain(batch_size, concurrency, SMTP, **smtp)
+                    drained = time.time() - start
+                    print 'Queue:            ', self._rate(num, queued)
+                    print 'Drain x{0:<3}       {1} {2} sent'.format(
+                        concurrency, self._rate(num, drained), sent)
+            finally:
+                transaction.rollback()
+            print 'Received:          {0}'.format(len(server.messages))
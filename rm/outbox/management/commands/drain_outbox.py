@@ -0,0 +1,29 @@
+"""
+Deliver whatever is due in the outbox, now.
+
+Celery does this every minute; this is for when you don't want to wait,
+or aren't running celery.
+"""
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from rm.outbox import worker
+
+class Command(BaseCommand):
+    """
+    Our command.
+
+    Nothing special to see here.
+    """
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', '-b', dest='batch_size', type='int',
+                    default=settings.OUTBOX_BATCH_SIZE),
+        make_option('--concurrency', '-c', dest='concurrency', type='int',
+                    default=settings.OUTBOX_CONCURRENCY),
+        )
+
+    def handle(self, **options):
+        sent = worker.drain(options['batch_size'], options['concurrency'])
+        print 'Sent {0} emails'.format(sent)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'Email'
+        db.create_table(u'outbox_email', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('created', self.gf('django.db.models.fields.DateTimeField')(default=datetime.datetime.now)),
+            ('to', self.gf('django.db.models.fields.TextField')()),
+            ('subject', self.gf('django.db.models.fields.CharField')(max_length=255, blank=True)),
+            ('data', self.gf('django.db.models.fields.TextField')()),
+            ('status', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('attempts', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('next_attempt', self.gf('django.db.models.fields.DateTimeField')(default=datetime.datetime.now, db_index=True)),
+            ('claim', self.gf('django.db.models.fields.CharField')(db_index=True, max_length=32, blank=True)),
+            ('sent', self.gf('django.db.models.fields.DateTimeField')(null=True, blank=True)),
+            ('last_error', self.gf('django.db.models.fields.TextField')(blank=True)),
+        ))
+        db.send_create_signal(u'outbox', ['Email'])
+
+
+    def backwards(self, orm):
+        # Deleting model 'Email'
+        db.delete_table(u'outbox_email')
+
+
+    models = {
+        u'outbox.email': {
+            'Meta': {'object_name': 'Email'},
+            'attempts': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'claim': ('django.db.models.fields.CharField', [], {'db_index': 'True', 'max_length': '32', 'blank': 'True'}),
+            'created': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'data': ('django.db.models.fields.TextField', [], {}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_error': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'next_attempt': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now', 'db_index': 'True'}),
+            'sent': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'status': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'subject': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'}),
+            'to': ('django.db.models.fields.TextField', [], {})
+        }
+    }
+
+    complete_apps = ['outbox']
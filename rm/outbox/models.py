@@ -0,0 +1,165 @@
+"""
+The outbox: every email we send, whether it's gone yet or not.
+
+Emails are written here by rm.outbox.backends.OutboxBackend in the same
+transaction as whatever made us send them, and delivered later by
+rm.outbox.worker. If that transaction rolls back, the email never
+existed; if the mail server is down, it waits here and we try again.
+"""
+import base64
+import copy
+import cPickle as pickle
+import datetime
+import uuid
+
+from django.db import models
+from django.db.models import F
+from django.utils import timezone
+
+LEASE = datetime.timedelta(minutes=10)
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 60
+BACKOFF_MAX = 6 * 60 * 60
+
+
+class Email(models.Model):
+    """
+    One outbound email.
+
+    The message itself is kept pickled, so that we can hand exactly
+    what we were given to the delivering backend.
+    """
+    PENDING = 0
+    SENT    = 1
+    FAILED  = 2
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (SENT,    'Sent'),
+        (FAILED,  'Failed'),
+        )
+
+    created      = models.DateTimeField(default=timezone.now)
+    to           = models.TextField()
+    subject      = models.CharField(max_length=255, blank=True)
+    data         = models.TextField()
+    status       = models.IntegerField(choices=STATUS_CHOICES, default=PENDING)
+    attempts     = models.IntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now, db_index=True)
+    claim        = models.CharField(max_length=32, blank=True, db_index=True)
+    sent         = models.DateTimeField(blank=True, null=True)
+    last_error   = models.TextField(blank=True)
+
+    def __unicode__(self):
+        return u'{0} - {1}'.format(self.to, self.subject)
+
+    @staticmethod
+    def from_message(message):
+        """
+        Return an unsaved outbox entry for the Django EmailMessage
+        MESSAGE.
+
+        Return: Email
+        Exceptions: None
+        """
+        message = copy.copy(message)
+        message.connection = None
+        return Email(to=u', '.join(message.recipients()),
+                     subject=message.subject[:255],
+                     data=base64.b64encode(pickle.dumps(message, pickle.HIGHEST_PROTOCOL)))
+
+    @staticmethod
+    def queue(messages):
+        """
+        Add MESSAGES to the outbox.
+
+        We don't start a transaction of our own, so that we're part of
+        the caller's if they have one.
+
+        Return: int, the number of messages queued
+        Exceptions: None
+        """
+        emails = [Email.from_message(m) for m in messages if m.recipients()]
+        Email.objects.bulk_create(emails)
+        return len(emails)
+
+    @staticmethod
+    def claim_due(size, now=None):
+        """
+        Claim up to SIZE emails that are due for delivery.
+
+        The claim is a conditional update, so two workers can never
+        claim the same email. It lasts for LEASE, after which a worker
+        that died without reporting back loses it.
+
+        Return: list of Email
+        Exceptions: None
+        """
+        now = now or timezone.now()
+        due = Email.objects.filter(status=Email.PENDING, next_attempt__lte=now)
+        pks = list(due.order_by('next_attempt', 'pk').values_list('pk', flat=True)[:size])
+        if not pks:
+            return []
+        token = uuid.uuid4().hex
+        due.filter(pk__in=pks).update(claim=token, next_attempt=now + LEASE)
+        return list(Email.objects.filter(pk__in=pks, claim=token))
+
+    @staticmethod
+    def backoff(attempts):
+        """
+        Return how long to wait before trying an email again once it's
+        failed ATTEMPTS times.
+
+        Return: timedelta
+        Exceptions: None
+        """
+        return datetime.timedelta(
+            seconds=min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX))
+
+    @staticmethod
+    def record(results, now=None):
+        """
+        Record the RESULTS of trying to deliver emails, a sequence of
+        (pk, error) pairs where error is None for those that went.
+
+        Failures are retried after an exponential backoff, until
+        they've had MAX_ATTEMPTS.
+
+        Return: int, the number sent
+        Exceptions: None
+        """
+        now = now or timezone.now()
+        sent = [pk for pk, error in results if error is None]
+        if sent:
+            Email.objects.filter(pk__in=sent).update(
+                status=Email.SENT, sent=now, claim='', attempts=F('attempts') + 1)
+        errors = dict((pk, error) for pk, error in results if error is not None)
+        for email in Email.objects.filter(pk__in=errors.keys()):
+            email.attempts += 1
+            email.claim = ''
+            email.last_error = errors[email.pk]
+            if email.attempts >= MAX_ATTEMPTS:
+                email.status = Email.FAILED
+            else:
+                email.next_attempt = now + Email.backoff(email.attempts)
+            email.save()
+        return len(sent)
+
+    @staticmethod
+    def purge(before):
+        """
+        Forget emails that were sent BEFORE.
+
+        Return: None
+        Exceptions: None
+        """
+        Email.objects.filter(status=Email.SENT, sent__lt=before).delete()
+        return
+
+    def message(self):
+        """
+        Return the Django EmailMessage to send.
+
+        Return: EmailMessage
+        Exceptions: None
+        """
+        return pickle.loads(base64.b64decode(self.data))
@@ -0,0 +1,126 @@
+"""
+A local stand-in for a real mail server.
+
+LocalSMTPServer speaks enough SMTP for Django's smtp backend, and keeps
+what it's sent in memory rather than passing it on. It's for tests and
+benchmarks, where we want the real thing on the wire without mailing
+anyone.
+
+Each client gets a thread of its own, and every reply can be held back
+by LATENCY seconds, to stand in for the round trips to a mail server
+somewhere else on the internet.
+
+    with LocalSMTPServer() as server:
+        worker.drain(backend='django.core.mail.backends.smtp.EmailBackend',
+                     host='127.0.0.1', port=server.port, use_tls=False,
+                     username='', password='')
+        server.messages
+"""
+import SocketServer
+import threading
+import time
+
+
+class SMTPHandler(SocketServer.StreamRequestHandler):
+    """
+    One client's SMTP session.
+    """
+    def reply(self, line):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.wfile.write(line + '\r\n')
+        self.wfile.flush()
+
+    def readline(self):
+        return self.rfile.readline().rstrip('\r\n')
+
+    def data(self):
+        lines = []
+        while True:
+            line = self.readline()
+            if line == '.':
+                return '\n'.join(lines)
+            lines.append(line[1:] if line.startswith('..') else line)
+
+    def handle(self):
+        sender, recipients = None, []
+        self.reply('220 localhost LocalSMTPServer')
+        while True:
+            line = self.readline()
+            verb = line[:4].upper()
+            if not line or verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            if verb in ('HELO', 'EHLO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                sender, recipients = line.split(':', 1)[1].strip(), []
+                self.reply('250 Ok')
+            elif verb == 'RCPT':
+                recipients.append(line.split(':', 1)[1].strip())
+                self.reply('250 Ok')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                self.server.received(sender, recipients, self.data())
+                self.reply('250 Ok')
+            elif verb in ('RSET', 'NOOP'):
+                sender, recipients = None, []
+                self.reply('250 Ok')
+            else:
+                self.reply('502 Command not implemented')
+
+
+class LocalSMTPServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    """
+    An SMTP server on localhost PORT (any free one by default).
+
+    MESSAGES is a list of (sender, recipients, data) tuples.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0):
+        SocketServer.TCPServer.__init__(self, ('127.0.0.1', port), SMTPHandler)
+        self.port = self.server_address[1]
+        self.latency = latency
+        self.messages = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def received(self, sender, recipients, data):
+        with self.lock:
+            self.messages.append((sender, recipients, data))
+
+    def start(self):
+        """
+        Start serving from a thread of our own.
+
+        Return: None
+        Exceptions: None
+        """
+        self.thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05})
+        self.thread.daemon = True
+        self.thread.start()
+        return
+
+    def stop(self):
+        """
+        Stop serving and close our socket.
+
+        Return: None
+        Exceptions: None
+        """
+        if self.thread is not None:
+            self.shutdown()
+            self.thread.join()
+            self.thread = None
+        self.server_close()
+        return
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
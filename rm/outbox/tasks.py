@@ -0,0 +1,25 @@
+"""
+Celery tasks for the outbox
+"""
+import datetime
+
+from celery.task import periodic_task
+from django.conf import settings
+from django.utils import timezone
+
+
+@periodic_task(run_every=datetime.timedelta(minutes=1))
+def drain_outbox():
+    """
+    Deliver the emails that are due, and forget those we sent more
+    than OUTBOX_KEEP_DAYS ago.
+
+    Return: int, the number sent
+    Exceptions: None
+    """
+    from rm.outbox import worker
+    from rm.outbox.models import Email
+
+    sent = worker.drain(settings.OUTBOX_BATCH_SIZE, settings.OUTBOX_CONCURRENCY)
+    Email.purge(timezone.now() - datetime.timedelta(days=settings.OUTBOX_KEEP_DAYS))
+    return sent
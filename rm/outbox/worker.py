@@ -0,0 +1,75 @@
+"""
+Deliver what's due in the outbox.
+
+Each batch of emails goes out over a single connection to the mail
+server, and we keep at most CONCURRENCY of those open at once. Only the
+delivery happens in the pool's threads - claiming and recording results
+stay in the calling thread, and its database connection.
+"""
+from multiprocessing.pool import ThreadPool
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+from rm.outbox.models import Email
+
+BATCH_SIZE = 100
+CONCURRENCY = 4
+
+
+def deliver(emails, backend=None, **kwargs):
+    """
+    Send EMAILS over one connection made with BACKEND (by default
+    OUTBOX_EMAIL_BACKEND) and KWARGS.
+
+    One email failing doesn't stop the others going.
+
+    Return: list of (pk, error) where error is None if it went
+    Exceptions: None
+    """
+    connection = get_connection(backend or settings.OUTBOX_EMAIL_BACKEND, **kwargs)
+    try:
+        connection.open()
+    except Exception as err:
+        return [(email.pk, repr(err)) for email in emails]
+    results = []
+    try:
+        for email in emails:
+            try:
+                connection.send_messages([email.message()])
+                results.append((email.pk, None))
+            except Exception as err:
+                results.append((email.pk, repr(err)))
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+    return results
+
+
+def drain(batch_size=BATCH_SIZE, concurrency=CONCURRENCY, backend=None, **kwargs):
+    """
+    Deliver everything that's due, BATCH_SIZE emails per connection
+    and CONCURRENCY connections at a time, until nothing is left.
+
+    BACKEND and KWARGS are as for deliver().
+
+    Return: int, the number sent
+    Exceptions: None
+    """
+    pool = ThreadPool(concurrency)
+    send = lambda emails: deliver(emails, backend, **kwargs)
+    sent = 0
+    try:
+        while True:
+            batches = [Email.claim_due(batch_size) for i in range(concurrency)]
+            batches = [batch for batch in batches if batch]
+            if not batches:
+                break
+            for results in pool.map(send, batches):
+                sent += Email.record(results)
+    finally:
+        pool.close()
+        pool.join()
+    return sent
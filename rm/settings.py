@@ -160,6 +160,7 @@ INSTALLED_APPS = (
     'rm.gcapp',
     'rm.suffrage',
     'rm.widgets',
+    'rm.outbox',
 )
 
 # A sample logging configuration. The only tangible logging
@@ -200,6 +201,23 @@ CAS_AUTO_CREATE_USERS = True
 CAS_USE_EXTRA = True
 LOGIN_REDIRECT_URL = '/'
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Shared between processes, see rm.widgets.fragments
+    'dashboard': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/usr/local/ohc/var/cache/dashboard',
+    },
+    # Shared between processes, see rm.trials.mailing
+    'email': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/usr/local/ohc/var/cache/email',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
 # 3rd party app settings
 GRAPPELLI_ADMIN_TITLE = 'Randomise.me'
 SOUTH_TESTS_MIGRATE = True
@@ -216,6 +234,18 @@ RECAPTCHA_PUBLIC_KEY = '6LfUX-wSAAAAAKoWnRtw5rTFH07TcpjcebxWpgjD'
 
 BASICAUTH = False
 RM_REMINDER_DELAY = 86400
+EXPORT_CACHE_DIR = '/usr/local/ohc/var/exports'
+EXPORT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+EXPORT_CACHE_MAX_AGE = 30 * 86400
+DASHBOARD_CACHE = 'dashboard'
+DASHBOARD_CACHE_TIMEOUT = 86400
+EMAIL_CACHE = 'email'
+EMAIL_CACHE_TIMEOUT = 7 * 86400
+EMAIL_BACKEND = 'rm.outbox.backends.OutboxBackend'
+OUTBOX_EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_CONCURRENCY = 4
+OUTBOX_KEEP_DAYS = 7
 
 # Dummy settings as a reminder
 BASICAUTH_PASSWORD = 'notareal password dummy'
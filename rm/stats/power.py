@@ -0,0 +1,201 @@
+"""
+Cached power calculations for Randomise Me.
+
+Solving a t-test power calculation for the number of observations is an
+iterative root-find in statsmodels, which costs milliseconds per call.
+The inputs people actually use are a small set of alphas and powers, so
+for each (alpha, power) pair we solve a grid of effect sizes once,
+interpolate between grid points, and memoise exact repeat queries.
+
+Inputs that fall outside the grid go to the solver as before.
+"""
+import collections
+import threading
+
+import numpy as np
+from scipy.interpolate import interp1d
+from statsmodels.stats.power import tt_ind_solve_power
+
+__all__ = [
+    'nobs1',
+    'nobs1_curve',
+    'power',
+    ]
+
+EFFECT_SIZES = np.exp(np.linspace(np.log(0.01), np.log(2.0), 80))
+ALPHAS = (0.01, 0.025, 0.05, 0.1)
+POWERS = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95)
+
+MEMO_SIZE = 1024
+
+
+class LRUCache(object):
+    """
+    A bounded mapping that forgets the least recently used key
+    once it holds more than MAXSIZE items.
+    """
+    def __init__(self, maxsize=MEMO_SIZE):
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """
+        Return the value for KEY or None, marking it as recently used.
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return None
+            self._data[key] = value
+            return value
+
+    def set(self, key, value):
+        """
+        Store VALUE for KEY, evicting the oldest entry if we're full.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_slices = {}
+_nobs_memo = LRUCache()
+_power_memo = LRUCache()
+
+
+def _grid_slice(alpha, power):
+    """
+    Return the interpolator for the grid slice at ALPHA and POWER,
+    solving it the first time we're asked.
+
+    Interpolation is cubic in log-log space, where the number of
+    observations is very nearly linear in the effect size.
+
+    Return: callable
+    Exceptions: None
+    """
+    key = (alpha, power)
+    if key not in _slices:
+        solved = np.array([
+                tt_ind_solve_power(effect_size=e, alpha=alpha, power=power, nobs1=None)
+                for e in EFFECT_SIZES])
+        _slices[key] = interp1d(np.log(EFFECT_SIZES), np.log(solved), kind='cubic')
+    return _slices[key]
+
+
+def in_grid(effect_size, alpha, power):
+    """
+    Predicate function to determine whether we can answer a query
+    from the grid.
+
+    Return: bool
+    Exceptions: None
+    """
+    return (alpha in ALPHAS and power in POWERS and
+            EFFECT_SIZES[0] <= effect_size <= EFFECT_SIZES[-1])
+
+
+def build_grid():
+    """
+    Solve every slice of the grid up front.
+
+    Useful to pay the cost at worker start rather than on the first
+    request for each slice.
+
+    Return: None
+    Exceptions: None
+    """
+    for alpha in ALPHAS:
+        for power in POWERS:
+            _grid_slice(alpha, power)
+    return
+
+
+def nobs1(effect_size, alpha, power):
+    """
+    Return the number of observations needed in each group of a two
+    sample t-test to detect EFFECT_SIZE at ALPHA with POWER.
+
+    Arguments:
+    - `effect_size`: float
+    - `alpha`: float
+    - `power`: float
+
+    Return: float
+    Exceptions: None
+    """
+    key = (effect_size, alpha, power)
+    num = _nobs_memo.get(key)
+    if num is None:
+        if in_grid(effect_size, alpha, power):
+            interpolate = _grid_slice(alpha, power)
+            num = float(np.exp(interpolate(np.log(effect_size))))
+        else:
+            num = tt_ind_solve_power(effect_size=effect_size, alpha=alpha,
+                                     power=power, nobs1=None)
+        _nobs_memo.set(key, num)
+    return num
+
+
+def nobs1_curve(effect_sizes, alpha, power):
+    """
+    Vectorised nobs1() for an array of EFFECT_SIZES at a single
+    ALPHA and POWER.
+
+    Everything inside the grid is interpolated in one call; anything
+    outside it falls back to nobs1() one at a time.
+
+    Arguments:
+    - `effect_sizes`: array-like
+    - `alpha`: float
+    - `power`: float
+
+    Return: numpy.array
+    Exceptions: None
+    """
+    effect_sizes = np.asarray(effect_sizes, dtype=float)
+    nums = np.empty(effect_sizes.shape)
+    inside = np.zeros(effect_sizes.shape, dtype=bool)
+    if alpha in ALPHAS and power in POWERS:
+        inside = ((effect_sizes >= EFFECT_SIZES[0]) &
+                  (effect_sizes <= EFFECT_SIZES[-1]))
+        if inside.any():
+            interpolate = _grid_slice(alpha, power)
+            nums[inside] = np.exp(interpolate(np.log(effect_sizes[inside])))
+    for i in zip(*np.nonzero(~inside)):
+        nums[i] = nobs1(float(effect_sizes[i]), alpha, power)
+    return nums
+
+
+def power(effect_size, alpha, nobs1):
+    """
+    Return the power of a two sample t-test with NOBS1 observations in
+    each group to detect EFFECT_SIZE at ALPHA.
+
+    Arguments:
+    - `effect_size`: float
+    - `alpha`: float
+    - `nobs1`: int
+
+    Return: float
+    Exceptions: None
+    """
+    key = (effect_size, alpha, nobs1)
+    result = _power_memo.get(key)
+    if result is None:
+        result = tt_ind_solve_power(effect_size=effect_size, alpha=alpha,
+                                    nobs1=nobs1, power=None)
+        _power_memo.set(key, result)
+    return result
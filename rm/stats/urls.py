@@ -1,9 +1,10 @@
 from django.conf.urls import patterns, include, url
 
-from rm.stats.views import PowerCalcView, PowerCalcBinaryView
+from rm.stats.views import PowerCalcView, PowerCalcBinaryView, PowerCurveView
 
 urlpatterns = patterns(
     '',
     url(r'power-calc$', PowerCalcView.as_view(), name='power-calc'),
     url(r'power-calc-binary$', PowerCalcBinaryView.as_view(), name='power-calc-binary'),
+    url(r'power-curve$', PowerCurveView.as_view(), name='power-curve'),
 )
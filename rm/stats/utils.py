@@ -1,8 +1,27 @@
 """
 Utility functions for statistical calculations on Randomise Me
+
+scipy and statsmodels are imported inside the functions that need them,
+so that loading the URLconf doesn't pull them into every worker.
 """
 import numpy as np
-from statsmodels.stats.power import tt_ind_solve_power
+
+# From Sealed Envelope
+Z_TABLE = {.005: 2.576,
+           .01: 2.326,
+           .0125: 2.241,
+           .025: 1.96,
+           .05: 1.645,
+           .1: 1.282,
+           .15: 1.036,
+           .2: .842,
+           .25: .674,
+           .3: .524,
+           .4: .253,
+           .5: 0
+           }
+_Z_PROBS = np.array(sorted(Z_TABLE))
+_Z_VALUES = np.array([Z_TABLE[p] for p in _Z_PROBS])
 
 def nobs(estimated=None, impressive=None):
     """
@@ -22,11 +41,13 @@ def nobs(estimated=None, impressive=None):
         effect_size = abs(estimated/impressive)
     else:
         effect_size = abs(impressive/estimated)
-    num = tt_ind_solve_power(effect_size=effect_size, alpha=0.05, power=0.8, nobs1=None)
+    from rm.stats.power import nobs1 as solve_nobs1
+    num = solve_nobs1(effect_size, 0.05, 0.8)
     return int(num) * 2
 
 def ttest(effect=None, alpha=None, power=None):
-    num = tt_ind_solve_power(effect_size=effect, alpha=alpha, power=power, nobs1=None)
+    from rm.stats.power import nobs1 as solve_nobs1
+    num = solve_nobs1(effect, alpha, power)
     return int(num) * 2
 
 def sdiff(est, imp):
@@ -36,28 +57,116 @@ def sdiff(est, imp):
     return sdiff
 
 def solve(eff):
-    nobs = tt_ind_solve_power(effect_size=eff, alpha=0.05, power=0.8, nobs1=None)
+    from rm.stats.power import nobs1 as solve_nobs1
+    nobs = solve_nobs1(eff, 0.05, 0.8)
     return int(nobs*2)
 
-# From Sealed Envelope
 def t(e, t):
-     n = {.005: 2.576,
-           .01: 2.326,
-           .0125: 2.241,
-           .025: 1.96,
-           .05: 1.645,
-           .1: 1.282,
-           .15: 1.036,
-           .2: .842,
-           .25: .674,
-           .3: .524,
-           .4: .253,
-           .5: 0
-           }
-
+     n = Z_TABLE
      return np.power(n[e] + n[t], 2)
 
+def z(probs):
+    """
+    Vectorised lookup of PROBS in the Sealed Envelope z-table.
+
+    Arguments:
+    - `probs`: array-like
+
+    Return: numpy.array
+    Exceptions:
+        - KeyError: One of PROBS isn't in the table
+    """
+    probs = np.asarray(probs, dtype=float)
+    idx = np.clip(np.searchsorted(_Z_PROBS, probs), 0, len(_Z_PROBS) - 1)
+    if not np.all(_Z_PROBS[idx] == probs):
+        raise KeyError(probs[_Z_PROBS[idx] != probs].tolist())
+    return _Z_VALUES[idx]
+
 def binary_superiority(p1, p2, alpha, power):
     if p1 == p2:
         return "infinite"
     return int(np.ceil(t(alpha/2, power) * ((p1 * (100 - p1)) + (p2 * (100-p2 ))) / np.power(p1-p2, 2))) * 2
+
+def ttest_curve(effects, alphas, powers):
+    """
+    The required number of participants for every combination of
+    EFFECTS, ALPHAS and POWERS, as ttest() would calculate it.
+
+    Arguments:
+    - `effects`: list of floats
+    - `alphas`: list of floats
+    - `powers`: list of floats
+
+    Return: numpy.array of shape (effects, alphas, powers)
+    Exceptions: None
+    """
+    from rm.stats.power import nobs1_curve
+    effects = np.asarray(effects, dtype=float)
+    curve = np.empty((len(effects), len(alphas), len(powers)), dtype=int)
+    for i, alpha in enumerate(alphas):
+        for j, power in enumerate(powers):
+            curve[:, i, j] = nobs1_curve(effects, alpha, power).astype(int) * 2
+    return curve
+
+def binary_superiority_curve(p1s, p2s, alphas, powers):
+    """
+    The required number of participants for every combination of
+    P1S, P2S, ALPHAS and POWERS, as binary_superiority() would
+    calculate it, broadcast over the outer product of the inputs.
+
+    Where p1 == p2 the answer is "infinite".
+
+    Arguments:
+    - `p1s`: list of ints
+    - `p2s`: list of ints
+    - `alphas`: list of floats
+    - `powers`: list of floats
+
+    Return: numpy.array of shape (p1s, p2s, alphas, powers)
+    Exceptions:
+        - KeyError: An alpha or power isn't in the z-table
+    """
+    p1 = np.asarray(p1s, dtype=float).reshape(-1, 1, 1, 1)
+    p2 = np.asarray(p2s, dtype=float).reshape(1, -1, 1, 1)
+    alpha = np.asarray(alphas, dtype=float).reshape(1, 1, -1, 1)
+    power = np.asarray(powers, dtype=float).reshape(1, 1, 1, -1)
+
+    zs = np.power(z(alpha / 2) + z(power), 2)
+    variance = (p1 * (100 - p1)) + (p2 * (100 - p2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        nums = np.ceil(zs * variance / np.power(p1 - p2, 2)) * 2
+
+    finite = np.broadcast_arrays(p1 != p2, nums)[0]
+    curve = np.empty(nums.shape, dtype=object)
+    curve[...] = "infinite"
+    curve[finite] = nums[finite].astype(int).tolist()
+    return curve
+
+def pooled_ttest(nobs1, mean1, m2_1, nobs2, mean2, m2_2):
+    """
+    Two sample t-test with pooled variance, computed from the
+    sufficient statistics of each sample rather than the raw values.
+
+    Gives the same result as statsmodels' ttest_ind with the default
+    usevar='pooled'.
+
+    Arguments:
+    - `nobs1`: int
+    - `mean1`: float
+    - `m2_1`: float - sum of squared deviations from mean1
+    - `nobs2`: int
+    - `mean2`: float
+    - `m2_2`: float - sum of squared deviations from mean2
+
+    Return: (tstat, pvalue, df)
+    Exceptions: None
+    """
+    from scipy import stats as scistats
+    df = nobs1 + nobs2 - 2
+    if nobs1 < 1 or nobs2 < 1 or df < 1:
+        return None, None, df
+    pooled = (m2_1 + m2_2) / df
+    stderr = np.sqrt(pooled * (1.0 / nobs1 + 1.0 / nobs2))
+    tstat = (mean1 - mean2) / stderr
+    pval = scistats.t.sf(np.abs(tstat), df) * 2
+    return tstat, pval, df
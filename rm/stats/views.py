@@ -1,10 +1,20 @@
 """
 Views to do server-side stats help
 """
-from django.http import HttpResponse
+import math
+import operator
+
+from django.http import HttpResponse, HttpResponseBadRequest
 from django.views.generic import View
 
-from rm.stats.utils import nobs, ttest, binary_superiority
+from rm.http import JsonResponse
+from rm.stats.utils import (nobs, ttest, binary_superiority, ttest_curve,
+                            binary_superiority_curve)
+
+# The most values we take for any one input to a power curve, and the
+# most combinations of them we'll calculate in one request.
+MAX_CURVE_VALUES = 50
+MAX_CURVE_POINTS = 10000
 
 class PowerCalcView(View):
     """
@@ -41,3 +51,61 @@ class PowerCalcBinaryView(View):
         alpha = float(self.request.POST.get('alpha'))
         num = binary_superiority(p1, p2, alpha, power)
         return HttpResponse(str(num))
+
+
+class PowerCurveView(View):
+    """
+    Run a whole curve of power calculations in one request.
+    """
+    def _values(self, key, kind=float):
+        values = [kind(v) for v in self.request.POST.getlist(key)]
+        if any(math.isinf(v) or math.isnan(v) for v in values):
+            raise ValueError(key)
+        return values
+
+    def post(self, *args, **kwargs):
+        """
+        Calculate the required number of participants for every
+        combination of the values given.
+
+        Pass any number of `alpha` and `power` values, plus either
+        `effect-size` values for a t-test or `p1` and `p2` values for
+        a binary outcome.
+
+        The result is nested in the order the inputs are listed above.
+        Each input takes at most MAX_CURVE_VALUES values, and there can
+        be at most MAX_CURVE_POINTS combinations of them. Every value
+        must be finite, effect sizes positive, and no p1 equal to a p2.
+
+        Return: JSON
+        Exceptions: None
+        """
+        try:
+            alphas, powers = self._values('alpha'), self._values('power')
+            effects = self._values('effect-size')
+            if effects:
+                if min(effects) <= 0:
+                    raise ValueError(effects)
+                axes = {'effect-size': effects}
+            else:
+                axes = {'p1': self._values('p1', int), 'p2': self._values('p2', int)}
+                if set(axes['p1']) & set(axes['p2']):
+                    raise ValueError(axes)
+        except ValueError:
+            return HttpResponseBadRequest('Invalid power calculation inputs')
+
+        lengths = [len(values) for values in axes.values() + [alphas, powers]]
+        if (max(lengths) > MAX_CURVE_VALUES or
+            reduce(operator.mul, lengths) > MAX_CURVE_POINTS):
+            return HttpResponseBadRequest('Too many power calculation inputs')
+
+        try:
+            if effects:
+                curve = ttest_curve(effects, alphas, powers)
+            else:
+                curve = binary_superiority_curve(axes['p1'], axes['p2'], alphas, powers)
+        except (ValueError, KeyError):
+            return HttpResponseBadRequest('Invalid power calculation inputs')
+
+        axes.update({'alpha': alphas, 'power': powers, 'nobs': curve.tolist()})
+        return JsonResponse(axes)
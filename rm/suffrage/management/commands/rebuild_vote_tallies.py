@@ -0,0 +1,18 @@
+"""
+Recompute every VoteTally from the votes themselves.
+
+Migrating fills them in, so run this if you suspect they have
+drifted.
+"""
+from django.core.management.base import BaseCommand
+
+from rm.suffrage.models import VoteTally
+
+class Command(BaseCommand):
+    """
+    Our command.
+
+    Nothing special to see here.
+    """
+    def handle(self, **options):
+        print 'Rebuilt {0} tallies'.format(VoteTally.rebuild())
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'VoteTally'
+        db.create_table(u'suffrage_votetally', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('content_type', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['contenttypes.ContentType'])),
+            ('object_id', self.gf('django.db.models.fields.IntegerField')()),
+            ('pluses', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('minuses', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('score', self.gf('django.db.models.fields.IntegerField')(default=0, db_index=True)),
+        ))
+        db.send_create_signal(u'suffrage', ['VoteTally'])
+
+        # Adding unique constraint on 'VoteTally', fields ['content_type', 'object_id']
+        db.create_unique(u'suffrage_votetally', ['content_type_id', 'object_id'])
+
+
+    def backwards(self, orm):
+        # Removing unique constraint on 'VoteTally', fields ['content_type', 'object_id']
+        db.delete_unique(u'suffrage_votetally', ['content_type_id', 'object_id'])
+
+        # Deleting model 'VoteTally'
+        db.delete_table(u'suffrage_votetally')
+
+
+    models = {
+        u'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        u'suffrage.vote': {
+            'Meta': {'unique_together': "(('voter', 'content_type', 'object_id'),)", 'object_name': 'Vote'},
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['contenttypes.ContentType']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'object_id': ('django.db.models.fields.IntegerField', [], {}),
+            'val': ('django.db.models.fields.FloatField', [], {}),
+            'voter': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['userprofiles.RMUser']"})
+        },
+        u'suffrage.votetally': {
+            'Meta': {'unique_together': "(('content_type', 'object_id'),)", 'object_name': 'VoteTally'},
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['contenttypes.ContentType']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'minuses': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'object_id': ('django.db.models.fields.IntegerField', [], {}),
+            'pluses': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'score': ('django.db.models.fields.IntegerField', [], {'default': '0', 'db_index': 'True'})
+        },
+        u'userprofiles.rmuser': {
+            'Meta': {'object_name': 'RMUser'},
+            'account': ('django.db.models.fields.CharField', [], {'default': "'st'", 'max_length': '2'}),
+            'dob': ('django.db.models.fields.DateField', [], {'null': 'True', 'blank': 'True'}),
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '254', 'unique': 'True'}),
+            'gender': ('django.db.models.fields.CharField', [], {'max_length': '2', 'null': 'True', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_active': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'is_staff': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'is_superuser': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'last_login': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '200', 'null': 'True', 'blank': 'True'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'postcode': ('django.db.models.fields.CharField', [], {'max_length': '20', 'null': 'True', 'blank': 'True'}),
+            'receive_emails': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'receive_questions': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'single_page': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'username': ('django.db.models.fields.CharField', [], {'max_length': '40', 'unique': 'True', 'db_index': 'True'})
+        }
+    }
+
+    complete_apps = ['suffrage']
\ No newline at end of file
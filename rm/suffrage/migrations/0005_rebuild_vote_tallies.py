@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import DataMigration
+from django.db import models
+
+
+class Migration(DataMigration):
+
+    def forwards(self, orm):
+        "Tally the votes already cast on every object."
+        counts = {}
+        votes = orm['suffrage.Vote'].objects.values(
+            'content_type', 'object_id', 'val').annotate(n=models.Count('pk'))
+        for row in votes:
+            key = (row['content_type'], row['object_id'])
+            pluses, minuses = counts.get(key, (0, 0))
+            if row['val'] == 1:
+                pluses += row['n']
+            elif row['val'] == -1:
+                minuses += row['n']
+            counts[key] = (pluses, minuses)
+        orm['suffrage.VoteTally'].objects.all().delete()
+        orm['suffrage.VoteTally'].objects.bulk_create([
+                orm['suffrage.VoteTally'](content_type_id=content_type, object_id=object_id,
+                                          pluses=pluses, minuses=minuses, score=pluses - minuses)
+                for (content_type, object_id), (pluses, minuses) in counts.items()])
+
+
+    def backwards(self, orm):
+        "Nothing to undo: the tallies are kept up to date from here on."
+        pass
+
+
+    models = {
+        u'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        u'suffrage.vote': {
+            'Meta': {'unique_together': "(('voter', 'content_type', 'object_id'),)", 'object_name': 'Vote'},
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['contenttypes.ContentType']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'object_id': ('django.db.models.fields.IntegerField', [], {}),
+            'val': ('django.db.models.fields.FloatField', [], {}),
+            'voter': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['userprofiles.RMUser']"})
+        },
+        u'suffrage.votetally': {
+            'Meta': {'unique_together': "(('content_type', 'object_id'),)", 'object_name': 'VoteTally'},
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['contenttypes.ContentType']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'minuses': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'object_id': ('django.db.models.fields.IntegerField', [], {}),
+            'pluses': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'score': ('django.db.models.fields.IntegerField', [], {'default': '0', 'db_index': 'True'})
+        },
+        u'userprofiles.rmuser': {
+            'Meta': {'object_name': 'RMUser'},
+            'account': ('django.db.models.fields.CharField', [], {'default': "'st'", 'max_length': '2'}),
+            'dob': ('django.db.models.fields.DateField', [], {'null': 'True', 'blank': 'True'}),
+            'email': ('django.db.models.fields.EmailField', [], {'unique': 'True', 'max_length': '254'}),
+            'gender': ('django.db.models.fields.CharField', [], {'max_length': '2', 'null': 'True', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_active': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'is_staff': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'is_superuser': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'last_login': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '200', 'null': 'True', 'blank': 'True'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'postcode': ('django.db.models.fields.CharField', [], {'max_length': '20', 'null': 'True', 'blank': 'True'}),
+            'receive_emails': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'receive_questions': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'single_page': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'username': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '40', 'db_index': 'True'})
+        }
+    }
+
+    complete_apps = ['suffrage']
+    symmetrical = True
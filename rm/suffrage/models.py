@@ -3,8 +3,57 @@ Universal suffrage on models for django
 """
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import IntegrityError, connection, models, transaction
 from django.contrib.contenttypes import generic
+from django.utils.datastructures import SortedDict
+
+VOTE_ANNOTATIONS = ('vote_pluses', 'vote_minuses', 'vote_score')
+
+
+def annotate_votes(queryset):
+    """
+    Annotate each object in QUERYSET with VOTE_ANNOTATIONS, read from
+    its VoteTally in the same query that fetches the objects.
+
+    Return: QuerySet
+    Exceptions: None
+    """
+    qn = connection.ops.quote_name
+    model = queryset.model
+    content_type = ContentType.objects.get_for_model(model)
+    tally = qn(VoteTally._meta.db_table)
+    lookup = ('COALESCE((SELECT {tally}.{{0}} FROM {tally} '
+              'WHERE {tally}.content_type_id = %s AND '
+              '{tally}.object_id = {table}.{pk}), 0)').format(
+        tally=tally, table=qn(model._meta.db_table), pk=qn(model._meta.pk.column))
+    select = SortedDict([
+            ('vote_pluses', lookup.format('pluses')),
+            ('vote_minuses', lookup.format('minuses')),
+            ('vote_score', lookup.format('score')),
+            ])
+    params = [content_type.pk] * len(select)
+    return queryset.extra(select=select, select_params=params)
+
+
+def votes_by(user, objects):
+    """
+    Return the votes USER has cast on any of OBJECTS, fetched with one
+    query per model.
+
+    Return: dict of (content_type_id, object_id) -> Vote
+    Exceptions: None
+    """
+    by_model = {}
+    for obj in objects:
+        by_model.setdefault(type(obj), set()).add(obj.pk)
+    votes = {}
+    for model, pks in by_model.items():
+        content_type = ContentType.objects.get_for_model(model)
+        for vote in Vote.objects.filter(voter=user, content_type=content_type,
+                                        object_id__in=pks):
+            votes[(content_type.pk, vote.object_id)] = vote
+    return votes
+
 
 class VotableMixin(object):
     """
@@ -24,36 +73,48 @@ class VotableMixin(object):
         Closure to get the instance.
         """
         class VoteManager(object):
+            """
+            Votes on our instance.
+
+            Counts come from the instance's VoteTally, or from its
+            annotations if it came from a queryset passed through
+            annotate_votes().
+            """
 
             @property
             def _content_id(self):
                 return ContentType.objects.get_for_model(instance).pk
 
-            def _count_for(self, vote_direction):
-                return Vote.objects.filter(val=vote_direction,
-                                           content_type=self._content_id,
-                                           object_id=instance.pk).count()
+            @property
+            def _tally(self):
+                return VoteTally.lookup(self._content_id, instance.pk)
 
             @property
             def pluses(self):
                 """
                 Return the count of pluses for this model
                 """
-                return self._count_for(Vote.PLUS_ONE)
+                if getattr(instance, 'vote_pluses', None) is not None:
+                    return instance.vote_pluses
+                return self._tally.pluses
 
             @property
             def minuses(self):
                 """
                 Return the count of minuses for this model
                 """
-                return self._count_for(Vote.MINUS_ONE)
+                if getattr(instance, 'vote_minuses', None) is not None:
+                    return instance.vote_minuses
+                return self._tally.minuses
 
             @property
             def score(self):
                 """
                 Return the pluses - the minuses.
                 """
-                return self.pluses - self.minuses
+                if getattr(instance, 'vote_score', None) is not None:
+                    return instance.vote_score
+                return self._tally.score
 
             def vote_by(self, user):
                 """
@@ -91,3 +152,99 @@ class Vote(models.Model):
 
     def __unicode__(self):
         return '{0} Vote on {1}'.format(self.get_vote_display(), self.content_object)
+
+
+class VoteTally(models.Model):
+    """
+    Running counts of the votes on a single object.
+
+    Kept in step with Vote by VoteTally.record(), so reading a score is
+    a single indexed lookup rather than an aggregate over every vote.
+    """
+    content_type = models.ForeignKey(ContentType)
+    object_id    = models.IntegerField()
+    pluses       = models.IntegerField(default=0)
+    minuses      = models.IntegerField(default=0)
+    score        = models.IntegerField(default=0, db_index=True)
+
+    class Meta:
+        unique_together = (('content_type', 'object_id'),)
+
+    def __unicode__(self):
+        return u'{0}/{1}: {2}'.format(self.content_type_id, self.object_id, self.score)
+
+    @staticmethod
+    def lookup(content_type, object_id):
+        """
+        Return the tally for OBJECT_ID of CONTENT_TYPE, or an empty,
+        unsaved one if nobody has voted on it.
+
+        Return: VoteTally
+        Exceptions: None
+        """
+        if isinstance(content_type, ContentType):
+            content_type = content_type.pk
+        try:
+            return VoteTally.objects.get(content_type=content_type, object_id=object_id)
+        except VoteTally.DoesNotExist:
+            return VoteTally(content_type_id=content_type, object_id=object_id)
+
+    @staticmethod
+    def record(content_type, object_id, previous, current):
+        """
+        Given the PREVIOUS and CURRENT values of a vote on OBJECT_ID of
+        CONTENT_TYPE (either of which may be None), update its tally.
+
+        The counts are changed with a single UPDATE, so concurrent
+        votes can't lose each other's changes. Call this in the same
+        transaction as the change to the Vote.
+
+        Return: None
+        Exceptions: None
+        """
+        if previous == current:
+            return
+        deltas = {'pluses': 0, 'minuses': 0, 'score': 0}
+        for val, sign in [(previous, -1), (current, 1)]:
+            if val == Vote.PLUS_ONE:
+                deltas['pluses'] += sign
+                deltas['score'] += sign
+            elif val == Vote.MINUS_ONE:
+                deltas['minuses'] += sign
+                deltas['score'] -= sign
+        lookup = dict(content_type=content_type, object_id=object_id)
+        try:
+            tally = VoteTally.objects.get_or_create(**lookup)[0]
+        except IntegrityError:
+            # The first votes on an object raced to create its tally
+            tally = VoteTally.objects.get(**lookup)
+        VoteTally.objects.filter(pk=tally.pk).update(
+            **dict((name, models.F(name) + delta) for name, delta in deltas.items()))
+        return
+
+    @staticmethod
+    def rebuild():
+        """
+        Recompute every tally from the votes themselves.
+
+        Return: int, the number of tallies
+        Exceptions: None
+        """
+        counts = {}
+        votes = Vote.objects.values('content_type', 'object_id', 'val').annotate(
+            n=models.Count('pk'))
+        for row in votes:
+            key = (row['content_type'], row['object_id'])
+            pluses, minuses = counts.get(key, (0, 0))
+            if row['val'] == Vote.PLUS_ONE:
+                pluses += row['n']
+            elif row['val'] == Vote.MINUS_ONE:
+                minuses += row['n']
+            counts[key] = (pluses, minuses)
+        with transaction.commit_on_success():
+            VoteTally.objects.all().delete()
+            VoteTally.objects.bulk_create([
+                    VoteTally(content_type_id=content_type, object_id=object_id,
+                              pluses=pluses, minuses=minuses, score=pluses - minuses)
+                    for (content_type, object_id), (pluses, minuses) in counts.items()])
+        return len(counts)
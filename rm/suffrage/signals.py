@@ -0,0 +1,8 @@
+"""
+Signals sent when votes change.
+"""
+from django.dispatch import Signal
+
+# Sent by VoteView once a vote has been committed, with the model class
+# as the sender and the PREVIOUS and CURRENT values of the vote.
+vote_cast = Signal(providing_args=['object_id', 'previous', 'current'])
@@ -2,10 +2,40 @@
 Templatetags for the voting widget.
 """
 from django import template
+from django.contrib.contenttypes.models import ContentType
 
 register = template.Library()
 
-from rm.suffrage.models import Vote
+from rm.suffrage.models import Vote, votes_by
+
+def _primed(request):
+    """
+    Return the map of (content_type_id, object_id) -> Vote or None
+    for REQUEST, creating it if need be.
+    """
+    if not hasattr(request, '_suffrage_votes'):
+        request._suffrage_votes = {}
+    return request._suffrage_votes
+
+@register.simple_tag(takes_context=True)
+def prime_votes(context, objects):
+    """
+    Look up the current user's votes on all of OBJECTS at once, so
+    that voting widgets rendered for them later in this request
+    don't each need a query of their own.
+
+    Renders nothing.
+    """
+    request = context['request']
+    if not request.user.is_authenticated():
+        return ''
+    objects = list(objects)
+    primed = _primed(request)
+    votes = votes_by(request.user, objects)
+    for obj in objects:
+        key = (ContentType.objects.get_for_model(obj).pk, obj.pk)
+        primed[key] = votes.get(key)
+    return ''
 
 @register.inclusion_tag('suffrage/voting_widget.html', takes_context=True)
 def voting_widget(context, obj):
@@ -13,9 +43,15 @@ def voting_widget(context, obj):
     Render the voting widget for a particular object.
     """
     has_voted, val = False, None
-    user = context['request'].user
+    request = context['request']
+    user = request.user
     if user.is_authenticated():
-        vote = obj.suffrage.vote_by(user)
+        key = (ContentType.objects.get_for_model(obj).pk, obj.pk)
+        primed = _primed(request)
+        if key in primed:
+            vote = primed[key]
+        else:
+            vote = obj.suffrage.vote_by(user)
         if vote:
             has_voted = True
             val = vote.val
@@ -3,12 +3,14 @@ Views to enable voting on Django model objects
 """
 from django.contrib.auth.decorators import login_required
 from django.contrib.contenttypes.models import ContentType
-from django.http import HttpResponse, HttpResponseRedirect, Http404
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, Http404
 from django.utils import simplejson
 from django.utils.decorators import method_decorator
 from django.views.generic import View
 
-from rm.suffrage.models import Vote
+from rm.suffrage.models import Vote, VoteTally
+from rm.suffrage.signals import vote_cast
 
 class JsonResponse(HttpResponse):
     """
@@ -60,20 +62,37 @@ class VoteView(View):
         Vote on this object.
 
         If the user has already voted on this object, do not allow them to
-        vote twice.
+        vote twice - change their existing vote instead. The object's
+        VoteTally is updated in the same transaction, and vote_cast is
+        sent once it has been committed.
 
         Return: HttpResponse
         Exceptions: None
         """
         obj = self.get_object_or_404(kwargs['pk'])
-        val = self.request.POST.get('vote')
-        vote, new = Vote.objects.get_or_create(content_type=self.contenttype,
-                                             object_id=obj.pk,
-                                             voter=self.request.user,
-                                             defaults={'val': val})
-        if not new:
-            vote.val = val
-            vote.save()
+        try:
+            val = int(self.request.POST.get('vote'))
+        except (TypeError, ValueError):
+            val = None
+        if val not in (Vote.PLUS_ONE, Vote.MINUS_ONE):
+            return HttpResponseBadRequest('Votes must be +1 or -1')
+
+        with transaction.commit_on_success():
+            votes = Vote.objects.select_for_update()
+            lookup = dict(content_type=self.contenttype, object_id=obj.pk,
+                          voter=self.request.user)
+            try:
+                vote, new = votes.get_or_create(defaults={'val': val}, **lookup)
+            except IntegrityError:
+                # Another request inserted this vote after we looked for it
+                vote, new = votes.get(**lookup), False
+            previous = None if new else vote.val
+            if not new and previous != val:
+                vote.val = val
+                vote.save()
+            VoteTally.record(self.contenttype, obj.pk, previous, val)
+        vote_cast.send(sender=self.modelklass, object_id=obj.pk,
+                       previous=previous, current=val)
 
         if self.request.is_ajax():
             return JsonResponse(dict(error=None, vote=val))
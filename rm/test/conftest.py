@@ -0,0 +1,18 @@
+"""
+Configuration for our test run.
+"""
+
+def pytest_configure(config):
+    """
+    Run celery tasks in process, as there's no broker under test, and
+    keep the emails they send, and everything we cache, in memory.
+    """
+    from celery import current_app
+    from django.conf import settings
+    from django.test.utils import setup_test_environment
+    current_app.conf.CELERY_ALWAYS_EAGER = True
+    setup_test_environment()
+    settings.CACHES = dict(
+        (alias, {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                 'LOCATION': alias})
+        for alias in settings.CACHES)
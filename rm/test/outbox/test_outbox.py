@@ -0,0 +1,131 @@
+"""
+Unittests for the outbox
+"""
+import datetime
+
+from django.core import mail
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from mock import patch
+
+from rm.outbox import models, worker
+from rm.outbox.models import Email
+from rm.outbox.smtp import LocalSMTPServer
+
+OUTBOX = dict(EMAIL_BACKEND='rm.outbox.backends.OutboxBackend',
+              OUTBOX_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+
+@override_settings(**OUTBOX)
+class OutboxTestCase(TestCase):
+
+    def setUp(self):
+        super(OutboxTestCase, self).setUp()
+        mail.outbox = []
+
+    def test_queue(self):
+        "Sending mail queues it"
+        mail.send_mail('Hello', 'Body', 'from@example.com', ['to@example.com'])
+        self.assertEqual([], mail.outbox)
+        email = Email.objects.get()
+        self.assertEqual('to@example.com', email.to)
+        self.assertEqual(Email.PENDING, email.status)
+        self.assertEqual('Body', email.message().body)
+
+    def test_drain(self):
+        "Draining delivers everything due"
+        for i in range(5):
+            mail.send_mail('Hello', 'Body', 'from@example.com',
+                           ['to{0}@example.com'.format(i)])
+        self.assertEqual(5, worker.drain(batch_size=2, concurrency=2))
+        self.assertEqual(5, len(mail.outbox))
+        self.assertEqual(5, Email.objects.filter(status=Email.SENT).count())
+        self.assertEqual(0, worker.drain())
+
+    def test_drain_not_due(self):
+        "Emails waiting out a backoff stay put"
+        mail.send_mail('Hello', 'Body', 'from@example.com', ['to@example.com'])
+        Email.objects.update(next_attempt=timezone.now() + datetime.timedelta(minutes=5))
+        self.assertEqual(0, worker.drain())
+        self.assertEqual([], mail.outbox)
+
+    def test_claim_once(self):
+        "Two workers never get the same email"
+        for i in range(3):
+            mail.send_mail('Hello', 'Body', 'from@example.com', ['to@example.com'])
+        first = Email.claim_due(2)
+        second = Email.claim_due(2)
+        self.assertEqual(2, len(first))
+        self.assertEqual(1, len(second))
+        self.assertEqual([], Email.claim_due(2))
+
+    def test_backoff(self):
+        "Failures are retried later, then given up on"
+        mail.send_mail('Hello', 'Body', 'from@example.com', ['to@example.com'])
+        email = Email.objects.get()
+        now = timezone.now()
+        self.assertEqual(0, Email.record([(email.pk, 'Oops')], now))
+        email = Email.objects.get()
+        self.assertEqual(1, email.attempts)
+        self.assertEqual('Oops', email.last_error)
+        self.assertEqual(Email.PENDING, email.status)
+        self.assertEqual(now + datetime.timedelta(seconds=60), email.next_attempt)
+        Email.objects.update(attempts=models.MAX_ATTEMPTS - 1)
+        Email.record([(email.pk, 'Oops')], now)
+        self.assertEqual(Email.FAILED, Email.objects.get().status)
+
+    def test_deliver_failure(self):
+        "One bad email doesn't stop the rest"
+        for i in range(3):
+            mail.send_mail('Hello', 'Body', 'from@example.com', ['to@example.com'])
+        emails = Email.claim_due(3)
+        real = Email.message
+        def message(self):
+            if self.pk == emails[1].pk:
+                raise ValueError('Bad')
+            return real(self)
+        with patch.object(Email, 'message', message):
+            results = worker.deliver(emails)
+        self.assertEqual([None, "ValueError('Bad',)", None], [e for pk, e in results])
+        self.assertEqual(2, len(mail.outbox))
+
+    def test_purge(self):
+        "Old sent emails are forgotten"
+        mail.send_mail('Hello', 'Body', 'from@example.com', ['to@example.com'])
+        worker.drain()
+        Email.purge(timezone.now() - datetime.timedelta(days=1))
+        self.assertEqual(1, Email.objects.count())
+        Email.purge(timezone.now() + datetime.timedelta(days=1))
+        self.assertEqual(0, Email.objects.count())
+
+    def test_smtp(self):
+        "Over the wire, to the stand-in"
+        for i in range(3):
+            mail.send_mail('Hello', 'Body', 'from@example.com',
+                           ['to{0}@example.com'.format(i)])
+        with LocalSMTPServer() as server:
+            sent = worker.drain(backend='django.core.mail.backends.smtp.EmailBackend',
+                                host='127.0.0.1', port=server.port, use_tls=False,
+                                username='', password='')
+        self.assertEqual(3, sent)
+        self.assertEqual(3, len(server.messages))
+        self.assertEqual(['<to0@example.com>'], server.messages[0][1])
+        self.assertIn('Subject: Hello', server.messages[0][2])
+
+
+@override_settings(**OUTBOX)
+class OutboxTransactionTestCase(TransactionTestCase):
+
+    def test_rollback(self):
+        "Emails go with the transaction that sent them"
+        try:
+            with transaction.commit_on_success():
+                mail.send_mail('Hello', 'Body', 'from@example.com', ['to@example.com'])
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEqual(0, Email.objects.count())
+        with transaction.commit_on_success():
+            mail.send_mail('Hello', 'Body', 'from@example.com', ['to@example.com'])
+        self.assertEqual(1, Email.objects.count())
@@ -0,0 +1,64 @@
+"""
+Unittests for the rm.stats.power module
+"""
+import unittest
+
+from mock import patch
+from statsmodels.stats.power import tt_ind_solve_power
+
+from rm.stats import power
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def test_get_missing(self):
+        "None for things we don't know"
+        self.assertEqual(None, power.LRUCache().get('foo'))
+
+    def test_evicts_oldest(self):
+        "Bounded size"
+        cache = power.LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(2, len(cache))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(None, cache.get('b'))
+
+
+class Nobs1TestCase(unittest.TestCase):
+
+    def setUp(self):
+        power._nobs_memo.clear()
+
+    def test_matches_solver(self):
+        "Interpolated values agree with the solver"
+        for effect in [0.013, 0.1, 0.33, 0.5, 0.8, 1.7]:
+            for alpha, pwr in [(0.05, 0.8), (0.01, 0.95), (0.1, 0.5)]:
+                expected = tt_ind_solve_power(effect_size=effect, alpha=alpha,
+                                              power=pwr, nobs1=None)
+                found = power.nobs1(effect, alpha, pwr)
+                self.assertAlmostEqual(1.0, found / expected, places=4)
+
+    def test_out_of_grid(self):
+        "Off-grid inputs go to the solver"
+        with patch.object(power, 'tt_ind_solve_power') as psolve:
+            psolve.return_value = 42.0
+            self.assertEqual(42.0, power.nobs1(0.5, 0.05, 0.81))
+            psolve.assert_called_once_with(effect_size=0.5, alpha=0.05,
+                                           power=0.81, nobs1=None)
+
+    def test_memoised(self):
+        "Repeat queries don't touch the solver"
+        power.nobs1(0.5, 0.05, 0.81)
+        with patch.object(power, 'tt_ind_solve_power') as psolve:
+            power.nobs1(0.5, 0.05, 0.81)
+            self.assertEqual(0, psolve.call_count)
+
+
+class PowerTestCase(unittest.TestCase):
+
+    def test_matches_solver(self):
+        "Same as statsmodels"
+        expected = tt_ind_solve_power(effect_size=0.2, alpha=0.05, nobs1=40, power=None)
+        self.assertAlmostEqual(expected, power.power(0.2, 0.05, 40))
@@ -0,0 +1,46 @@
+"""
+Unittests for the rm.stats.utils module
+"""
+import unittest
+
+from rm.stats import utils
+
+class ZTestCase(unittest.TestCase):
+
+    def test_lookup(self):
+        "Same as the table"
+        self.assertEqual([1.96, 0.842], utils.z([0.025, 0.2]).tolist())
+
+    def test_missing(self):
+        "Should raise"
+        with self.assertRaises(KeyError):
+            utils.z([0.025, 0.07])
+
+
+class TtestCurveTestCase(unittest.TestCase):
+
+    def test_matches_scalar(self):
+        "Every point on the curve is what ttest() would say"
+        effects, alphas, powers = [0.2, 0.5, 3.5], [0.05, 0.01], [0.8, 0.83]
+        curve = utils.ttest_curve(effects, alphas, powers)
+        self.assertEqual((3, 2, 2), curve.shape)
+        for i, effect in enumerate(effects):
+            for j, alpha in enumerate(alphas):
+                for k, power in enumerate(powers):
+                    self.assertEqual(utils.ttest(effect, alpha, power), curve[i, j, k])
+
+
+class BinarySuperiorityCurveTestCase(unittest.TestCase):
+
+    def test_matches_scalar(self):
+        "Every point on the curve is what binary_superiority() would say"
+        p1s, p2s, alphas, powers = [10, 30], [30, 45, 60], [0.05, 0.1], [0.1, 0.2]
+        curve = utils.binary_superiority_curve(p1s, p2s, alphas, powers)
+        self.assertEqual((2, 3, 2, 2), curve.shape)
+        for i, p1 in enumerate(p1s):
+            for j, p2 in enumerate(p2s):
+                for k, alpha in enumerate(alphas):
+                    for l, power in enumerate(powers):
+                        self.assertEqual(
+                            utils.binary_superiority(p1, p2, alpha, power),
+                            curve[i, j, k, l])
@@ -0,0 +1,70 @@
+"""
+Unittests for the rm.stats.views module
+"""
+import unittest
+
+from django.test.client import RequestFactory
+from django.utils import simplejson
+from mock import patch
+
+from rm.stats import utils, views
+
+class PowerCurveViewTestCase(unittest.TestCase):
+
+    def post(self, data):
+        request = RequestFactory().post('/stats/power-curve', data)
+        return views.PowerCurveView.as_view()(request)
+
+    def test_ttest(self):
+        "Every combination, nested in input order"
+        response = self.post({'effect-size': [0.2, 0.5], 'alpha': [0.05],
+                              'power': [0.8, 0.9]})
+        self.assertEqual(200, response.status_code)
+        curve = simplejson.loads(response.content)
+        self.assertEqual([0.2, 0.5], curve['effect-size'])
+        self.assertEqual(utils.ttest(0.5, 0.05, 0.9), curve['nobs'][1][0][1])
+
+    def test_binary(self):
+        "Without effect sizes we want p1s and p2s"
+        response = self.post({'p1': [10, 30], 'p2': [45], 'alpha': [0.05], 'power': [0.2]})
+        self.assertEqual(200, response.status_code)
+        curve = simplejson.loads(response.content)
+        self.assertEqual(utils.binary_superiority(30, 45, 0.05, 0.2), curve['nobs'][1][0][0][0])
+
+    def test_invalid(self):
+        "Should 400"
+        self.assertEqual(400, self.post({'effect-size': ['big'], 'alpha': [0.05],
+                                         'power': [0.8]}).status_code)
+
+    def test_effect_not_positive(self):
+        "Effect sizes must be positive"
+        for effect in [0, -0.5]:
+            self.assertEqual(400, self.post({'effect-size': [0.2, effect], 'alpha': [0.05],
+                                             'power': [0.8]}).status_code)
+
+    def test_not_finite(self):
+        "Or finite"
+        for effect in ['inf', 'nan']:
+            self.assertEqual(400, self.post({'effect-size': [effect], 'alpha': [0.05],
+                                             'power': [0.8]}).status_code)
+        self.assertEqual(400, self.post({'effect-size': [0.2], 'alpha': ['nan'],
+                                         'power': [0.8]}).status_code)
+
+    def test_same_proportions(self):
+        "There's no difference to detect when p1 is p2"
+        self.assertEqual(400, self.post({'p1': [10, 30], 'p2': [30], 'alpha': [0.05],
+                                         'power': [0.2]}).status_code)
+
+    def test_too_many_values(self):
+        "Any one input is capped"
+        with patch.object(views, 'MAX_CURVE_VALUES', 2):
+            response = self.post({'p1': [10, 20, 30], 'p2': [45], 'alpha': [0.05],
+                                  'power': [0.2]})
+        self.assertEqual(400, response.status_code)
+
+    def test_too_many_points(self):
+        "So are the combinations of them"
+        with patch.object(views, 'MAX_CURVE_POINTS', 7):
+            response = self.post({'effect-size': [0.2, 0.5], 'alpha': [0.05, 0.01],
+                                  'power': [0.8, 0.9]})
+        self.assertEqual(400, response.status_code)
@@ -0,0 +1,163 @@
+"""
+Unittests for votes on models
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError
+from django.db.models.query import QuerySet
+from django.test import TestCase
+from django.test.client import RequestFactory
+from mock import patch
+
+from rm.suffrage.models import Vote, VoteTally, votes_by
+from rm.suffrage.templatetags import suffrage
+from rm.suffrage.views import VoteView
+from rm.trials.models import Trial, User
+
+class AnnotateVotesTestCase(TestCase):
+
+    def setUp(self):
+        super(AnnotateVotesTestCase, self).setUp()
+        self.owner = User(email='larry@example.com', pk=1)
+        self.owner.save()
+        self.trial = Trial(title='This', min_participants=20, owner=self.owner)
+        self.trial.save()
+        self.other = Trial(title='That', min_participants=20, owner=self.owner)
+        self.other.save()
+        for i, val in enumerate([Vote.PLUS_ONE, Vote.PLUS_ONE, Vote.MINUS_ONE]):
+            voter = User(email='voter{0}@example.com'.format(i),
+                         username='voter{0}'.format(i), pk=i + 10)
+            voter.save()
+            Vote(content_object=self.trial, voter=voter, val=val).save()
+        VoteTally.rebuild()
+
+    def test_annotated(self):
+        "Counts come from the one query"
+        trials = dict((t.pk, t) for t in Trial.objects.with_votes())
+        trial, other = trials[self.trial.pk], trials[self.other.pk]
+        self.assertEqual((2, 1, 1), (trial.vote_pluses, trial.vote_minuses, trial.vote_score))
+        self.assertEqual((0, 0, 0), (other.vote_pluses, other.vote_minuses, other.vote_score))
+
+    def test_suffrage_uses_annotations(self):
+        "No further queries once annotated"
+        trial = Trial.objects.filter(pk=self.trial.pk).with_votes().get()
+        with self.assertNumQueries(0):
+            self.assertEqual(2, trial.suffrage.pluses)
+            self.assertEqual(1, trial.suffrage.minuses)
+            self.assertEqual(1, trial.suffrage.score)
+
+    def test_suffrage_unannotated(self):
+        "Falls back to counting"
+        trial = Trial.objects.get(pk=self.trial.pk)
+        self.assertEqual(1, trial.suffrage.score)
+        self.assertEqual(2, trial.suffrage.pluses)
+
+    def test_order_by_score(self):
+        "Annotations can be ordered on"
+        trials = list(Trial.objects.with_votes().order_by('-vote_score'))
+        self.assertEqual([self.trial.pk, self.other.pk], [t.pk for t in trials])
+
+
+class VoteTallyTestCase(TestCase):
+
+    def setUp(self):
+        super(VoteTallyTestCase, self).setUp()
+        self.owner = User(email='larry@example.com', pk=1)
+        self.owner.save()
+        self.voter = User(email='voter@example.com', username='voter', pk=2)
+        self.voter.save()
+        self.trial = Trial(title='This', min_participants=20, owner=self.owner)
+        self.trial.save()
+        self.content_type = ContentType.objects.get_for_model(Trial)
+
+    def vote(self, val):
+        request = RequestFactory().post('/', {'vote': val},
+                                        HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        request.user = self.voter
+        return VoteView.as_view()(request, contenttype=self.content_type.pk,
+                                  pk=self.trial.pk)
+
+    def tally(self):
+        tally = VoteTally.lookup(self.content_type, self.trial.pk)
+        return tally.pluses, tally.minuses, tally.score
+
+    def test_vote(self):
+        "Voting updates the tally"
+        self.vote(Vote.PLUS_ONE)
+        self.assertEqual((1, 0, 1), self.tally())
+        self.vote(Vote.PLUS_ONE)
+        self.assertEqual((1, 0, 1), self.tally())
+
+    def test_switch(self):
+        "Changing direction moves the vote across"
+        self.vote(Vote.PLUS_ONE)
+        self.vote(Vote.MINUS_ONE)
+        self.assertEqual((0, 1, -1), self.tally())
+        self.assertEqual(1, Vote.objects.count())
+        self.assertEqual(-1, Trial.objects.get(pk=self.trial.pk).suffrage.score)
+
+    def test_first_votes_race(self):
+        "Losing the race to create the vote or tally re-selects the winner's"
+        get_or_create = QuerySet.get_or_create
+        def lose(queryset, **kwargs):
+            if queryset.model in (Vote, VoteTally):
+                raise IntegrityError()
+            return get_or_create(queryset, **kwargs)
+        self.vote(Vote.MINUS_ONE)
+        with patch.object(QuerySet, 'get_or_create', lose):
+            self.assertEqual(200, self.vote(Vote.PLUS_ONE).status_code)
+        self.assertEqual((1, 0, 1), self.tally())
+        self.assertEqual(1, Vote.objects.count())
+
+    def test_bad_vote(self):
+        "Should 400"
+        self.assertEqual(400, self.vote('lots').status_code)
+        self.assertEqual((0, 0, 0), self.tally())
+
+    def test_rebuild(self):
+        "Rebuilding agrees with the running tally"
+        self.vote(Vote.MINUS_ONE)
+        running = self.tally()
+        VoteTally.objects.all().delete()
+        self.assertEqual(1, VoteTally.rebuild())
+        self.assertEqual(running, self.tally())
+
+
+class PrimeVotesTestCase(TestCase):
+
+    def setUp(self):
+        super(PrimeVotesTestCase, self).setUp()
+        self.owner = User(email='larry@example.com', pk=1)
+        self.owner.save()
+        self.voter = User(email='voter@example.com', username='voter', pk=2)
+        self.voter.save()
+        self.trials = []
+        for i in range(5):
+            trial = Trial(title='Trial {0}'.format(i), min_participants=20, owner=self.owner)
+            trial.save()
+            self.trials.append(trial)
+        Vote(content_object=self.trials[1], voter=self.voter, val=Vote.PLUS_ONE).save()
+        Vote(content_object=self.trials[3], voter=self.voter, val=Vote.MINUS_ONE).save()
+        self.request = RequestFactory().get('/')
+        self.request.user = self.voter
+
+    def test_votes_by(self):
+        "One lookup for the lot"
+        with self.assertNumQueries(1):
+            votes = votes_by(self.voter, self.trials)
+        content_type = ContentType.objects.get_for_model(Trial).pk
+        self.assertEqual(set([(content_type, self.trials[1].pk), (content_type, self.trials[3].pk)]),
+                         set(votes.keys()))
+
+    def test_widgets_read_primed(self):
+        "Widgets for primed objects don't query"
+        context = {'request': self.request}
+        suffrage.prime_votes(context, self.trials)
+        with self.assertNumQueries(0):
+            widgets = [suffrage.voting_widget(context, t) for t in self.trials]
+        self.assertEqual([False, True, False, True, False], [w['has_voted'] for w in widgets])
+        self.assertEqual(Vote.MINUS_ONE, widgets[3]['vote'].val)
+
+    def test_widget_unprimed(self):
+        "Falls back to looking the vote up"
+        widget = suffrage.voting_widget({'request': self.request}, self.trials[1])
+        self.assertEqual(True, widget['has_voted'])
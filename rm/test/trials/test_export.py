@@ -0,0 +1,86 @@
+"""
+Unittests for streaming trial exports
+"""
+import datetime
+import gzip
+import StringIO
+import unittest
+
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.utils import simplejson
+
+from rm.trials import export, models
+from rm.trials.views import TrialAsCsvView
+
+class EncodeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [('A', '2013-01-01', 3), ('B', '2013-01-02', None)]
+
+    def test_csv(self):
+        "CSV with a header row"
+        lines = list(export.encode(export.REPORT_FIELDS, self.rows))
+        self.assertEqual(['group,date,value\r\n',
+                          'A,2013-01-01,3\r\n',
+                          'B,2013-01-02,\r\n'], lines)
+
+    def test_ndjson(self):
+        "One JSON object per line"
+        lines = list(export.encode(export.REPORT_FIELDS, self.rows, format=export.NDJSON))
+        self.assertEqual({'group': 'A', 'date': '2013-01-01', 'value': 3},
+                         simplejson.loads(lines[0]))
+        self.assertEqual(None, simplejson.loads(lines[1])['value'])
+
+    def test_gzip(self):
+        "Compressed output decompresses to the plain output"
+        plain = ''.join(export.encode(export.REPORT_FIELDS, self.rows))
+        packed = ''.join(export.encode(export.REPORT_FIELDS, self.rows, compress=True))
+        self.assertEqual(plain, gzip.GzipFile(fileobj=StringIO.StringIO(packed)).read())
+
+    def test_unknown_format(self):
+        "Should raise"
+        with self.assertRaises(KeyError):
+            export.encode(export.REPORT_FIELDS, self.rows, format='xls')
+
+
+class ReportRowsTestCase(TestCase):
+
+    def setUp(self):
+        super(ReportRowsTestCase, self).setUp()
+        self.user = models.User(email='larry@example.com', pk=1)
+        self.user.save()
+        self.trial = models.Trial(title='This', min_participants=20, owner=self.user)
+        self.trial.save()
+        self.variable = models.Variable(question='Why?', trial=self.trial)
+        self.variable.save()
+        groupa, groupb = self.trial.ensure_groups()
+        self.today = datetime.date.today()
+        for i in range(5):
+            models.Report(trial=self.trial, group=[groupa, groupb][i % 2],
+                          variable=self.variable, date=self.today, score=i).save()
+        models.Report(trial=self.trial, group=groupa, variable=self.variable).save()
+
+    def test_rows(self):
+        "Completed reports across several batches"
+        rows = list(export.report_rows(self.trial, batch_size=2))
+        self.assertEqual(5, len(rows))
+        self.assertEqual(('A', self.today.isoformat(), 0), rows[0])
+        self.assertEqual(('B', self.today.isoformat(), 1), rows[1])
+        self.assertEqual([0, 1, 2, 3, 4], [r[2] for r in rows])
+
+    def test_view(self):
+        "Streams the CSV"
+        request = RequestFactory().get('/', {'compress': 'gzip'})
+        resp = TrialAsCsvView.as_view()(request, pk=self.trial.pk)
+        self.assertEqual('application/gzip', resp['Content-Type'])
+        self.assertTrue(resp['Content-Disposition'].endswith('.csv.gz'))
+        content = ''.join(resp.streaming_content)
+        lines = gzip.GzipFile(fileobj=StringIO.StringIO(content)).read().splitlines()
+        self.assertEqual(6, len(lines))
+
+    def test_view_bad_format(self):
+        "Should 400"
+        request = RequestFactory().get('/', {'format': 'xls'})
+        resp = TrialAsCsvView.as_view()(request, pk=self.trial.pk)
+        self.assertEqual(400, resp.status_code)
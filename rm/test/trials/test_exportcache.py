@@ -0,0 +1,138 @@
+"""
+Unittests for the cache of exports for stopped trials
+"""
+import datetime
+import gzip
+import os
+import shutil
+import tempfile
+import time
+
+from django.test import TestCase
+from django.test.client import RequestFactory
+from mock import patch
+
+from rm.trials import export, exportcache, models
+from rm.trials.views import TrialAsCsvView
+
+class ExportCacheTestCase(TestCase):
+
+    def setUp(self):
+        super(ExportCacheTestCase, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.settings_override = self.settings(EXPORT_CACHE_DIR=self.dir,
+                                               EXPORT_CACHE_MAX_BYTES=1024 * 1024,
+                                               EXPORT_CACHE_MAX_AGE=3600)
+        self.settings_override.enable()
+        self.user = models.User(email='larry@example.com', pk=1)
+        self.user.save()
+        self.trial = models.Trial(title='This', min_participants=20,
+                                  owner=self.user, offline=True)
+        self.trial.save()
+        self.variable = models.Variable(question='Why?', trial=self.trial)
+        self.variable.save()
+        groupa, groupb = self.trial.ensure_groups()
+        for i in range(4):
+            models.Report(trial=self.trial, group=[groupa, groupb][i % 2],
+                          variable=self.variable, date=datetime.date.today(),
+                          score=i).save()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.dir)
+        super(ExportCacheTestCase, self).tearDown()
+
+    def test_build_matches_export(self):
+        "Cached files hold exactly what we'd stream"
+        exportcache.build(self.trial)
+        path, etag = exportcache.lookup(self.trial.pk, 'reports.csv')
+        expected = ''.join(export.encode(export.REPORT_FIELDS,
+                                         export.report_rows(self.trial)))
+        self.assertEqual(expected, open(path).read())
+        path, etag = exportcache.lookup(self.trial.pk, 'reports.csv.gz')
+        self.assertEqual(expected, gzip.open(path).read())
+
+    def test_content_addressed(self):
+        "Files are named by their contents, so rebuilding is idempotent"
+        first = exportcache.build(self.trial)
+        self.assertEqual(first, exportcache.build(self.trial))
+        path, etag = exportcache.lookup(self.trial.pk, 'reports.ndjson')
+        self.assertEqual(first['reports.ndjson'], os.path.basename(path))
+        self.assertTrue(os.path.basename(path).startswith(etag))
+
+    def test_lookup_missing(self):
+        "Nothing cached"
+        self.assertEqual(None, exportcache.lookup(self.trial.pk, 'reports.csv'))
+        exportcache.build(self.trial)
+        exportcache.invalidate(self.trial.pk)
+        self.assertEqual(None, exportcache.lookup(self.trial.pk, 'reports.csv'))
+
+    def test_stop_builds(self):
+        "Stopping a trial builds its exports"
+        self.trial.stop()
+        self.assertNotEqual(None, exportcache.lookup(self.trial.pk, 'reports.csv'))
+        self.assertNotEqual(None, exportcache.lookup(self.trial.pk, 'participants.csv'))
+
+    def test_report_changes_invalidate(self):
+        "Editing a stopped trial's reports forgets its exports"
+        self.trial.stop()
+        report = self.trial.report_set.all()[0]
+        report.score = 10
+        report.save()
+        self.assertEqual(None, exportcache.lookup(self.trial.pk, 'reports.csv'))
+        exportcache.build(self.trial)
+        report.delete()
+        self.assertEqual(None, exportcache.lookup(self.trial.pk, 'reports.csv'))
+
+    def test_participant_changes_invalidate(self):
+        "So does adding participants"
+        self.trial.stop()
+        models.Participant(trial=self.trial, identifier='late').save()
+        self.assertEqual(None, exportcache.lookup(self.trial.pk, 'participants.csv'))
+
+    def test_running_trial_untouched(self):
+        "Running trials have nothing to forget"
+        exportcache.build(self.trial)
+        models.Participant(trial=self.trial, identifier='p').save()
+        self.assertNotEqual(None, exportcache.lookup(self.trial.pk, 'reports.csv'))
+
+    def test_evict_age(self):
+        "Files that haven't been used for too long go"
+        exportcache.build(self.trial)
+        path, etag = exportcache.lookup(self.trial.pk, 'reports.csv')
+        old = time.time() - 7200
+        os.utime(path, (old, old))
+        self.assertEqual(1, exportcache.evict())
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(None, exportcache.lookup(self.trial.pk, 'reports.csv'))
+
+    def test_evict_size(self):
+        "The least recently used files go first"
+        manifest = exportcache.build(self.trial)
+        old = time.time() - 60
+        for name in manifest.values():
+            os.utime(os.path.join(self.dir, 'objects', name), (old, old))
+        path, etag = exportcache.lookup(self.trial.pk, 'reports.csv')
+        size = os.path.getsize(path)
+        self.assertEqual(len(manifest) - 1, exportcache.evict(max_bytes=size))
+        self.assertNotEqual(None, exportcache.lookup(self.trial.pk, 'reports.csv'))
+
+    def test_view_serves_cached(self):
+        "No database work and a strong ETag"
+        exportcache.build(self.trial)
+        request = RequestFactory().get('/')
+        with self.settings(DEBUG=False):
+            with patch.object(models.Trial.objects, 'get') as pget:
+                resp = TrialAsCsvView.as_view()(request, pk=self.trial.pk)
+            self.assertEqual(0, pget.call_count)
+        path, etag = exportcache.lookup(self.trial.pk, 'reports.csv')
+        self.assertEqual('"{0}"'.format(etag), resp['ETag'])
+        self.assertEqual('/protected/{0}'.format(path), resp['X-Accel-Redirect'])
+
+    def test_view_not_modified(self):
+        "Should 304"
+        exportcache.build(self.trial)
+        path, etag = exportcache.lookup(self.trial.pk, 'reports.csv')
+        request = RequestFactory().get('/', HTTP_IF_NONE_MATCH='"{0}"'.format(etag))
+        resp = TrialAsCsvView.as_view()(request, pk=self.trial.pk)
+        self.assertEqual(304, resp.status_code)
@@ -0,0 +1,105 @@
+"""
+Unittests for bulk ingestion of offline trial data
+"""
+from django.test import TestCase, TransactionTestCase
+
+from rm import exceptions
+from rm.trials import ingest, models
+
+class ParticipantsTestCase(TestCase):
+
+    def setUp(self):
+        super(ParticipantsTestCase, self).setUp()
+        self.user = models.User(email='larry@example.com', pk=1)
+        self.user.save()
+        self.trial = models.Trial(title='This', min_participants=20,
+                                  owner=self.user, offline=True)
+        self.trial.save()
+
+    def test_adds_participants(self):
+        "Every identifier gets a participant and a group"
+        lines = ['p{0}\n'.format(i) for i in range(25)]
+        self.assertEqual(25, ingest.participants(self.trial, lines, chunk_size=10))
+        self.assertEqual(25, self.trial.participant_set.count())
+        self.assertEqual(0, self.trial.participant_set.filter(group__isnull=True).count())
+        self.assertEqual(['p0', 'p1'], list(self.trial.participant_set.order_by(
+                    'pk').values_list('identifier', flat=True)[:2]))
+        trial = models.Trial.objects.get(pk=self.trial.pk)
+        self.assertEqual(25, trial.participant_count)
+        self.assertEqual(25, trial.group_a_count + trial.group_b_count)
+
+    def test_follows_allocation_sequence(self):
+        "Groups come from the trial's allocation sequence in order"
+        ingest.participants(self.trial, ['p{0}'.format(i) for i in range(8)], chunk_size=3)
+        sequence = models.AllocationSequence.objects.get(trial=self.trial)
+        names = self.trial.participant_set.order_by('pk').values_list('group__name', flat=True)
+        self.assertEqual(sequence.sequence[:8], ''.join(names))
+
+
+class ParticipantsTransactionTestCase(TransactionTestCase):
+
+    def setUp(self):
+        super(ParticipantsTransactionTestCase, self).setUp()
+        self.user = models.User(email='larry@example.com', pk=1)
+        self.user.save()
+        self.trial = models.Trial(title='This', min_participants=20,
+                                  owner=self.user, offline=True)
+        self.trial.save()
+
+    def test_invalid_identifier(self):
+        "A bad line anywhere means nobody is added"
+        lines = ['p{0}'.format(i) for i in range(25)] + ['not valid']
+        with self.assertRaises(exceptions.InvalidIdentifierError) as cm:
+            ingest.participants(self.trial, lines, chunk_size=10)
+        self.assertEqual((26,), cm.exception.args)
+        self.assertEqual(0, self.trial.participant_set.count())
+
+
+class ResultsTestCase(TestCase):
+
+    def setUp(self):
+        super(ResultsTestCase, self).setUp()
+        self.user = models.User(email='larry@example.com', pk=1)
+        self.user.save()
+        self.trial = models.Trial(title='This', min_participants=20,
+                                  owner=self.user, offline=True)
+        self.trial.save()
+        self.variable = models.Variable(trial=self.trial, style=models.Variable.SCORE)
+        self.variable.save()
+        ingest.participants(self.trial, ['p{0}'.format(i) for i in range(6)])
+
+    def test_adds_reports(self):
+        "Each row becomes a report in the participant's group"
+        lines = ['identifier,group,result\n'] + [
+            'p{0},A,{1}\n'.format(i, i * 2) for i in range(6)]
+        self.assertEqual(6, ingest.results(self.trial, lines, chunk_size=4))
+        for participant in self.trial.participant_set.all():
+            report = participant.report_set.get()
+            self.assertEqual(participant.group_id, report.group_id)
+            self.assertEqual(int(participant.identifier[1:]) * 2, report.score)
+
+    def test_updates_statistics(self):
+        "The running statistics include the imported reports"
+        ingest.results(self.trial, ['p{0},A,3'.format(i) for i in range(6)])
+        stats = self.trial.group_statistics()
+        self.assertEqual(6, stats['A'].nobs + stats['B'].nobs)
+        self.assertEqual(6, models.Trial.objects.get(pk=self.trial.pk).report_count)
+
+    def test_binary(self):
+        "Binary results are read as yes/no, not as any non-empty string"
+        self.variable.style = models.Variable.BINARY
+        self.variable.save()
+        ingest.results(self.trial, ['p0,A,0', 'p1,A,yes'])
+        reports = self.trial.report_set.order_by('participant__identifier')
+        self.assertEqual([False, True], [r.binary for r in reports])
+
+    def test_collects_errors(self):
+        "Every bad row is reported"
+        lines = ['p0,A,3', 'nobody,A,3', 'p1,A', 'p2,A,lots']
+        with self.assertRaises(exceptions.InvalidResultsError) as cm:
+            ingest.results(self.trial, lines)
+        errors = cm.exception.args[0]
+        self.assertEqual(3, len(errors))
+        self.assertTrue(errors[0].startswith('Line 2:'))
+        self.assertTrue(errors[1].startswith('Line 3:'))
+        self.assertTrue(errors[2].startswith('Line 4:'))
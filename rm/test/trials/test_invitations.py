@@ -0,0 +1,132 @@
+"""
+Unittests for bulk invitations
+"""
+import unittest
+
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.utils import simplejson
+from mock import patch
+
+from rm import exceptions
+from rm.trials import ingest, mailing, models
+from rm.trials.views import BulkInviteTrial, InvitationProgress
+
+class EmailsTestCase(unittest.TestCase):
+
+    def test_pasted(self):
+        "Any separators, names ignored, duplicates dropped"
+        found, invalid = ingest.emails([
+                'larry@example.com, Moe <MOE@example.com>; curly@example.com',
+                'larry@example.com\tnot@valid@', ''])
+        self.assertEqual(['larry@example.com', 'moe@example.com', 'curly@example.com'], found)
+        self.assertEqual(['not@valid@'], invalid)
+
+    def test_csv(self):
+        "Addresses in any column, header and all"
+        found, invalid = ingest.emails(['name,email\n', 'Larry,"larry@example.com"\n'])
+        self.assertEqual(['larry@example.com'], found)
+        self.assertEqual([], invalid)
+
+
+@patch.object(models.Trial, 'get_absolute_url', lambda self: '/trials/{0}'.format(self.pk))
+class InvitationsTestCase(TestCase):
+
+    def setUp(self):
+        super(InvitationsTestCase, self).setUp()
+        mail.outbox = []
+        self.owner = models.User(email='owner@example.com', username='owner', pk=1)
+        self.owner.save()
+        self.trial = models.Trial(title='Coffee', min_participants=20, owner=self.owner,
+                                  recruitment=models.Trial.INVITATION)
+        self.trial.save()
+        models.Invitation(trial=self.trial, email='Larry@example.com', sent=True).save()
+
+    def test_invitations(self):
+        "Only new addresses are invited, in one query for the old ones"
+        lines = ['larry@example.com', 'moe@example.com', 'curly@example.com', 'nope@']
+        with self.assertNumQueries(2):
+            invited = ingest.invitations(self.trial, lines, chunk_size=10)
+        self.assertEqual((2, 1, ['nope@']), invited)
+        self.assertEqual(['Larry@example.com', 'curly@example.com', 'moe@example.com'],
+                         sorted(self.trial.invitation_set.values_list('email', flat=True)))
+
+    def test_too_many(self):
+        "There's a limit"
+        with patch.object(ingest, 'MAX_INVITATIONS', 1):
+            with self.assertRaises(exceptions.TooManyInvitationsError):
+                ingest.invitations(self.trial, ['moe@example.com', 'curly@example.com'])
+        self.assertEqual(1, self.trial.invitation_set.count())
+
+    def test_send(self):
+        "Unsent invitations go out in batches, rendered once"
+        ingest.invitations(self.trial, ['p{0}@example.com'.format(i) for i in range(5)])
+        self.assertEqual(dict(invited=6, sent=1, pending=5),
+                         models.Invitation.progress(self.trial))
+        with patch.object(mailing, 'render', wraps=mailing.render) as render:
+            self.assertEqual(5, mailing.invitations(self.trial, batch_size=2))
+        self.assertEqual(1, render.call_count)
+        self.assertEqual(5, len(mail.outbox))
+        self.assertIn('Coffee', mail.outbox[0].subject)
+        self.assertEqual(dict(invited=6, sent=6, pending=0),
+                         models.Invitation.progress(self.trial))
+        self.assertEqual(0, mailing.invitations(self.trial))
+
+
+@patch.object(models.Trial, 'get_absolute_url', lambda self: '/trials/{0}'.format(self.pk))
+@patch('rm.trials.views.reverse', lambda name, kwargs: '/trials/{0}/invite/progress'.format(
+        kwargs['pk']))
+class BulkInviteViewTestCase(TestCase):
+
+    def setUp(self):
+        super(BulkInviteViewTestCase, self).setUp()
+        mail.outbox = []
+        self.factory = RequestFactory()
+        self.owner = models.User(email='owner@example.com', username='owner', pk=1)
+        self.owner.save()
+        self.trial = models.Trial(title='Coffee', min_participants=20, owner=self.owner,
+                                  recruitment=models.Trial.INVITATION)
+        self.trial.save()
+
+    def post(self, data, user=None):
+        request = self.factory.post('/trials/{0}/invite/bulk'.format(self.trial.pk), data)
+        request.user = user or self.owner
+        return BulkInviteTrial.as_view()(request, pk=self.trial.pk)
+
+    def test_pasted(self):
+        "Pasted lists are invited and sent"
+        response = self.post({'emails': 'moe@example.com\ncurly@example.com'})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(dict(invited=2, duplicates=0, invalid=[],
+                              progress='/trials/{0}/invite/progress'.format(self.trial.pk)),
+                         simplejson.loads(response.content))
+        self.assertEqual(2, len(mail.outbox))
+
+    def test_csv(self):
+        "So are uploads"
+        upload = SimpleUploadedFile('clinic.csv', 'name,email\nMoe,moe@example.com\n')
+        response = self.post({'csv': upload})
+        self.assertEqual(1, simplejson.loads(response.content)['invited'])
+        request = self.factory.get('/')
+        request.user = self.owner
+        progress = InvitationProgress.as_view()(request, pk=self.trial.pk)
+        self.assertEqual(dict(invited=1, sent=1, pending=0), simplejson.loads(progress.content))
+
+    def test_nothing(self):
+        "We need something to go on"
+        self.assertEqual(400, self.post({}).status_code)
+
+    def test_not_owner(self):
+        "Only the owner can invite people"
+        other = models.User(email='other@example.com', username='other')
+        other.save()
+        self.assertEqual(403, self.post({'emails': 'moe@example.com'}, user=other).status_code)
+
+    def test_not_invitation_only(self):
+        "Only to invitation only trials"
+        self.trial.recruitment = models.Trial.ANYONE
+        self.trial.save()
+        self.assertEqual(403, self.post({'emails': 'moe@example.com'}).status_code)
+        self.assertEqual(0, self.trial.invitation_set.count())
@@ -0,0 +1,120 @@
+"""
+Unittests for keyset pagination
+"""
+import datetime
+import unittest
+
+from django.http import Http404
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.utils import simplejson, timezone
+from mock import patch
+
+from rm import exceptions
+from rm.trials import keyset, models
+from rm.trials.views import ActiveTrialsView
+
+class CursorTestCase(unittest.TestCase):
+
+    def test_roundtrip(self):
+        "Cursors decode to what we encoded"
+        created = datetime.datetime(2013, 6, 1, 12, 30, 5, 123, tzinfo=timezone.utc)
+        self.assertEqual([created, 42], keyset.decode(keyset.encode([created, 42])))
+        self.assertEqual([0.1, 3], keyset.decode(keyset.encode([0.1, 3])))
+
+    def test_invalid(self):
+        "Rubbish cursors are errors"
+        for cursor in ['!!!', 'e30', keyset.encode(['not a date']), keyset.encode([None])]:
+            with self.assertRaises(exceptions.InvalidCursorError):
+                keyset.decode(cursor)
+
+
+class PageTestCase(TestCase):
+
+    def setUp(self):
+        super(PageTestCase, self).setUp()
+        self.user = models.User(email='larry@example.com', pk=1)
+        self.user.save()
+        start = datetime.datetime(2013, 6, 1, tzinfo=timezone.utc)
+        for i in range(11):
+            # Pairs of trials created at the same moment
+            created = start + datetime.timedelta(days=i // 2)
+            models.Trial(title=str(i), min_participants=20, owner=self.user,
+                         created=created).save()
+        self.trials = models.Trial.objects.with_votes()
+
+    def test_pages(self):
+        "Every trial once, newest first, one query per page"
+        seen, cursor = [], None
+        while True:
+            with self.assertNumQueries(1):
+                page = keyset.page(self.trials, ('created', 'pk'), cursor=cursor, size=3)
+            seen.extend(t.pk for t in page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        expected = list(self.trials.order_by('-created', '-pk').values_list('pk', flat=True))
+        self.assertEqual(expected, seen)
+
+    def test_last_page(self):
+        "An exact final page has no next"
+        page = keyset.page(self.trials, ('created', 'pk'), size=11)
+        self.assertEqual(11, len(page))
+        self.assertEqual(False, page.has_next())
+
+
+class KeysetViewTestCase(TestCase):
+
+    def setUp(self):
+        super(KeysetViewTestCase, self).setUp()
+        self.user = models.User(email='larry@example.com', pk=1)
+        self.user.save()
+        for i in range(keyset.PAGE_SIZE + 5):
+            models.Trial(title=str(i), min_participants=20, owner=self.user).save()
+        models.Trial(title='secret', min_participants=20, owner=self.user, private=True).save()
+
+    def get(self, **params):
+        request = RequestFactory().get('/trials/active', params)
+        request.user = self.user
+        return ActiveTrialsView.as_view()(request)
+
+    def test_html(self):
+        "Pages link to the next"
+        response = self.get()
+        self.assertEqual(keyset.PAGE_SIZE, len(response.context_data['trials']))
+        cursor = response.context_data['page_obj'].next_cursor
+        self.assertEqual('/trials/active?cursor=' + cursor, response.context_data['next_url'])
+        response = self.get(cursor=cursor)
+        self.assertEqual(5, len(response.context_data['trials']))
+        self.assertEqual(None, response.context_data['next_url'])
+
+    @patch.object(models.Trial, 'get_absolute_url', lambda self: '/trials/{0}'.format(self.pk))
+    def test_json(self):
+        "The JSON variant carries the next link"
+        data = simplejson.loads(self.get(format='json').content)
+        self.assertEqual(keyset.PAGE_SIZE, len(data['trials']))
+        self.assertEqual(0, data['trials'][0]['score'])
+        self.assertIn('format=json', data['next'])
+        self.assertNotIn('secret', [t['title'] for t in data['trials']])
+
+    def test_bad_cursor(self):
+        "Rubbish cursors are not found"
+        with self.assertRaises(Http404):
+            self.get(cursor='rubbish')
+
+    def test_hot(self):
+        "Hot ordering pages by hotness"
+        trials = list(models.Trial.objects.filter(private=False))
+        for i, trial in enumerate(trials):
+            models.TrialRanking(trial=trial, score=i % 3, hotness=i % 3).save()
+        seen, cursor = [], None
+        while True:
+            params = dict(order='hot')
+            if cursor:
+                params['cursor'] = cursor
+            page = self.get(**params).context_data['page_obj']
+            seen.extend(t.pk for t in page)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(list(models.Trial.objects.hot().values_list('pk', flat=True)), seen)
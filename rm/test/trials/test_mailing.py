@@ -0,0 +1,102 @@
+"""
+Unittests for the batched participant emails
+"""
+from django.core import mail
+from django.test import TestCase
+from mock import patch
+
+from rm.trials import mailing, models
+
+@patch.object(models.Trial, 'get_absolute_url', lambda self: '/trials/{0}'.format(self.pk))
+class MailingTestCase(TestCase):
+
+    def setUp(self):
+        super(MailingTestCase, self).setUp()
+        mail.outbox = []
+        self.owner = models.User(email='owner@example.com', username='owner', pk=1)
+        self.owner.save()
+        self.trial = models.Trial(title='Coffee', min_participants=20, owner=self.owner,
+                                  group_a='Drink coffee', group_b='Drink tea')
+        self.trial.save()
+        models.Variable(trial=self.trial, question='How awake?').save()
+        models.Participant(trial=self.trial, user=self.owner).randomise()
+        for i in range(6):
+            user = models.User(email='p{0}@example.com'.format(i), username='p{0}'.format(i),
+                               receive_emails=(i != 0))
+            user.save()
+            models.Participant(trial=self.trial, user=user).randomise()
+
+    def test_instructions(self):
+        "Everyone who wants email gets their group's instructions"
+        with patch.object(mailing, 'render', wraps=mailing.render) as render:
+            self.assertEqual(6, mailing.instructions(self.trial))
+        self.assertEqual(2, render.call_count)
+        self.assertNotIn(['p0@example.com'], [m.to for m in mail.outbox])
+        groups = dict(models.Participant.objects.values_list('user__email', 'group__name'))
+        for message in mail.outbox:
+            expected = {'A': 'Drink coffee', 'B': 'Drink tea'}[groups[message.to[0]]]
+            self.assertIn(expected, message.body)
+            self.assertIn('How awake?', message.alternatives[0][0])
+
+    def test_instructions_some(self):
+        "Only those asked for"
+        participant = models.Participant.objects.get(user__username='p3')
+        self.assertEqual(1, mailing.instructions(self.trial, [participant.pk]))
+        self.assertEqual([['p3@example.com']], [m.to for m in mail.outbox])
+
+    def test_ended(self):
+        "Everyone but the owner hears it's over"
+        self.assertEqual(5, mailing.ended(self.trial))
+        recipients = sorted(m.to[0] for m in mail.outbox)
+        self.assertEqual(['p{0}@example.com'.format(i) for i in range(1, 6)], recipients)
+        self.assertIn('Coffee', mail.outbox[0].subject)
+
+    def test_batches(self):
+        "One connection, many batches"
+        with patch.object(mailing, 'get_connection', wraps=mailing.get_connection) as conn:
+            self.assertEqual(5, mailing.send([mailing.message('x@example.com', 's', 'b', None)
+                                              for i in range(5)], batch_size=2))
+        self.assertEqual(1, conn.call_count)
+        self.assertEqual(5, len(mail.outbox))
+
+    def test_stop_queues(self):
+        "Stopping a trial hands the emails to the queue"
+        with patch('rm.trials.tasks.send_ended_notifications.delay') as delay:
+            with patch('rm.trials.exportcache.build'):
+                self.trial.stop()
+        delay.assert_called_once_with(self.trial.pk)
+
+    def test_compiled_once(self):
+        "Each group's body is rendered once, however many we send"
+        with patch.object(mailing, 'render', wraps=mailing.render) as render:
+            with patch.object(mailing, '_question', wraps=mailing._question) as question:
+                for participant in models.Participant.objects.exclude(user=self.owner):
+                    participant.send_instructions()
+                mailing.instructions(self.trial)
+        self.assertEqual(2, render.call_count)
+        self.assertEqual(2, question.call_count)
+        self.assertEqual(11, len(mail.outbox))
+        for message in mail.outbox:
+            self.assertIn('How awake?', message.alternatives[0][0])
+
+    def test_compiled_per_template(self):
+        "Instructions and reminders don't share bodies"
+        instructions = mailing.instructions_body(self.trial, 'A')
+        reminder = mailing.reminder_body(self.trial, 'A')
+        self.assertNotEqual(instructions, reminder)
+        self.assertIn('How awake?', reminder[1])
+
+    def test_compiled_trial_saved(self):
+        "Saving the trial means compiling afresh"
+        self.assertIn('Drink coffee', mailing.instructions_body(self.trial, 'A')[0])
+        self.trial.group_a = 'Drink espresso'
+        self.trial.save()
+        self.assertIn('Drink espresso', mailing.instructions_body(self.trial, 'A')[0])
+
+    def test_compiled_variable_saved(self):
+        "As does saving one of its variables"
+        self.assertIn('How awake?', mailing.reminder_body(self.trial, 'B')[1])
+        variable = self.trial.variable_set.get()
+        variable.question = 'How alert?'
+        variable.save()
+        self.assertIn('How alert?', mailing.reminder_body(self.trial, 'B')[1])
@@ -5,11 +5,17 @@ import datetime
 import unittest
 
 from django.core import mail
-from django.test import utils, TestCase
+from django.db import IntegrityError
+from django.db.models.query import QuerySet
+from django.test import utils, TestCase, TransactionTestCase
 from mock import MagicMock, patch
+import numpy as np
+from scipy import stats as scistats
+from statsmodels.stats.weightstats import ttest_ind
 
 from rm import exceptions
-from rm.trials import models
+from rm.stats.utils import pooled_ttest
+from rm.trials import analysis, models, randomisation
 
 def setup_module():
     utils.setup_test_environment()
@@ -105,24 +111,26 @@ class TrialTestCase(TemporalTestCase):
         pset.filter.assert_called_once_with(group__isnull=False)
         pset.filter.return_value.count.assert_called_once_with()
 
-    @patch.object(models.Trial, 'participant_set')
-    def test_randomise(self, pset):
+    def test_randomise(self):
         "Randomise the participants"
-        trial = models.Trial()
-        part1, part2 = MagicMock(), MagicMock()
-        pset.all.return_value = [part1, part2]
-        pset.filter.return_value.count.return_value = 0
-
-        groups = [models.Group(trial=trial, name='A'),
-                  models.Group(trial=trial, name='B')]
+        owner = models.User(pk=1)
+        owner.save()
+        trial = models.Trial(owner=owner, min_participants=2, offline=True)
+        trial.save()
+        for i in range(20):
+            models.Participant(trial=trial, identifier=str(i)).save()
 
-        with patch.object(trial, 'ensure_groups') as psure:
-            psure.return_value = groups
+        trial.randomise(seed=42)
 
-            trial.randomise()
-            for participant in [part1, part2]:
-                self.assertTrue(participant.group in groups)
-                participant.save.assert_called_once_with()
+        groups = list(trial.ensure_groups())
+        self.assertEqual(0, trial.participant_set.filter(group__isnull=True).count())
+        self.assertEqual(42, models.Trial.objects.get(pk=trial.pk).randomisation_seed)
+        pks = trial.participant_set.order_by('pk').values_list('pk', flat=True)
+        expected = randomisation.allocate(list(pks), groups, 42)
+        for group in groups:
+            self.assertEqual(sorted(expected[group]),
+                             sorted(trial.participant_set.filter(
+                        group=group).values_list('pk', flat=True)))
 
     def test_send_instructions_finished(self):
         "Should raise"
@@ -130,15 +138,12 @@ class TrialTestCase(TemporalTestCase):
         with self.assertRaises(exceptions.TrialFinishedError):
             trial.send_instructions()
 
-    @patch.object(models.Trial, 'participant_set')
-    def test_send_instructions(self, pset):
-        "Should email participants."
-        part1, part2 = MagicMock(), MagicMock()
-        pset.all.return_value = [part1, part2]
-        trial = models.Trial()
+    @patch('rm.trials.tasks.send_instructions.delay')
+    def test_send_instructions(self, delay):
+        "Should queue emails to the participants."
+        trial = models.Trial(pk=3)
         trial.send_instructions()
-        for participant in [part1, part2]:
-            participant.send_instructions.assert_called_once_with()
+        delay.assert_called_once_with(3)
 
     def test_is_invitation_only(self):
         "Model predicates"
@@ -200,6 +205,251 @@ class ParticipantTestCase(TestCase):
         self.assertEqual(['larry@example.com'], mail.outbox[0].to)
 
 
+class AllocationSequenceTestCase(TestCase):
+
+    def setUp(self):
+        super(AllocationSequenceTestCase, self).setUp()
+        self.user = models.User(email='larry@example.com', pk=1)
+        self.user.save()
+        self.trial = models.Trial(title='This', min_participants=20, owner=self.user)
+        self.trial.save()
+
+    def test_claim_creates_sequence(self):
+        "The first claim sets up the groups and the sequence"
+        group = models.AllocationSequence.claim(self.trial)[0]
+        sequence = models.AllocationSequence.objects.get(trial=self.trial)
+        self.assertEqual(1, sequence.cursor)
+        self.assertEqual(sequence.sequence[0], group.name)
+        self.assertEqual(2, self.trial.group_set.count())
+        self.assertEqual(group, self.trial.group_set.get(name=group.name))
+
+    def test_claim_balanced(self):
+        "Every complete block is split evenly"
+        size = models.AllocationSequence.BLOCK_SIZE
+        names = [g.name for g in models.AllocationSequence.claim(self.trial, count=size * 10)]
+        for i in range(0, len(names), size):
+            self.assertEqual(size / 2, names[i:i + size].count('A'))
+
+    def test_claim_extends(self):
+        "Claiming past the end grows the sequence without changing it"
+        models.AllocationSequence.claim(self.trial)
+        sequence = models.AllocationSequence.objects.get(trial=self.trial)
+        start = sequence.sequence
+        models.AllocationSequence.claim(self.trial, count=len(start) + 1)
+        sequence = models.AllocationSequence.objects.get(trial=self.trial)
+        self.assertEqual(len(start) + 2, sequence.cursor)
+        self.assertTrue(sequence.sequence.startswith(start))
+
+    def test_participant_randomise(self):
+        "Participants take consecutive slots"
+        for i in range(4):
+            models.Participant(trial=self.trial, identifier=str(i)).randomise()
+        sequence = models.AllocationSequence.objects.get(trial=self.trial)
+        names = [p.group.name for p in self.trial.participant_set.order_by('pk')]
+        self.assertEqual(sequence.sequence[:4], ''.join(names))
+
+    def test_claim_race(self):
+        "If someone else creates the sequence first, we use theirs"
+        get_or_create = QuerySet.get_or_create
+        def lose(queryset, **kwargs):
+            if queryset.model is models.AllocationSequence:
+                get_or_create(queryset, **kwargs)
+                raise IntegrityError()
+            return get_or_create(queryset, **kwargs)
+        with patch.object(QuerySet, 'get_or_create', lose):
+            group = models.AllocationSequence.claim(self.trial)[0]
+        sequence = models.AllocationSequence.objects.get(trial=self.trial)
+        self.assertEqual(1, sequence.cursor)
+        self.assertEqual(sequence.sequence[0], group.name)
+
+
+class AllocationSequenceTransactionTestCase(TransactionTestCase):
+
+    def setUp(self):
+        super(AllocationSequenceTransactionTestCase, self).setUp()
+        self.user = models.User(email='larry@example.com', pk=1)
+        self.user.save()
+        self.trial = models.Trial(title='This', min_participants=20, owner=self.user)
+        self.trial.save()
+
+    def test_randomise_failed_save(self):
+        "A participant who can't be saved doesn't use up a slot"
+        models.AllocationSequence.claim(self.trial)
+        participant = models.Participant(trial=self.trial, identifier='1')
+        with patch.object(models.Trial, 'adjust_counts', side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                participant.randomise()
+        self.assertEqual(1, models.AllocationSequence.objects.get(trial=self.trial).cursor)
+        self.assertEqual(0, self.trial.participant_set.count())
+
+
+class TrialCountersTestCase(TestCase):
+
+    def setUp(self):
+        super(TrialCountersTestCase, self).setUp()
+        self.user = models.User(email='larry@example.com', pk=1)
+        self.user.save()
+        self.trial = models.Trial(title='This', min_participants=20, owner=self.user)
+        self.trial.save()
+        self.variable = models.Variable(question='Why?', trial=self.trial)
+        self.variable.save()
+
+    def fresh(self):
+        return models.Trial.objects.get(pk=self.trial.pk)
+
+    def counts(self, trial):
+        return [getattr(trial, c) for c in models.Trial.COUNTERS]
+
+    def test_participants(self):
+        "Joining and randomising updates the counters"
+        for i in range(5):
+            models.Participant(trial=self.trial, identifier=str(i)).randomise()
+        trial = self.fresh()
+        self.assertEqual(5, trial.participant_count)
+        self.assertEqual(5, trial.group_a_count + trial.group_b_count)
+        self.assertEqual(15, trial.needs())
+        self.assertEqual(self.counts(trial), self.counts(self.trial))
+
+    def test_participant_delete(self):
+        "Deleting takes them off again"
+        participant = models.Participant(trial=self.trial, identifier='x').randomise()
+        participant.delete()
+        self.assertEqual([0, 0, 0, 0], self.counts(self.fresh()))
+
+    def test_bulk_randomise(self):
+        "Trial.randomise() fills in the group counters"
+        for i in range(6):
+            models.Participant(trial=self.trial, identifier=str(i)).save()
+        self.trial.randomise(seed=3)
+        trial = self.fresh()
+        self.assertEqual(6, trial.participant_count)
+        self.assertEqual(trial.participant_set.filter(group__name='A').count(),
+                         trial.group_a_count)
+        self.assertEqual(6, trial.group_a_count + trial.group_b_count)
+
+    def test_reports(self):
+        "Only completed reports count"
+        groupa, groupb = self.trial.ensure_groups()
+        report = models.Report(trial=self.trial, group=groupa, variable=self.variable)
+        report.save()
+        self.assertEqual(0, self.fresh().report_count)
+        report.date = datetime.date.today()
+        report.score = 3
+        report.save()
+        report.save()
+        self.assertEqual(1, self.fresh().report_count)
+        self.assertEqual(1, self.fresh().num_reports())
+        report.delete()
+        self.assertEqual(0, self.fresh().report_count)
+
+    def test_save_keeps_counters(self):
+        "Saving a stale trial doesn't overwrite the counters"
+        stale = self.fresh()
+        models.Participant(trial=self.trial, identifier='x').randomise()
+        stale.title = 'That'
+        stale.save()
+        trial = self.fresh()
+        self.assertEqual('That', trial.title)
+        self.assertEqual(1, trial.participant_count)
+
+    def test_recount(self):
+        "Recounting agrees with the maintained counters"
+        for i in range(5):
+            models.Participant(trial=self.trial, identifier=str(i)).randomise()
+        expected = self.counts(self.fresh())
+        models.Trial.objects.filter(pk=self.trial.pk).update(
+            participant_count=0, group_a_count=0, group_b_count=0)
+        trial = self.fresh()
+        trial.recount()
+        self.assertEqual(expected, self.counts(trial))
+        self.assertEqual(expected, self.counts(self.fresh()))
+
+
+class TrialRankingTestCase(TestCase):
+
+    def setUp(self):
+        super(TrialRankingTestCase, self).setUp()
+        from django.contrib.contenttypes.models import ContentType
+        self.user = models.User(email='larry@example.com', pk=1)
+        self.user.save()
+        self.now = datetime.datetime(2013, 6, 1)
+        self.content_type = ContentType.objects.get_for_model(models.Trial)
+        self.trials = []
+        for i, age in enumerate([1, 8, 2, 30]):
+            trial = models.Trial(title=str(i), min_participants=20, owner=self.user,
+                                 created=self.now - datetime.timedelta(days=age))
+            trial.save()
+            self.trials.append(trial)
+
+    def vote(self, trial, score):
+        from rm.suffrage.models import VoteTally
+        VoteTally.objects.create(content_type=self.content_type, object_id=trial.pk,
+                                 pluses=score, score=score)
+
+    def test_hotness_decays(self):
+        "Scores halve every half life"
+        older = self.now - datetime.timedelta(days=models.TrialRanking.HALF_LIFE)
+        hotness = models.TrialRanking.hotness_of
+        self.assertAlmostEqual(hotness(10, older), hotness(5, self.now))
+        self.assertTrue(hotness(11, older) > hotness(5, self.now) > hotness(9, older))
+
+    def test_hotness_signs(self):
+        "Positive over nothing over negative, and negatives fade with age"
+        older = self.now - datetime.timedelta(days=30)
+        hotness = models.TrialRanking.hotness_of
+        self.assertTrue(hotness(1, older) > hotness(0, self.now) > hotness(-1, older))
+        self.assertTrue(hotness(-10, older) > hotness(-10, self.now))
+
+    def test_update_matches_rebuild(self):
+        "Re-ranking one trial when it's voted on keeps it comparable with the rest"
+        for trial, score in zip(self.trials, [4, 10, 1, 10]):
+            self.vote(trial, score)
+        models.TrialRanking.rebuild()
+        from rm.suffrage.models import VoteTally
+        VoteTally.objects.filter(object_id=self.trials[3].pk).update(score=100)
+        models.TrialRanking.update(self.trials[3])
+        updated = [t.pk for t in models.Trial.objects.hot()]
+        models.TrialRanking.rebuild()
+        self.assertEqual([t.pk for t in models.Trial.objects.hot()], updated)
+        self.assertEqual(self.trials[3].pk, updated[0])
+
+    def test_rebuild(self):
+        "Newer trials outrank older ones with the same score"
+        for trial, score in zip(self.trials, [4, 10, 1, 10]):
+            self.vote(trial, score)
+        self.trials[2].private = True
+        self.trials[2].save()
+        self.assertEqual(3, models.TrialRanking.rebuild())
+        with self.assertNumQueries(1):
+            hot = [t.pk for t in models.Trial.objects.hot()]
+        self.assertEqual([self.trials[1].pk, self.trials[0].pk, self.trials[3].pk], hot)
+
+    def test_unvoted_unranked(self):
+        "Only voted trials are ranked"
+        self.vote(self.trials[0], 0)
+        models.TrialRanking.rebuild()
+        self.assertEqual([self.trials[0].pk], [t.pk for t in models.Trial.objects.hot()])
+
+    def test_vote_cast(self):
+        "Voting re-ranks the trial"
+        from rm.suffrage.signals import vote_cast
+        self.vote(self.trials[0], 2)
+        vote_cast.send(sender=models.Trial, object_id=self.trials[0].pk,
+                       previous=None, current=1)
+        ranking = models.TrialRanking.objects.get(trial=self.trials[0])
+        self.assertEqual(2, ranking.score)
+        self.assertEqual(models.TrialRanking.hotness_of(2, self.trials[0].created),
+                         ranking.hotness)
+
+    def test_hidden_dropped(self):
+        "Hiding a trial takes it out of the rankings"
+        self.vote(self.trials[0], 2)
+        models.TrialRanking.update(self.trials[0])
+        self.trials[0].hide = True
+        models.TrialRanking.update(self.trials[0])
+        self.assertEqual(0, models.TrialRanking.objects.count())
+
+
 class ReportTestCase(TestCase):
 
     def test_reported_score(self):
@@ -258,6 +508,202 @@ class ReportTestCase(TestCase):
         self.assertEqual(2, report.get_value())
 
 
+class GroupStatisticsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.points = [3.0, 7.0, 1.0, 9.0, 4.0]
+
+    def _filled(self, points):
+        stats = models.GroupStatistics()
+        for point in points:
+            stats.add(point)
+        return stats
+
+    def test_empty(self):
+        "Nothing to describe"
+        stats = models.GroupStatistics()
+        self.assertEqual(None, stats.mean)
+        self.assertEqual(None, stats.sem)
+
+    def test_add(self):
+        "Match numpy/scipy"
+        stats = self._filled(self.points)
+        self.assertEqual(5, stats.nobs)
+        self.assertAlmostEqual(np.mean(self.points), stats.mean)
+        self.assertAlmostEqual(np.std(self.points), stats.sd)
+        self.assertAlmostEqual(scistats.sem(self.points), stats.sem)
+
+    def test_remove(self):
+        "Removing a value should undo adding it"
+        stats = self._filled(self.points + [12.0])
+        stats.remove(12.0)
+        self.assertEqual(5, stats.nobs)
+        self.assertAlmostEqual(np.mean(self.points), stats.mean)
+        self.assertAlmostEqual(scistats.sem(self.points), stats.sem)
+
+    def test_remove_last(self):
+        "Back to empty"
+        stats = self._filled([2.0])
+        stats.remove(2.0)
+        self.assertEqual(0, stats.nobs)
+        self.assertEqual(0, stats.m2)
+
+    def test_binary_counts(self):
+        "Count successes & failures"
+        stats = self._filled([1.0, 0.0, 1.0])
+        self.assertEqual(2, stats.successes)
+        self.assertEqual(1, stats.failures)
+
+    def test_combine(self):
+        "Pool two groups"
+        other = [2.0, 8.0, 5.0]
+        pooled = models.GroupStatistics.combine(self._filled(self.points),
+                                                self._filled(other))
+        self.assertEqual(8, pooled.nobs)
+        self.assertAlmostEqual(np.mean(self.points + other), pooled.mean)
+        self.assertAlmostEqual(np.std(self.points + other), pooled.sd)
+
+    def test_ttest(self):
+        "Same answer as statsmodels from the raw data"
+        other = [2.0, 8.0, 5.0]
+        a, b = self._filled(self.points), self._filled(other)
+        tstat, pval, df = pooled_ttest(a.nobs, a.mean, a.m2,
+                                              b.nobs, b.mean, b.m2)
+        expected = ttest_ind(self.points, other)
+        self.assertAlmostEqual(expected[0], tstat)
+        self.assertAlmostEqual(expected[1], pval)
+        self.assertEqual(expected[2], df)
+
+class ReportedValuesTestCase(TestCase):
+
+    def setUp(self):
+        super(ReportedValuesTestCase, self).setUp()
+        self.user = models.User(email='larry@example.com', pk=1)
+        self.user.save()
+        self.trial = models.Trial(title='This', min_participants=20, owner=self.user)
+        self.trial.save()
+        self.variable = models.Variable(question='Why?', trial=self.trial)
+        self.variable.save()
+        groupa, groupb = self.trial.ensure_groups()
+        today = datetime.date.today()
+        for group, scores in [(groupa, [3, 7, 1, 9]), (groupb, [2, 8, 5])]:
+            for score in scores:
+                models.Report(trial=self.trial, group=group, variable=self.variable,
+                              date=today, score=score).save()
+        # Not yet reported, so shouldn't count
+        models.Report(trial=self.trial, group=groupa, variable=self.variable).save()
+
+    def _binary_trial(self):
+        trial = models.Trial(title='That', min_participants=20, owner=self.user)
+        trial.save()
+        variable = models.Variable(question='Did it?', trial=trial,
+                                   style=models.Variable.BINARY)
+        variable.save()
+        groupa, groupb = trial.ensure_groups()
+        today = datetime.date.today()
+        for group, outcomes in [(groupa, [True, False, True, True]), (groupb, [False, False, True])]:
+            for outcome in outcomes:
+                models.Report(trial=trial, group=group, variable=variable,
+                              date=today, binary=outcome).save()
+        return trial
+
+    def assert_parity(self, trial):
+        """
+        Assert that the bulk and reference values for TRIAL agree on
+        everything report_on() uses, and return the contingency table.
+        """
+        bulk = analysis.reported_values(trial)
+        reference = analysis.reference_values(trial)
+        table = []
+        for name in ['A', 'B']:
+            expected, actual = np.array(reference[name], dtype=float), bulk[name]
+            self.assertEqual(sorted(expected.tolist()), sorted(actual.tolist()))
+            self.assertEqual(len(expected), len(actual))
+            self.assertAlmostEqual(expected.mean(), actual.mean())
+            self.assertAlmostEqual(expected.var(ddof=1), actual.var(ddof=1))
+            # Successes and failures
+            wanted, got = [[int((values == outcome).sum()) for outcome in [1, 0]]
+                           for values in [expected, actual]]
+            self.assertEqual(wanted, got)
+            table.append(got)
+        return table
+
+    def test_parity(self):
+        "The bulk path agrees with the per-report reference"
+        self.assert_parity(self.trial)
+
+    def test_parity_binary(self):
+        "Including the contingency table for binary variables"
+        self.assertEqual([[3, 1], [1, 2]], self.assert_parity(self._binary_trial()))
+
+    def test_running_statistics_match_rebuild(self):
+        "Incremental updates and a full rebuild give the same numbers"
+        running = self.trial.group_statistics()
+        models.GroupStatistics.rebuild(self.trial)
+        rebuilt = self.trial.group_statistics()
+        for name in ['A', 'B']:
+            self.assertEqual(running[name].nobs, rebuilt[name].nobs)
+            self.assertAlmostEqual(running[name].mean, rebuilt[name].mean)
+            self.assertAlmostEqual(running[name].m2, rebuilt[name].m2)
+
+    def test_missing_statistics_recomputed(self):
+        "Without a row to update, we recompute rather than go negative"
+        self.trial.groupstatistics_set.all().delete()
+        report = self.trial.report_set.filter(group__name='A', score=9).get()
+        report.delete()
+        stats = self.trial.group_statistics()
+        self.assertEqual(3, stats['A'].nobs)
+        self.assertAlmostEqual(11.0 / 3, stats['A'].mean)
+        self.assertEqual(3, stats['B'].nobs)
+        self.assertAlmostEqual(5.0, stats['B'].mean)
+
+    def test_missing_statistics_edit(self):
+        "Edits on a trial without running statistics recompute them"
+        self.trial.groupstatistics_set.all().delete()
+        report = self.trial.report_set.filter(group__name='B', score=2).get()
+        report.score = 5
+        report.save()
+        stats = self.trial.group_statistics()
+        self.assertEqual(3, stats['B'].nobs)
+        self.assertAlmostEqual(6.0, stats['B'].mean)
+        self.assertAlmostEqual(6.0, stats['B'].m2)
+        self.assertEqual(4, stats['A'].nobs)
+
+
+class ReportOnTestCase(TestCase):
+
+    def setUp(self):
+        super(ReportOnTestCase, self).setUp()
+        mail.outbox = []
+        self.user = models.User(email='larry@example.com', pk=1)
+        self.user.save()
+        self.trial = models.Trial(title='This', min_participants=20, owner=self.user)
+        self.trial.save()
+        variable = models.Variable(question='Did it?', trial=self.trial,
+                                   style=models.Variable.BINARY)
+        variable.save()
+        today = datetime.date.today()
+        # Nobody fails, so there's no chi2 to be had
+        for group in self.trial.ensure_groups():
+            for i in range(2):
+                models.Report(trial=self.trial, group=group, variable=variable,
+                              date=today, binary=True).save()
+
+    def test_chi2_failure(self):
+        "We're told about it, and there's no p value"
+        analysis.report_on(self.trial)
+        self.assertEqual(['Chi2 failure instance'], [m.subject for m in mail.outbox])
+        self.assertIn('ValueError', mail.outbox[0].body)
+        self.assertEqual(None, self.trial.trialanalysis_set.get().pval)
+
+    def test_chi2_failure_unsent(self):
+        "If we can't be told, it's logged"
+        with patch.object(analysis.mailing, 'send', side_effect=IOError):
+            with patch.object(analysis, 'logger') as logger:
+                analysis.report_on(self.trial)
+        self.assertEqual(1, logger.exception.call_count)
+        self.assertEqual(None, self.trial.trialanalysis_set.get().pval)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,39 @@
+"""
+Unittests for the allocation of participants to groups
+"""
+import unittest
+
+from rm.trials import randomisation
+
+class AllocateTestCase(unittest.TestCase):
+
+    def test_reproducible(self):
+        "The same seed gives the same allocation"
+        pks = range(1, 101)
+        self.assertEqual(randomisation.allocate(pks, ['A', 'B'], 7),
+                         randomisation.allocate(pks, ['A', 'B'], 7))
+
+    def test_everyone_allocated(self):
+        "Every participant ends up in exactly one group"
+        pks = range(1, 101)
+        allocation = randomisation.allocate(pks, ['A', 'B'], 7)
+        self.assertEqual(pks, sorted(allocation['A'] + allocation['B']))
+
+    def test_empty_groups_present(self):
+        "Groups nobody was allocated to are still in the result"
+        self.assertEqual({'A': [], 'B': []},
+                         randomisation.allocate([], ['A', 'B'], 7))
+
+
+class PermutedBlocksTestCase(unittest.TestCase):
+
+    def test_prefix(self):
+        "A longer sequence starts with the shorter one"
+        short = randomisation.permuted_blocks(7, 10, 'AB', 4)
+        self.assertEqual(short, randomisation.permuted_blocks(7, 20, 'AB', 4)[:40])
+
+    def test_blocks_balanced(self):
+        "Each block has as many As as Bs"
+        sequence = randomisation.permuted_blocks(7, 50, 'AB', 4)
+        for i in range(0, len(sequence), 4):
+            self.assertEqual(2, sequence[i:i + 4].count('A'))
@@ -0,0 +1,85 @@
+"""
+Unittests for scheduled messages
+"""
+import datetime
+
+from django.core import mail
+from django.test import TestCase
+from django.utils import timezone
+from mock import patch
+
+from rm.trials import models
+from rm.trials.models import ScheduledMessage
+
+@patch.object(models.Trial, 'get_absolute_url', lambda self: '/trials/{0}'.format(self.pk))
+class ScheduledMessageTestCase(TestCase):
+
+    def setUp(self):
+        super(ScheduledMessageTestCase, self).setUp()
+        mail.outbox = []
+        self.now = timezone.now()
+        self.later = self.now + datetime.timedelta(days=1, minutes=1)
+        self.user = models.User(email='larry@example.com', username='larry', pk=1)
+        self.user.save()
+        self.trial = models.Trial(title='Coffee', min_participants=1, owner=self.user,
+                                  n1trial=True, group_a='Drink coffee', group_b='Drink tea')
+        self.trial.save()
+        self.variable = models.Variable(trial=self.trial, question='How awake?')
+        self.variable.save()
+        groupa, groupb = self.trial.ensure_groups()
+        self.participant = models.Participant(trial=self.trial, user=self.user, group=groupa)
+        self.participant.save()
+        self.report = models.Report(trial=self.trial, participant=self.participant,
+                                    group=groupa, variable=self.variable)
+        self.report.save()
+
+    def test_remind(self):
+        "A report only gets the one reminder"
+        ScheduledMessage.remind(self.report, self.now)
+        ScheduledMessage.remind(self.report, self.later)
+        message = ScheduledMessage.objects.get()
+        self.assertEqual(self.later, message.due)
+        self.assertEqual(self.participant.pk, message.participant_id)
+
+    def test_sweep_reminder(self):
+        "Due reminders are sent and forgotten"
+        ScheduledMessage.remind(self.report, self.now)
+        self.assertEqual(1, ScheduledMessage.sweep(now=self.later))
+        self.assertEqual(['larry@example.com'], mail.outbox[0].to)
+        self.assertIn('How awake?', mail.outbox[0].alternatives[0][0])
+        self.assertEqual(0, ScheduledMessage.objects.count())
+
+    def test_sweep_reported(self):
+        "No reminder once they've reported"
+        ScheduledMessage.remind(self.report, self.now)
+        self.report.date = datetime.date.today()
+        self.report.save()
+        self.assertEqual(1, ScheduledMessage.sweep(now=self.later))
+        self.assertEqual([], mail.outbox)
+
+    def test_sweep_not_due(self):
+        "Messages wait until they're due"
+        ScheduledMessage.remind(self.report, self.later)
+        self.assertEqual(0, ScheduledMessage.sweep(now=self.now))
+        self.assertEqual(1, ScheduledMessage.objects.count())
+
+    def test_claim_once(self):
+        "Two sweepers never get the same message"
+        ScheduledMessage.remind(self.report, self.now)
+        self.assertEqual(1, len(ScheduledMessage.claim_due(10)))
+        self.assertEqual([], ScheduledMessage.claim_due(10))
+
+    def test_join_hours(self):
+        "Instructions some hours after joining are scheduled, then swept"
+        self.trial.instruction_delivery = models.Trial.HOURS
+        self.trial.instruction_hours_after = 3
+        self.trial.n1trial = False
+        self.trial.save()
+        joiner = models.User(email='moe@example.com', username='moe')
+        joiner.save()
+        self.trial.join(joiner)
+        message = ScheduledMessage.objects.get(kind=ScheduledMessage.INSTRUCTIONS)
+        self.assertTrue(self.now + datetime.timedelta(hours=3) <= message.due)
+        self.assertEqual([], mail.outbox)
+        self.assertEqual(1, ScheduledMessage.sweep(now=self.later))
+        self.assertEqual([['moe@example.com']], [m.to for m in mail.outbox])
@@ -0,0 +1,106 @@
+"""
+Unittests for the trial search index
+"""
+import unittest
+
+from django.test import TestCase
+from django.test.client import RequestFactory
+
+from rm.trials import models, search
+from rm.trials.views import TrialSearchView
+
+class TokeniseTestCase(unittest.TestCase):
+
+    def test_tokenise(self):
+        "Lower case words, without the stopwords"
+        self.assertEqual(['coffee', 'help', 'sleep'],
+                         search.tokenise(u'Does coffee help the sleep?'))
+
+    def test_empty(self):
+        "Nothing to see"
+        self.assertEqual([], search.tokenise(None))
+        self.assertEqual([], search.tokenise(u'  '))
+
+
+class SearchTestCase(TestCase):
+
+    def setUp(self):
+        super(SearchTestCase, self).setUp()
+        self.user = models.User(email='larry@example.com', pk=1)
+        self.user.save()
+
+    def trial(self, title, **kwargs):
+        trial = models.Trial(title=title, min_participants=20, owner=self.user, **kwargs)
+        trial.save()
+        return trial
+
+    def found(self, q):
+        return [t.title for t in search.search(q)]
+
+    def test_fields(self):
+        "Descriptions, instructions and questions are all searched"
+        self.trial('Coffee', description='Does it keep you awake?')
+        self.trial('Tea', group_a='Drink green tea before bed')
+        trial = self.trial('Walking')
+        models.Variable(trial=trial, question='How well did you sleep?').save()
+        self.assertEqual(['Coffee'], self.found('awake'))
+        self.assertEqual(['Tea'], self.found('bed'))
+        self.assertEqual(['Walking'], self.found('sleep'))
+
+    def test_ranking(self):
+        "More matching terms first, then heavier ones"
+        self.trial('Other', description='morning coffee')
+        self.trial('Coffee in the morning')
+        self.trial('Coffee')
+        self.assertEqual(['Coffee in the morning', 'Other', 'Coffee'],
+                         self.found('morning coffee'))
+
+    def test_privacy(self):
+        "Private and hidden trials never turn up"
+        self.trial('Coffee secret', private=True)
+        self.trial('Coffee hidden', hide=True)
+        listed = self.trial('Coffee')
+        self.assertEqual(['Coffee'], self.found('coffee'))
+        listed.private = True
+        listed.save()
+        self.assertEqual([], self.found('coffee'))
+
+    def test_incremental(self):
+        "Saving a trial updates its entries"
+        trial = self.trial('Coffee')
+        trial.title = 'Tea'
+        trial.save()
+        self.assertEqual([], self.found('coffee'))
+        self.assertEqual(['Tea'], self.found('tea'))
+
+    def test_rebuild(self):
+        "Rebuilding agrees with the incremental index"
+        trial = self.trial('Coffee', description='morning')
+        models.Variable(trial=trial, question='Sleep').save()
+        self.trial('Tea', private=True)
+        expected = sorted(models.SearchTerm.objects.values_list('term', 'trial', 'weight'))
+        models.SearchTerm.objects.all().delete()
+        self.assertEqual(1, search.rebuild())
+        self.assertEqual(expected, sorted(
+                models.SearchTerm.objects.values_list('term', 'trial', 'weight')))
+
+    def test_paginated(self):
+        "Pages cost a bounded number of queries"
+        for i in range(5):
+            self.trial('Coffee {0}'.format(i))
+        results = search.search('coffee')
+        self.assertEqual(5, results.count())
+        with self.assertNumQueries(2):
+            page = results[2:4]
+        self.assertEqual(2, len(page))
+
+    def test_view(self):
+        "The view pages through the results"
+        for i in range(search.PAGE_SIZE + 1):
+            self.trial('Coffee {0}'.format(i))
+        self.trial('Coffee secret', private=True)
+        request = RequestFactory().get('/', {'q': 'coffee', 'page': '2'})
+        request.user = self.user
+        response = TrialSearchView.as_view()(request)
+        self.assertEqual(search.PAGE_SIZE + 1, response.context_data['paginator'].count)
+        self.assertEqual(1, len(response.context_data['trials']))
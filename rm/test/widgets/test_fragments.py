@@ -0,0 +1,143 @@
+"""
+Unittests for the per-user dashboard fragment cache
+"""
+import datetime
+import shutil
+import tempfile
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import get_cache
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+from mock import patch
+
+from rm.trials import ingest
+from rm.trials.models import Participant, Report, Trial, User, Variable
+from rm.widgets import fragments
+from rm.widgets.templatetags import dashboard
+
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'dashboard': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                  'LOCATION': 'test-dashboard'},
+    'email': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+              'LOCATION': 'test-email'},
+    }
+
+@override_settings(CACHES=CACHES)
+@patch.object(Trial, 'get_absolute_url', lambda self: '/trials/{0}'.format(self.pk))
+class FragmentTestCase(TestCase):
+
+    def setUp(self):
+        super(FragmentTestCase, self).setUp()
+        get_cache('dashboard').clear()
+        self.owner = User(email='larry@example.com', username='larry', pk=1)
+        self.owner.save()
+        self.user = User(email='sue@example.com', username='sue', pk=2)
+        self.user.save()
+        self.trial = Trial(title='Coffee', min_participants=20, owner=self.owner)
+        self.trial.save()
+
+    def context(self, user=None):
+        request = RequestFactory().get('/')
+        request.user = user or self.user
+        return {'request': request}
+
+    def test_cached(self):
+        "Repeat renders don't touch the database"
+        first = dashboard.randomising_me_widget(self.context())
+        with self.assertNumQueries(0):
+            self.assertEqual(first, dashboard.randomising_me_widget(self.context()))
+
+    def test_join(self):
+        "Joining a trial shows up straight away"
+        dashboard.randomising_me_widget(self.context())
+        Participant(trial=self.trial, user=self.user).randomise()
+        self.assertIn('Coffee', dashboard.randomising_me_widget(self.context()))
+
+    def test_leave(self):
+        "So does leaving it"
+        participant = Participant(trial=self.trial, user=self.user).randomise()
+        self.assertIn('Coffee', dashboard.randomising_me_widget(self.context()))
+        # As LeaveTrial does
+        participant.user = None
+        participant.save()
+        self.assertNotIn('Coffee', dashboard.randomising_me_widget(self.context()))
+
+    def test_delete(self):
+        "And deleting the participant"
+        participant = Participant(trial=self.trial, user=self.user).randomise()
+        self.assertIn('Coffee', dashboard.randomising_me_widget(self.context()))
+        participant.delete()
+        self.assertNotIn('Coffee', dashboard.randomising_me_widget(self.context()))
+
+    def test_others_report(self):
+        "Someone else reporting updates everyone's observation count"
+        other = User(email='moe@example.com', username='moe', pk=3)
+        other.save()
+        variable = Variable(trial=self.trial, question='How awake?')
+        variable.save()
+        Participant(trial=self.trial, user=self.user).randomise()
+        theirs = Participant(trial=self.trial, user=other).randomise()
+        before = dashboard.randomising_me_widget(self.context())
+        report = Report(trial=self.trial, participant=theirs, group=theirs.group,
+                        variable=variable, date=datetime.date.today(), score=3)
+        report.save()
+        after = dashboard.randomising_me_widget(self.context())
+        self.assertNotEqual(before, after)
+        self.assertEqual(1, Trial.objects.get(pk=self.trial.pk).report_count)
+        report.delete()
+        self.assertEqual(before, dashboard.randomising_me_widget(self.context()))
+
+    def test_edit(self):
+        "Editing a trial updates its participants' dashboards"
+        Participant(trial=self.trial, user=self.user).randomise()
+        self.assertIn('Coffee', dashboard.randomising_me_widget(self.context()))
+        self.trial.title = 'Espresso'
+        self.trial.save()
+        self.assertIn('Espresso', dashboard.randomising_me_widget(self.context()))
+
+    def test_create(self):
+        "Creating a trial invalidates its owner's dashboard"
+        self.assertNotIn('Tea', dashboard.randomising_others_widget(self.context(self.owner)))
+        Trial(title='Tea', min_participants=20, owner=self.owner).save()
+        self.assertIn('Tea', dashboard.randomising_others_widget(self.context(self.owner)))
+
+    def test_stop(self):
+        "Stopping a trial invalidates its participants' dashboards"
+        Participant(trial=self.trial, user=self.user).randomise()
+        self.assertNotIn('Coffee', dashboard.reports_part_widget(self.context()))
+        exports = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, exports)
+        with self.settings(EXPORT_CACHE_DIR=exports):
+            self.trial.stop()
+        self.assertIn('Coffee', dashboard.reports_part_widget(self.context()))
+
+    def test_upload(self):
+        "Uploading participants invalidates the owner's dashboard"
+        version = fragments.version(self.owner)
+        ingest.participants(self.trial, ['p1', 'p2'])
+        self.assertNotEqual(version, fragments.version(self.owner))
+
+    def test_randomise(self):
+        "As does randomising the trial"
+        Participant(trial=self.trial, user=self.user).save()
+        versions = fragments.version(self.owner), fragments.version(self.user)
+        self.trial.randomise()
+        self.assertNotEqual(versions[0], fragments.version(self.owner))
+        self.assertNotEqual(versions[1], fragments.version(self.user))
+
+    def test_bump_is_per_user(self):
+        "Other users keep their fragments"
+        version = fragments.version(self.owner)
+        fragments.bump(self.user, None)
+        self.assertEqual(version, fragments.version(self.owner))
+
+    def test_anonymous(self):
+        "Nobody in particular isn't cached"
+        built = []
+        context = self.context(AnonymousUser())
+        for i in range(2):
+            fragments.cached(context['request'], 'x', lambda: built.append(1))
+        self.assertEqual(2, len(built))
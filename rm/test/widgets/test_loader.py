@@ -0,0 +1,74 @@
+"""
+Unittests for the dashboard data loader
+"""
+from django.core.cache import get_cache
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+from mock import patch
+
+from rm.trials.models import Participant, Trial, User
+from rm.widgets import loader
+from rm.widgets.templatetags import dashboard
+
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'dashboard': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                  'LOCATION': 'test-loader'},
+    'email': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+              'LOCATION': 'test-email'},
+    }
+
+@override_settings(CACHES=CACHES)
+@patch.object(Trial, 'get_absolute_url', lambda self: '/trials/{0}'.format(self.pk))
+class LoaderTestCase(TestCase):
+
+    def setUp(self):
+        super(LoaderTestCase, self).setUp()
+        get_cache('dashboard').clear()
+        self.user = User(email='larry@example.com', username='larry', pk=1)
+        self.user.save()
+        self.other = User(email='sue@example.com', username='sue', pk=2)
+        self.other.save()
+        self.trials = {}
+        for name, owner, kwargs in [
+            ('mine-n1', self.user, dict(n1trial=True)),
+            ('mine-running', self.user, {}),
+            ('mine-over', self.user, dict(stopped=True)),
+            ('joined-running', self.other, {}),
+            ('joined-over', self.other, dict(stopped=True)),
+            ('elsewhere', self.other, {}),
+            ]:
+            trial = Trial(title=name, min_participants=20, owner=owner, **kwargs)
+            trial.save()
+            self.trials[name] = trial
+        for name in ['mine-n1', 'joined-running', 'joined-over']:
+            Participant(trial=self.trials[name], user=self.user).save()
+
+    def request(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        return request
+
+    def titles(self, trials):
+        return sorted(t.title for t in trials)
+
+    def test_slices(self):
+        "Each widget gets the right trials"
+        with self.assertNumQueries(2):
+            data = loader.load(self.request())
+            self.assertEqual(['joined-running', 'mine-n1'], self.titles(data.randomising_me))
+            self.assertEqual(['mine-running'], self.titles(data.randomising_others))
+            self.assertEqual(['joined-over'], self.titles(data.participated_over))
+            self.assertEqual(['mine-over'], self.titles(data.ran_over))
+            self.assertEqual(False, data.virgin)
+
+    def test_widgets(self):
+        "All of the user's widgets share two queries"
+        context = {'request': self.request()}
+        with self.assertNumQueries(2):
+            for widget in [dashboard.randomising_me_widget, dashboard.randomising_others_widget,
+                           dashboard.reports_part_widget, dashboard.reports_ran_widget]:
+                widget(context)
+            dashboard.dashboard(context)
+        self.assertEqual(False, context['virgin'])
@@ -0,0 +1,131 @@
+"""
+Statistical analysis of trial results.
+
+This lives apart from rm.trials.models so that scipy and statsmodels are
+only imported by processes that actually analyse a trial, rather than by
+every web and celery worker that touches the models.
+"""
+import logging
+import traceback
+
+import numpy as np
+from scipy import stats as scistats
+
+from rm.stats import power as powercalc
+from rm.stats.utils import pooled_ttest
+from rm.trials import mailing
+from rm.trials.models import Group, GroupStatistics, TrialAnalysis, Variable
+
+logger = logging.getLogger(__name__)
+
+
+def report_on(trial):
+    """
+    Calculate headline stats for TRIAL once and store them in its
+    TrialAnalysis.
+
+    The descriptive statistics come straight from the running
+    GroupStatistics for the trial, so all that's left to do here
+    is run the final test.
+
+    Return: None
+    Exceptions: None
+    """
+    tr = TrialAnalysis.objects.get_or_create(trial=trial)[0]
+
+    if trial.report_set.count() < 2:
+        return
+
+    nobs1 = int(trial.report_set.count()/2)
+    stats = trial.group_statistics()
+    groupa, groupb = stats[Group.GROUP_A], stats[Group.GROUP_B]
+    overall = GroupStatistics.combine(groupa, groupb)
+
+    small = powercalc.power(0.1, 0.05, nobs1)
+    med = powercalc.power(0.2, 0.05, nobs1)
+    large = powercalc.power(0.5, 0.05, nobs1)
+    if trial.variable_set.get().style == Variable.BINARY:
+        obs = np.array([[groupa.successes, groupa.failures],
+                        [groupb.successes, groupb.failures]])
+        try:
+            chi2, pval, dof, expected = scistats.chi2_contingency(obs)
+        except ValueError:
+            exc = traceback.format_exc()
+            try:
+                mailing.chi2_failure(obs, exc)
+            except Exception:
+                logger.exception("Couldn't send the chi2 failure for trial %s:\n%s",
+                                 trial.pk, exc)
+            pval = None
+
+    else:
+        tstat, pval, df = pooled_ttest(groupa.nobs, groupa.mean, groupa.m2,
+                                       groupb.nobs, groupb.mean, groupb.m2)
+
+
+    tr.power_small=small
+    tr.power_med=med
+    tr.power_large=large
+    tr.sd=overall.sd
+    tr.mean=overall.mean
+    tr.nobsa = groupa.nobs
+    tr.nobsb = groupb.nobs
+    tr.meana = groupa.mean
+    tr.meanb = groupb.mean
+    tr.stderrmeana = groupa.sem
+    tr.stderrmeanb = groupb.sem
+    tr.pval = pval
+
+    tr.save()
+    return
+
+
+def reported_values(trial):
+    """
+    Return the values reported for TRIAL as a numpy array per
+    group name.
+
+    This fetches just the group name and the value column in a
+    single query, rather than instantiating every Report and
+    looking up its variable.
+
+    Return: dict
+    Exceptions: None
+    """
+    names = [Group.GROUP_A, Group.GROUP_B]
+    try:
+        field = trial.variable_set.get().value_field
+    except Variable.DoesNotExist:
+        field = None
+    if field is None:
+        return dict((name, np.array([], dtype=float)) for name in names)
+
+    reports = trial.report_set.filter(group__isnull=False,
+                                      **{field + '__isnull': False})
+    if not trial.offline:
+        reports = reports.exclude(date__isnull=True)
+    rows = np.array(list(reports.values_list('group__name', field)),
+                    dtype=object).reshape(-1, 2)
+    return dict((name, rows[rows[:, 0] == name, 1].astype(float))
+                for name in names)
+
+
+def reference_values(trial):
+    """
+    Return the values reported for TRIAL per group name, one Report
+    at a time.
+
+    This is how report_on used to gather its data points. It's
+    slow, but kept as the reference that reported_values() must
+    agree with.
+
+    Return: dict
+    Exceptions: None
+    """
+    if trial.offline:
+        reports = trial.report_set.all()
+    else:
+        reports = trial.report_set.exclude(date__isnull=True)
+    return dict(
+        (name, [t.get_value() for t in reports.filter(group__name=name)])
+        for name in [Group.GROUP_A, Group.GROUP_B])
@@ -0,0 +1,161 @@
+"""
+Streaming exports of trial data.
+
+Rows are read from the database a batch at a time and encoded as they
+go, so an export never holds more than one batch in memory and never
+touches the disk.
+"""
+import csv
+import zlib
+
+from django.utils import simplejson
+
+BATCH_SIZE = 2000
+REPORT_FIELDS = ['group', 'date', 'value']
+PARTICIPANT_FIELDS = ['identifier', 'group', 'result']
+CSV, NDJSON = 'csv', 'ndjson'
+FORMATS = {
+    CSV:    ('text/csv', 'csv'),
+    NDJSON: ('application/x-ndjson', 'ndjson'),
+    }
+
+
+def batched(queryset, fields, batch_size=BATCH_SIZE):
+    """
+    Generator yielding FIELDS of every row in QUERYSET in primary key
+    order, fetching BATCH_SIZE rows per query.
+
+    We page on the primary key rather than relying on iterator(),
+    because most database drivers buffer a whole result set client-side.
+    """
+    last = None
+    while True:
+        batch = queryset.order_by('pk')
+        if last is not None:
+            batch = batch.filter(pk__gt=last)
+        rows = list(batch.values_list('pk', *fields)[:batch_size])
+        for row in rows:
+            yield row[1:]
+        if len(rows) < batch_size:
+            return
+        last = rows[-1][0]
+
+
+def report_rows(trial, batch_size=BATCH_SIZE):
+    """
+    Generator yielding a (group, date, value) row for each completed
+    report in TRIAL.
+
+    Groups and variables are joined in, so this costs one query per
+    batch rather than several per report.
+    """
+    from rm.trials.models import Variable
+
+    columns = ['score', 'binary', 'count', 'seconds']
+    column = {
+        Variable.SCORE:  columns.index('score'),
+        Variable.BINARY: columns.index('binary'),
+        Variable.COUNT:  columns.index('count'),
+        Variable.TIME:   columns.index('seconds'),
+        }
+    reports = trial.report_set.exclude(date__isnull=True)
+    fields = ['group__name', 'date', 'variable__style'] + columns
+    for row in batched(reports, fields, batch_size=batch_size):
+        group, date, style, values = row[0], row[1], row[2], row[3:]
+        value = values[column[style]] if style in column else None
+        yield group, date.isoformat(), value
+
+
+def participant_rows(trial, batch_size=BATCH_SIZE):
+    """
+    Generator yielding an (identifier, group, result) row for each
+    participant in TRIAL, with the result left blank for the trial
+    owner to fill in.
+    """
+    participants = trial.participant_set.all()
+    for identifier, group in batched(participants, ['identifier', 'group__name'],
+                                     batch_size=batch_size):
+        yield identifier, group, ''
+
+
+class _Line(object):
+    """
+    File-like object that hands back whatever the csv module writes to it.
+    """
+    def write(self, value):
+        return value
+
+
+def csv_lines(header, rows):
+    """
+    Generator yielding HEADER and then each of ROWS as CSV lines.
+    """
+    writer = csv.writer(_Line())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([u'' if v is None else unicode(v).encode('utf-8') for v in row])
+
+
+def ndjson_lines(header, rows):
+    """
+    Generator yielding each of ROWS as a JSON object keyed by HEADER,
+    one per line.
+    """
+    for row in rows:
+        yield simplejson.dumps(dict(zip(header, row))) + '\n'
+
+
+def gzipped(chunks):
+    """
+    Generator yielding CHUNKS gzip compressed as a single stream.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def encode(header, rows, format=CSV, compress=False):
+    """
+    Generator yielding ROWS encoded in FORMAT, optionally gzipped.
+
+    Arguments:
+    - `header`: list of field names
+    - `rows`: iterable of tuples
+    - `format`: one of FORMATS
+    - `compress`: bool
+
+    Exceptions: KeyError for an unknown FORMAT
+    """
+    encoder = {CSV: csv_lines, NDJSON: ndjson_lines}[format]
+    chunks = encoder(header, rows)
+    if compress:
+        chunks = gzipped(chunks)
+    return chunks
+
+
+def filename(name, format=CSV, compress=False):
+    """
+    Return the filename for an export called NAME.
+
+    Return: str
+    Exceptions: KeyError for an unknown FORMAT
+    """
+    name = '{0}.{1}'.format(name, FORMATS[format][1])
+    if compress:
+        name += '.gz'
+    return name
+
+
+def content_type(format=CSV, compress=False):
+    """
+    Return the content type for an export in FORMAT.
+
+    Return: str
+    Exceptions: KeyError for an unknown FORMAT
+    """
+    if compress:
+        return 'application/gzip'
+    return FORMATS[format][0]
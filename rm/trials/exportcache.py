@@ -0,0 +1,182 @@
+"""
+A content-addressed cache of export files for stopped trials.
+
+A stopped trial's data doesn't change, so we build its exports once
+when it stops. Each file is stored under the SHA1 of its contents, and
+a small manifest per trial maps export names to those files. Finding a
+cached export reads the manifest from disk - no database work.
+
+If a stopped trial's data is changed after all, Trial.forget_exports()
+invalidates its manifest, and downloads read the database again until
+the exports are rebuilt.
+"""
+import hashlib
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.utils import simplejson
+
+OBJECTS   = 'objects'
+MANIFESTS = 'trials'
+READ_SIZE = 64 * 1024
+
+
+def _path(*parts):
+    return os.path.join(settings.EXPORT_CACHE_DIR, *parts)
+
+
+def _tempfile(dirname):
+    if not os.path.exists(dirname):
+        os.makedirs(dirname)
+    return tempfile.mkstemp(dir=dirname)
+
+
+def _read(path):
+    with open(path, 'rb') as fh:
+        while True:
+            chunk = fh.read(READ_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def store(chunks, suffix):
+    """
+    Write CHUNKS to the cache, naming the file after the SHA1 of its
+    contents plus SUFFIX.
+
+    Return: str, the name of the stored file
+    Exceptions: None
+    """
+    digest = hashlib.sha1()
+    fd, tmp = _tempfile(_path(OBJECTS))
+    with os.fdopen(fd, 'wb') as fh:
+        for chunk in chunks:
+            digest.update(chunk)
+            fh.write(chunk)
+    name = digest.hexdigest() + suffix
+    os.rename(tmp, _path(OBJECTS, name))
+    return name
+
+
+def write_manifest(pk, manifest):
+    """
+    Replace the manifest for trial PK with MANIFEST, a dict of
+    export name -> stored file name.
+
+    Return: None
+    Exceptions: None
+    """
+    fd, tmp = _tempfile(_path(MANIFESTS))
+    with os.fdopen(fd, 'wb') as fh:
+        simplejson.dump(manifest, fh)
+    os.rename(tmp, _path(MANIFESTS, '{0}.json'.format(pk)))
+    return
+
+
+def invalidate(pk):
+    """
+    Forget the cached exports for trial PK.
+
+    Return: None
+    Exceptions: None
+    """
+    try:
+        os.remove(_path(MANIFESTS, '{0}.json'.format(pk)))
+    except OSError:
+        pass
+    return
+
+
+def lookup(pk, name):
+    """
+    Find the cached export NAME (e.g. 'reports.csv') for trial PK.
+
+    Marks the file as recently used, for the purposes of evict().
+
+    Return: (path, etag) or None
+    Exceptions: None
+    """
+    try:
+        with open(_path(MANIFESTS, '{0}.json'.format(pk)), 'rb') as fh:
+            manifest = simplejson.load(fh)
+    except (IOError, ValueError):
+        return None
+    stored = manifest.get(name)
+    if stored is None:
+        return None
+    path = _path(OBJECTS, stored)
+    try:
+        os.utime(path, None)
+    except OSError:
+        return None
+    return path, stored.split('.')[0]
+
+
+def build(trial):
+    """
+    Build and cache every export of TRIAL's data.
+
+    Return: dict of export name -> stored file name
+    Exceptions: None
+    """
+    from rm.trials import export
+
+    manifest = {}
+    exports = [('reports', export.REPORT_FIELDS, export.report_rows, format)
+               for format in export.FORMATS]
+    if trial.offline:
+        exports.append(('participants', export.PARTICIPANT_FIELDS,
+                        export.participant_rows, export.CSV))
+    for name, header, rows, format in exports:
+        plain = export.filename(name, format)
+        manifest[plain] = store(export.encode(header, rows(trial), format=format),
+                                plain[len(name):])
+        # Compress what we just wrote rather than query the rows again.
+        packed = export.filename(name, format, compress=True)
+        manifest[packed] = store(export.gzipped(_read(_path(OBJECTS, manifest[plain]))),
+                                 packed[len(name):])
+    write_manifest(trial.pk, manifest)
+    return manifest
+
+
+def evict(max_bytes=None, max_age=None):
+    """
+    Remove cached files that haven't been used for MAX_AGE seconds,
+    then the least recently used until we hold at most MAX_BYTES.
+
+    Default to the EXPORT_CACHE_MAX_BYTES and EXPORT_CACHE_MAX_AGE
+    settings.
+
+    Return: int, the number of files removed
+    Exceptions: None
+    """
+    if max_bytes is None:
+        max_bytes = settings.EXPORT_CACHE_MAX_BYTES
+    if max_age is None:
+        max_age = settings.EXPORT_CACHE_MAX_AGE
+    objects = _path(OBJECTS)
+    if not os.path.exists(objects):
+        return 0
+
+    files = []
+    for name in os.listdir(objects):
+        if name.startswith('tmp'):
+            continue # Still being written
+        path = os.path.join(objects, name)
+        stat = os.stat(path)
+        files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+
+    now = time.time()
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for used, size, path in files:
+        if now - used <= max_age and total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+        removed += 1
+    return removed
@@ -2,6 +2,7 @@
 Custom forms for the creation of Trials
 """
 import datetime
+import itertools
 
 from django.core.exceptions import ValidationError
 from django import forms
@@ -475,3 +476,32 @@ class OfflineResultsForm(forms.Form):
     Form for handling the upload of results
     """
     results = forms.FileField()
+
+
+class BulkInvitationForm(forms.Form):
+    """
+    Form for inviting many people at once, pasted or uploaded as a CSV
+    """
+    emails = forms.CharField(widget=forms.Textarea, required=False)
+    csv = forms.FileField(required=False)
+
+    def clean(self):
+        """
+        We need one or the other.
+        """
+        cleaned_data = super(BulkInvitationForm, self).clean()
+        if not (cleaned_data.get('emails') or cleaned_data.get('csv')):
+            raise ValidationError('Paste some email addresses or upload a CSV')
+        return cleaned_data
+
+    def lines(self):
+        """
+        Return the lines of everything we were given.
+
+        Return: iterable of str
+        Exceptions: None
+        """
+        lines = (self.cleaned_data.get('emails') or '').splitlines()
+        if self.cleaned_data.get('csv'):
+            return itertools.chain(lines, self.cleaned_data['csv'])
+        return lines
@@ -0,0 +1,245 @@
+"""
+Bulk ingestion of data uploaded for trials: participants and results
+for offline trials, and lists of people to invite.
+
+Uploads are consumed line by line and written in chunks, so memory use
+doesn't grow with the size of the file.
+"""
+import collections
+import csv
+import re
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from rm import exceptions
+from rm.widgets import fragments
+
+IDENTIFIER = re.compile(r'^[a-zA-Z0-9_]+$')
+CHUNK_SIZE = 1000
+RESULTS_HEADER = ['identifier', 'group', 'result']
+MAX_ERRORS = 100
+TRUE  = ('1', 'true', 't', 'yes', 'y')
+FALSE = ('0', 'false', 'f', 'no', 'n')
+EMAIL_SEPARATORS = re.compile(r'[\s,;<>"\']+')
+MAX_INVITATIONS = 5000
+
+Invited = collections.namedtuple('Invited', 'invited duplicates invalid')
+
+
+def chunked(iterable, size):
+    """
+    Generator yielding lists of up to SIZE items from ITERABLE.
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def identifiers(lines):
+    """
+    Generator yielding the participant identifier on each of LINES.
+
+    Raise InvalidIdentifierError with the (1-based) line number at the
+    first line that isn't a valid identifier.
+
+    Exceptions: InvalidIdentifierError
+    """
+    for lineno, line in enumerate(lines, 1):
+        identifier = line.strip()
+        if not IDENTIFIER.match(identifier):
+            raise exceptions.InvalidIdentifierError(lineno)
+        yield identifier
+
+
+def participants(trial, lines, chunk_size=CHUNK_SIZE):
+    """
+    Add a participant to TRIAL for each identifier in LINES, allocating
+    them to groups from the trial's allocation sequence.
+
+    Everything happens in one transaction, so an invalid identifier
+    anywhere in LINES means no participants are added.
+
+    Arguments:
+    - `trial`: Trial
+    - `lines`: iterable of strings, e.g. an uploaded file
+    - `chunk_size`: int
+
+    Return: int, the number of participants added
+    Exceptions: InvalidIdentifierError
+    """
+    from rm.trials.models import AllocationSequence, Participant
+
+    added = 0
+    with transaction.commit_on_success():
+        for chunk in chunked(identifiers(lines), chunk_size):
+            groups = AllocationSequence.take(trial, len(chunk))
+            Participant.objects.bulk_create([
+                    Participant(trial=trial, identifier=identifier, group=group)
+                    for identifier, group in zip(chunk, groups)])
+            # bulk_create() skips Participant.save(), so count them here.
+            sizes = collections.Counter(trial.group_counter(g.name) for g in groups)
+            trial.adjust_counts(participant_count=len(chunk), **sizes)
+            added += len(chunk)
+    fragments.bump(trial.owner_id)
+    trial.forget_exports()
+    return added
+
+
+def parse_result(variable, result):
+    """
+    Parse the string RESULT into a value for VARIABLE.
+
+    Return: int or bool
+    Exceptions: ValueError
+    """
+    from rm.trials.models import Variable
+
+    if variable.style == Variable.BINARY:
+        result = result.strip().lower()
+        if result in TRUE:
+            return True
+        if result in FALSE:
+            return False
+        raise ValueError(result)
+    return int(result)
+
+
+def results(trial, lines, chunk_size=CHUNK_SIZE):
+    """
+    Add a report to TRIAL for each identifier,group,result row of the
+    CSV in LINES. A header row is optional.
+
+    Participants and the trial's variable are looked up once, not per
+    row. Rows are read and inserted a chunk at a time, but everything
+    happens in one transaction: if any row is bad we carry on checking
+    the rest (up to MAX_ERRORS of them), then add nothing and raise
+    InvalidResultsError with a message for each bad row.
+
+    Arguments:
+    - `trial`: Trial
+    - `lines`: iterable of strings, e.g. an uploaded file
+    - `chunk_size`: int
+
+    Return: int, the number of reports added
+    Exceptions: InvalidResultsError
+    """
+    from rm.trials.models import GroupStatistics, Report
+
+    variable = trial.variable_set.get()
+    field = variable.value_field
+    participants = dict((identifier, (pk, group_id)) for identifier, pk, group_id
+                        in trial.participant_set.values_list('identifier', 'pk', 'group_id'))
+    errors = []
+    added = 0
+
+    def reports(rows):
+        for lineno, row in rows:
+            if not row:
+                continue
+            if lineno == 1 and [c.strip() for c in row] == RESULTS_HEADER:
+                continue
+            if len(row) != 3:
+                errors.append('Line {0}: expected an identifier, group and result'.format(lineno))
+                continue
+            identifier, group, result = [c.strip() for c in row]
+            if identifier not in participants:
+                errors.append('Line {0}: no participant {1}'.format(lineno, identifier))
+                continue
+            try:
+                value = parse_result(variable, result)
+            except ValueError:
+                errors.append("Line {0}: couldn't read the result {1}".format(lineno, result))
+                continue
+            pk, group_id = participants[identifier]
+            yield Report(trial=trial, participant_id=pk, group_id=group_id,
+                         variable=variable, **{field: value})
+
+    with transaction.commit_on_success():
+        rows = enumerate(csv.reader(lines), 1)
+        for chunk in chunked(reports(rows), chunk_size):
+            if len(errors) >= MAX_ERRORS:
+                break
+            if not errors:
+                Report.objects.bulk_create(chunk)
+                added += len(chunk)
+        if errors:
+            raise exceptions.InvalidResultsError(errors[:MAX_ERRORS])
+        if trial.offline: # Undated reports only count as completed offline
+            trial.adjust_counts(report_count=added)
+
+    # bulk_create() skips Report.save(), so the running statistics,
+    # the owner's dashboard and any cached exports need to be brought up
+    # to date separately.
+    GroupStatistics.rebuild(trial)
+    fragments.bump(trial.owner_id)
+    trial.forget_exports()
+    return added
+
+
+def emails(lines):
+    """
+    Return the email addresses in LINES - a pasted list, or a CSV with
+    the addresses in any column - normalised to lower case, without
+    duplicates, in the order we found them. Along with them, return
+    the things that looked like addresses but weren't.
+
+    Anything without an @ in it (names, headers) is ignored.
+
+    Return: (list of str, list of str)
+    Exceptions: None
+    """
+    seen, found, invalid = set(), [], []
+    for line in lines:
+        for token in EMAIL_SEPARATORS.split(line):
+            if '@' not in token:
+                continue
+            email = token.lower()
+            if email in seen:
+                continue
+            seen.add(email)
+            try:
+                validate_email(email)
+            except ValidationError:
+                invalid.append(token)
+                continue
+            found.append(email)
+    return found, invalid
+
+
+def invitations(trial, lines, chunk_size=CHUNK_SIZE):
+    """
+    Invite each email address in LINES (see emails()) to TRIAL, unless
+    they've been invited already.
+
+    We look up who has been invited in one query, and add the new
+    invitations in chunks, all in one transaction. Nobody is emailed
+    here - that's for rm.trials.mailing.invitations().
+
+    Arguments:
+    - `trial`: Trial
+    - `lines`: iterable of strings, e.g. an uploaded file
+    - `chunk_size`: int
+
+    Return: Invited
+    Exceptions: TooManyInvitationsError
+    """
+    from rm.trials.models import Invitation
+
+    found, invalid = emails(lines)
+    if len(found) > MAX_INVITATIONS:
+        raise exceptions.TooManyInvitationsError(MAX_INVITATIONS)
+    existing = set(email.lower() for email in
+                   trial.invitation_set.values_list('email', flat=True))
+    new = [email for email in found if email not in existing]
+    with transaction.commit_on_success():
+        for chunk in chunked(new, chunk_size):
+            Invitation.objects.bulk_create([Invitation(trial=trial, email=email)
+                                            for email in chunk])
+    return Invited(len(new), len(found) - len(new), invalid)
@@ -0,0 +1,133 @@
+"""
+Keyset ("cursor") pagination.
+
+Rather than counting and OFFSETting, each page asks for the rows that
+sort after the last one we showed, so fetching any page is one query
+of PAGE_SIZE + 1 rows however deep into the list it is.
+
+Cursors are the sort key values of that last row, packed into a URL
+safe string. Rows are sorted by every key, descending, with the primary
+key as the last key so that the order is total.
+"""
+import base64
+import datetime
+
+from django.db.models import Q
+from django.utils import simplejson
+from django.utils.dateparse import parse_datetime
+
+from rm import exceptions
+
+PAGE_SIZE = 20
+
+
+def encode(values):
+    """
+    Return the cursor for a row whose sort keys have VALUES.
+
+    Return: str
+    Exceptions: None
+    """
+    values = [v.isoformat() if isinstance(v, datetime.datetime) else v for v in values]
+    return base64.urlsafe_b64encode(simplejson.dumps(values)).rstrip('=')
+
+
+def decode(cursor):
+    """
+    Return the sort key values packed into CURSOR.
+
+    Return: list
+    Exceptions: InvalidCursorError
+    """
+    try:
+        cursor = str(cursor)
+        values = simplejson.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError, UnicodeEncodeError):
+        raise exceptions.InvalidCursorError(cursor)
+    if not isinstance(values, list):
+        raise exceptions.InvalidCursorError(cursor)
+    decoded = []
+    for value in values:
+        if isinstance(value, basestring):
+            value = parse_datetime(value)
+            if value is None:
+                raise exceptions.InvalidCursorError(cursor)
+        elif not isinstance(value, (int, long, float)):
+            raise exceptions.InvalidCursorError(cursor)
+        decoded.append(value)
+    return decoded
+
+
+def value(obj, key):
+    """
+    Return the value of KEY (which may span relations, Django style)
+    for OBJ.
+
+    Return: object
+    Exceptions: None
+    """
+    for attr in key.split('__'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def after(keys, values):
+    """
+    Return a Q matching rows that come after VALUES in the descending
+    order of KEYS.
+
+    Return: Q
+    Exceptions: InvalidCursorError
+    """
+    if len(keys) != len(values):
+        raise exceptions.InvalidCursorError(values)
+    match = Q()
+    for i, key in enumerate(keys):
+        tied = dict(zip(keys[:i], values[:i]))
+        tied[key + '__lt'] = values[i]
+        match |= Q(**tied)
+    return match
+
+
+class Page(object):
+    """
+    One page of rows, and the cursor for the next if there is one.
+    """
+    def __init__(self, object_list, cursor, next_cursor):
+        self.object_list = object_list
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def page(queryset, keys, cursor=None, size=PAGE_SIZE):
+    """
+    Return the page of QUERYSET after CURSOR, sorted descending by KEYS.
+
+    Arguments:
+    - `queryset`: Queryset
+    - `keys`: sequence of field names, ending with 'pk'
+    - `cursor`: str or None for the first page
+    - `size`: int
+
+    Return: Page
+    Exceptions: InvalidCursorError
+    """
+    keys = list(keys)
+    rows = queryset.order_by(*['-' + key for key in keys])
+    if cursor:
+        rows = rows.filter(after(keys, decode(cursor)))
+    rows = list(rows[:size + 1])
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = encode([value(rows[-1], key) for key in keys])
+    return Page(rows, cursor, next_cursor)
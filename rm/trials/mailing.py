@@ -0,0 +1,287 @@
+"""
+Emails to the participants of a trial.
+
+The body of each email only depends on the trial and the participant's
+group, so we compile it - render it once - per group, template and
+version of the trial, and keep it in the EMAIL_CACHE for everyone else
+in that group. Saving a trial or its variables gives the trial a new
+version, so nobody is sent a body that's out of date.
+
+Emails to many participants at once are sent in batches over a single
+connection - which puts them in the outbox, a batch per insert. People
+who don't want email from us are filtered out in the query. These are
+run from the celery tasks in rm.trials.tasks, so the request that
+triggers them doesn't have to wait.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import get_cache
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+
+from rm.trials.ingest import chunked
+
+BATCH_SIZE = 100
+VERSION_TIMEOUT = 30 * 86400
+CHI2_FAILURES_TO = 'david@deadpansincerity.com'
+
+
+def _cache():
+    return get_cache(settings.EMAIL_CACHE)
+
+
+def _version_key(trial_pk):
+    return 'email-version:{0}'.format(trial_pk)
+
+
+def version(trial):
+    """
+    Return the current version of TRIAL (an instance or primary key),
+    starting one if it hasn't got one.
+
+    Return: str
+    Exceptions: None
+    """
+    cache = _cache()
+    key = _version_key(getattr(trial, 'pk', trial))
+    current = cache.get(key)
+    if current is None:
+        cache.add(key, uuid.uuid4().hex, VERSION_TIMEOUT)
+        current = cache.get(key)
+    return current
+
+
+def bump(trial):
+    """
+    Give TRIAL (an instance or primary key) a new version, so that its
+    emails are compiled afresh.
+
+    Return: None
+    Exceptions: None
+    """
+    _cache().set(_version_key(getattr(trial, 'pk', trial)), uuid.uuid4().hex,
+                 VERSION_TIMEOUT)
+    return
+
+
+def render(template, context):
+    """
+    Render the letter TEMPLATE with CONTEXT.
+
+    Return: (plain, html)
+    Exceptions: None
+    """
+    from rm.trials.models import POSTIE
+
+    with POSTIE.template(template):
+        return POSTIE.body(**context)
+
+
+def compiled(trial, template, group, context):
+    """
+    Return the body of TEMPLATE for members of GROUP (a group name, or
+    None if it's the same for everyone) in TRIAL.
+
+    We only call CONTEXT for the template context, and render it, the
+    first time we're asked for this version of TRIAL. After that it
+    comes from the cache, until it's evicted.
+
+    Return: (plain, html)
+    Exceptions: None
+    """
+    cache = _cache()
+    key = 'email:{0}:{1}:{2}:{3}'.format(template, trial.pk, group or '-', version(trial))
+    body = cache.get(key)
+    if body is None:
+        body = render(template, context())
+        cache.set(key, body, settings.EMAIL_CACHE_TIMEOUT)
+    return body
+
+
+def _question(trial):
+    questions = trial.variable_set.values_list('question', flat=True)[:1]
+    return questions[0] if questions else None
+
+
+def instructions_body(trial, group):
+    """
+    Return the instructions for members of GROUP (a group name) in
+    TRIAL.
+
+    Return: (plain, html)
+    Exceptions: None
+    """
+    from rm.trials.models import Group
+
+    return compiled(trial, 'email/rm_instructions', group, lambda: {
+            'href'        : settings.DEFAULT_DOMAIN + trial.get_absolute_url(),
+            'instructions': trial.group_a if group == Group.GROUP_A else trial.group_b,
+            'name'        : trial.title,
+            'group'       : group,
+            'question'    : _question(trial),
+            })
+
+
+def reminder_body(trial, group):
+    """
+    Return the reminder to report for members of GROUP (a group name)
+    in TRIAL.
+
+    Return: (plain, html)
+    Exceptions: None
+    """
+    return compiled(trial, 'email/rm_reminder', group, lambda: {
+            'href'    : settings.DEFAULT_DOMAIN + trial.get_absolute_url(),
+            'group'   : group,
+            'question': _question(trial),
+            'name'    : trial.title,
+            })
+
+
+def invitation_body(trial):
+    """
+    Return the invitation to join TRIAL.
+
+    Return: (plain, html)
+    Exceptions: None
+    """
+    return compiled(trial, 'email/rm_invitation', None, lambda: {
+            'href' : settings.DEFAULT_DOMAIN + trial.get_absolute_url(),
+            'owner': trial.owner,
+            'name' : trial.title,
+            })
+
+
+def ended_body(trial):
+    """
+    Return the notice that TRIAL has ended.
+
+    Return: (plain, html)
+    Exceptions: None
+    """
+    return compiled(trial, 'email/rm_ended', None, lambda: {
+            'href': settings.DEFAULT_DOMAIN + trial.get_absolute_url(),
+            'name': trial.title,
+            })
+
+
+def message(to, subject, plain, html):
+    """
+    Return an email to TO with the rendered PLAIN and HTML bodies.
+
+    Return: EmailMultiAlternatives
+    Exceptions: None
+    """
+    msg = EmailMultiAlternatives(subject, plain or '', settings.DEFAULT_FROM_EMAIL, [to])
+    if html:
+        msg.attach_alternative(html, 'text/html')
+    return msg
+
+
+def send(messages, batch_size=BATCH_SIZE):
+    """
+    Send MESSAGES BATCH_SIZE at a time over one connection.
+
+    Return: int, the number of messages sent
+    Exceptions: None
+    """
+    connection = get_connection()
+    sent = 0
+    connection.open()
+    try:
+        for batch in chunked(messages, batch_size):
+            sent += connection.send_messages(batch) or 0
+    finally:
+        connection.close()
+    return sent
+
+
+def recipients(participants):
+    """
+    Return the PARTICIPANTS who have an email address and are happy
+    to receive email from us.
+
+    Return: Queryset
+    Exceptions: None
+    """
+    return participants.filter(user__receive_emails=True).exclude(
+        user__email__isnull=True).exclude(user__email='')
+
+
+def instructions(trial, participant_pks=None):
+    """
+    Email each randomised participant of TRIAL (or just those in
+    PARTICIPANT_PKS) the instructions for their group.
+
+    Return: int, the number of messages sent
+    Exceptions: None
+    """
+    subject = u'Randomise.me - instructions for {0}'.format(trial.title)
+    bodies = dict((group.pk, instructions_body(trial, group.name))
+                  for group in trial.group_set.all())
+
+    participants = recipients(trial.participant_set.filter(group__isnull=False))
+    if participant_pks is not None:
+        participants = participants.filter(pk__in=participant_pks)
+    rows = participants.values_list('user__email', 'group').iterator()
+    return send(message(email, subject, *bodies[group]) for email, group in rows)
+
+
+def ended(trial):
+    """
+    Email everyone but the owner who took part in TRIAL to say that
+    it has ended.
+
+    Return: int, the number of messages sent
+    Exceptions: None
+    """
+    subject = 'Randomise Me - Trial {0} has ended'.format(trial.title)
+    plain, html = ended_body(trial)
+    participants = recipients(trial.participant_set.exclude(user=trial.owner_id))
+    emails = participants.values_list('user__email', flat=True).iterator()
+    return send(message(email, subject, plain, html) for email in emails)
+
+
+def invitations(trial, batch_size=BATCH_SIZE):
+    """
+    Email everyone invited to TRIAL who hasn't had their invitation
+    yet.
+
+    Each batch is sent and marked as sent in one transaction, so that
+    with the outbox nobody is invited twice, and the progress of a big
+    list can be followed from the invitations themselves.
+
+    Return: int, the number of messages sent
+    Exceptions: None
+    """
+    from rm.trials.models import Invitation
+
+    subject = 'Invitation to participate in {0}'.format(trial.title)
+    plain, html = invitation_body(trial)
+    pending = list(trial.invitation_set.filter(sent=False).values_list('pk', 'email'))
+    connection = get_connection()
+    sent = 0
+    connection.open()
+    try:
+        for batch in chunked(pending, batch_size):
+            with transaction.commit_on_success():
+                connection.send_messages([message(email, subject, plain, html)
+                                          for pk, email in batch])
+                Invitation.objects.filter(pk__in=[pk for pk, email in batch]).update(sent=True)
+            sent += len(batch)
+    finally:
+        connection.close()
+    return sent
+
+
+def chi2_failure(obs, exc):
+    """
+    Tell the developers that we couldn't run chi2 on the contingency
+    table OBS, with the traceback EXC.
+
+    Return: int, the number of messages sent
+    Exceptions: None
+    """
+    body = "Couldn't run chi2 for {0}\n\n{1}".format(str(obs), exc)
+    return send([message(CHI2_FAILURES_TO, 'Chi2 failure instance', body, None)])
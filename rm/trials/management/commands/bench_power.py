@@ -0,0 +1,51 @@
+"""
+Compare the latency of power calculations through the rm.stats.power
+grid against calling the statsmodels solver directly.
+"""
+from optparse import make_option
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from statsmodels.stats.power import tt_ind_solve_power
+
+from rm.stats import power
+
+class Command(BaseCommand):
+    """
+    Our command.
+
+    Nothing special to see here.
+    """
+    option_list = BaseCommand.option_list + (
+        make_option('--calls', '-n', dest='calls', type='int', default=500),
+        )
+
+    def _time(self, fn, queries):
+        start = time.time()
+        for query in queries:
+            fn(*query)
+        return (time.time() - start) / len(queries)
+
+    def handle(self, **options):
+        calls = options['calls']
+        queries = [(random.uniform(0.05, 1.5),
+                    random.choice(power.ALPHAS),
+                    random.choice(power.POWERS))
+                   for i in range(calls)]
+        solver = lambda e, a, p: tt_ind_solve_power(effect_size=e, alpha=a,
+                                                     power=p, nobs1=None)
+
+        start = time.time()
+        power.build_grid()
+        print 'Grid build: {0:.3f}s'.format(time.time() - start)
+
+        direct = self._time(solver, queries)
+        interpolated = self._time(power.nobs1, queries)
+        memoised = self._time(power.nobs1, queries)
+
+        print 'Solver:       {0:9.1f}us per call'.format(direct * 1e6)
+        print 'Interpolated: {0:9.1f}us per call'.format(interpolated * 1e6)
+        print 'Memoised:     {0:9.1f}us per call'.format(memoised * 1e6)
+        print 'Speedup:      {0:9.1f}x / {1:.1f}x'.format(direct / interpolated,
+                                                         direct / memoised)
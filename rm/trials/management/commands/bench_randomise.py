@@ -0,0 +1,65 @@
+"""
+Compare randomising a trial participant-by-participant against the
+bulk allocation in Trial.randomise().
+
+Everything we create is deleted at the end. It can't be rolled back:
+Trial.randomise() and Participant.save() commit as they go.
+"""
+from optparse import make_option
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from rm.trials.models import Participant, Trial, User
+
+
+class Command(BaseCommand):
+    """
+    Our command.
+
+    Nothing special to see here.
+    """
+    option_list = BaseCommand.option_list + (
+        make_option('--participants', '-n', dest='participants', type='int',
+                    default=2000),
+        )
+
+    def _trial(self, owner, num):
+        trial = Trial(owner=owner, title='Benchmark', min_participants=num,
+                      offline=True)
+        trial.save()
+        Participant.objects.bulk_create(
+            [Participant(trial=trial, identifier=str(i)) for i in range(num)])
+        return trial
+
+    def _one_by_one(self, trial):
+        groups = trial.ensure_groups()
+        for participant in trial.participant_set.all():
+            participant.group = random.choice(groups)
+            participant.save()
+
+    def handle(self, **options):
+        num = options['participants']
+        stamp = time.time()
+        owner = User(username='bench-randomise-{0}'.format(stamp),
+                     email='bench-randomise-{0}@example.com'.format(stamp))
+        owner.save()
+        try:
+            trial = self._trial(owner, num)
+            start = time.time()
+            self._one_by_one(trial)
+            looped = time.time() - start
+
+            trial = self._trial(owner, num)
+            start = time.time()
+            trial.randomise()
+            bulk = time.time() - start
+        finally:
+            # Takes the trials, their groups and participants with it.
+            owner.delete()
+
+        print 'Participants: {0}'.format(num)
+        print 'One by one:   {0:8.3f}s ({1:9.0f} per second)'.format(looped, num / looped)
+        print 'Bulk:         {0:8.3f}s ({1:9.0f} per second)'.format(bulk, num / bulk)
+        print 'Speedup:      {0:8.1f}x'.format(looped / bulk)
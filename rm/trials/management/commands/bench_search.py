@@ -0,0 +1,110 @@
+"""
+Compare searching trials through the search index against the old
+title__icontains scan.
+
+Everything we create is rolled back at the end.
+"""
+from optparse import make_option
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from rm.trials import search
+from rm.trials.models import SearchTerm, Trial, User
+
+SYLLABLES = """
+ba be bi bo bu ca ce ci co cu da de di do du fa fe fi fo fu ga ge gi go
+la le li lo lu ma me mi mo mu na ne ni no nu pa pe pi po pu ra re ri ro
+sa se si so su ta te ti to tu va ve vi vo vu
+""".split()
+VOCABULARY = 5000
+
+
+class Command(BaseCommand):
+    """
+    Our command.
+
+    Nothing special to see here.
+    """
+    option_list = BaseCommand.option_list + (
+        make_option('--trials', '-n', dest='trials', type='int', default=5000),
+        make_option('--queries', '-q', dest='queries', type='int', default=200),
+        )
+
+    def _vocabulary(self, num):
+        words = set()
+        while len(words) < num:
+            words.add(''.join(random.choice(SYLLABLES) for i in range(random.randint(2, 4))))
+        self.words = sorted(words)
+
+    def _word(self):
+        # Roughly Zipfian, like real text: a few words are everywhere.
+        rank = int(random.paretovariate(1.0)) - 1
+        return self.words[rank % len(self.words)]
+
+    def _text(self, num):
+        return ' '.join(self._word() for i in range(num))
+
+    def _trials(self, owner, num):
+        Trial.objects.bulk_create([
+                Trial(owner=owner, title=self._text(4), description=self._text(40),
+                      group_a=self._text(15), group_b=self._text(15),
+                      private=(i % 10 == 0), min_participants=20)
+                for i in range(num)])
+
+    def _time(self, queries, find):
+        start = time.time()
+        found = 0
+        for q in queries:
+            found += len(find(q))
+        return time.time() - start, found
+
+    def _icontains(self, q):
+        return list(Trial.objects.filter(title__icontains=q).with_votes()[:search.PAGE_SIZE])
+
+    def _icontains_all(self, q):
+        matches = Q()
+        for field, _ in search.FIELDS:
+            matches |= Q(**{field + '__icontains': q})
+        return list(Trial.objects.filter(matches, private=False).exclude(
+                hide=True).with_votes()[:search.PAGE_SIZE])
+
+    def _indexed(self, q):
+        return search.search(q)[:search.PAGE_SIZE]
+
+    @transaction.commit_manually
+    def handle(self, **options):
+        num, nqueries = options['trials'], options['queries']
+        random.seed(1)
+        self._vocabulary(VOCABULARY)
+        try:
+            stamp = time.time()
+            owner = User(username='bench-search-{0}'.format(stamp),
+                         email='bench-search-{0}@example.com'.format(stamp))
+            owner.save()
+            self._trials(owner, num)
+            start = time.time()
+            # Not search.rebuild(), whose transaction would commit ours.
+            trials = list(Trial.objects.filter(owner=owner, private=False))
+            SearchTerm.objects.bulk_create(list(search.entries(trials)))
+            built = time.time() - start
+            queries = [random.choice(self.words) for i in range(nqueries)]
+            scanned, scan_found = self._time(queries, self._icontains)
+            scanned_all, scan_all_found = self._time(queries, self._icontains_all)
+            indexed, index_found = self._time(queries, self._indexed)
+        finally:
+            transaction.rollback()
+
+        print 'Trials:       {0}'.format(num)
+        print 'Index build:  {0:8.3f}s'.format(built)
+        print 'icontains:    {0:8.3f}s ({1:9.0f} queries per second, {2} results)'.format(
+            scanned, nqueries / scanned, scan_found)
+        print 'All fields:   {0:8.3f}s ({1:9.0f} queries per second, {2} results)'.format(
+            scanned_all, nqueries / scanned_all, scan_all_found)
+        print 'Indexed:      {0:8.3f}s ({1:9.0f} queries per second, {2} results)'.format(
+            indexed, nqueries / indexed, index_found)
+        print 'Speedup:      {0:8.1f}x over title, {1:.1f}x over all fields'.format(
+            scanned / indexed, scanned_all / indexed)
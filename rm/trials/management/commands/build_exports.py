@@ -0,0 +1,33 @@
+"""
+Build the cached exports for stopped trials, then evict whatever
+the cache has outgrown.
+
+Pass --evict to skip building and only evict.
+"""
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from rm.trials import exportcache
+from rm.trials.models import Trial
+
+class Command(BaseCommand):
+    """
+    Our command.
+
+    Nothing special to see here.
+    """
+    option_list = BaseCommand.option_list + (
+        make_option('--primary_key', '-p', dest='pk',),
+        make_option('--evict', dest='evict', action='store_true', default=False),
+        )
+
+    def handle(self, **options):
+        if not options['evict']:
+            trials = Trial.objects.filter(stopped=True)
+            if options['pk']:
+                trials = trials.filter(pk=options['pk'])
+            for trial in trials:
+                exportcache.build(trial)
+                print trial
+        print 'Evicted {0} files'.format(exportcache.evict())
@@ -0,0 +1,18 @@
+"""
+Rebuild the trial search index from scratch.
+
+Run this after migrating to add the index, or if you suspect it has
+drifted.
+"""
+from django.core.management.base import BaseCommand
+
+from rm.trials import search
+
+class Command(BaseCommand):
+    """
+    Our command.
+
+    Nothing special to see here.
+    """
+    def handle(self, **options):
+        print 'Indexed {0} trials'.format(search.rebuild())
@@ -0,0 +1,81 @@
+"""
+Report what a cold worker pays to import the site.
+
+We run the imports in a fresh interpreter so that nothing this process
+has already loaded hides the cost.
+"""
+from optparse import make_option
+import json
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+HEAVY = ('numpy', 'scipy', 'statsmodels', 'pandas')
+
+PROFILER = r"""
+import __builtin__
+import json
+import resource
+import sys
+import time
+
+_import = __builtin__.__import__
+_times = {}
+
+def _timed(name, *args, **kwargs):
+    already = name in sys.modules
+    start = time.time()
+    try:
+        return _import(name, *args, **kwargs)
+    finally:
+        if not already and name in sys.modules:
+            _times[name] = time.time() - start
+
+__builtin__.__import__ = _timed
+start = time.time()
+for module in sys.argv[1:]:
+    __builtin__.__import__(module)
+__builtin__.__import__ = _import
+total = time.time() - start
+
+json.dump(dict(total=total,
+               maxrss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               modules=sorted(sys.modules),
+               times=_times), sys.stdout)
+"""
+
+
+class Command(BaseCommand):
+    """
+    Our command.
+
+    Nothing special to see here.
+    """
+    args = '[module ...]'
+    option_list = BaseCommand.option_list + (
+        make_option('--top', '-n', dest='top', type='int', default=15),
+        )
+
+    def handle(self, *modules, **options):
+        modules = modules or ('rm.wsgi', 'rm.urls', 'rm.trials.models')
+        proc = subprocess.Popen([sys.executable, '-c', PROFILER] + list(modules),
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = proc.communicate()
+        if proc.returncode != 0:
+            raise CommandError(err)
+        profile = json.loads(out)
+
+        print 'Imported:  {0}'.format(', '.join(modules))
+        print 'Total:     {0:.3f}s'.format(profile['total'])
+        print 'Max RSS:   {0:.1f}MB'.format(profile['maxrss'] / 1024.0)
+        print 'Modules:   {0}'.format(len(profile['modules']))
+        print
+        print 'Slowest (cumulative):'
+        slowest = sorted(profile['times'].items(), key=lambda x: -x[1])
+        for name, took in slowest[:options['top']]:
+            print '  {0:8.1f}ms  {1}'.format(took * 1000, name)
+        print
+        loaded = set(m.split('.')[0] for m in profile['modules'])
+        for name in HEAVY:
+            print '{0:12} {1}'.format(name, 'loaded' if name in loaded else '-')
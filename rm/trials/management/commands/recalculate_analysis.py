@@ -7,7 +7,7 @@ Use sparingly in production.
 from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand
 
-from rm.trials.models import Trial, TrialAnalysis
+from rm.trials.models import Trial, TrialAnalysis, GroupStatistics
 
 class Command(BaseCommand):
     """
@@ -16,6 +16,8 @@ class Command(BaseCommand):
     Nothing special to see here.
     """
     def handle(self, **options):
+        for trial in Trial.objects.all():
+            GroupStatistics.rebuild(trial)
         for trial in Trial.objects.filter(stopped=True):
             TrialAnalysis.report_on(trial)
             print trial
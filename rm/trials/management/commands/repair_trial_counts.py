@@ -0,0 +1,33 @@
+"""
+Recompute the denormalised participant, report and group counters
+for every trial.
+
+Migrating fills them in, so run this if you suspect they have
+drifted.
+"""
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from rm.trials.models import Trial
+
+class Command(BaseCommand):
+    """
+    Our command.
+
+    Nothing special to see here.
+    """
+    option_list = BaseCommand.option_list + (
+        make_option('--primary_key', '-p', dest='pk',),
+        )
+
+    def handle(self, **options):
+        trials = Trial.objects.all()
+        if options['pk']:
+            trials = trials.filter(pk=options['pk'])
+        for trial in trials:
+            before = [getattr(trial, c) for c in Trial.COUNTERS]
+            trial.recount()
+            after = [getattr(trial, c) for c in Trial.COUNTERS]
+            if before != after:
+                print trial, before, '->', after
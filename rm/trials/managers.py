@@ -4,11 +4,58 @@ Custom managers for Trials.
 import datetime
 
 from django.db import models
+from django.db.models.query import QuerySet
 
 td = lambda: datetime.date.today()
 
+class TrialQuerySet(QuerySet):
+
+    def with_votes(self):
+        """
+        Return this queryset with vote pluses, minuses and score
+        annotated onto each trial, so listing scores doesn't cost
+        queries per trial.
+
+        Return: Queryset
+        Exceptions: None
+        """
+        from rm.suffrage.models import annotate_votes
+        return annotate_votes(self)
+
+    def hot(self):
+        """
+        Return the ranked trials in this queryset, hottest first.
+
+        Return: Queryset
+        Exceptions: None
+        """
+        return self.filter(ranking__isnull=False, private=False).exclude(
+            hide=True).order_by('-ranking__hotness', '-pk')
+
+
 class RmTrialManager(models.Manager):
 
+    def get_query_set(self):
+        return TrialQuerySet(self.model, using=self._db)
+
+    def with_votes(self):
+        """
+        Return a queryset of all trials with their votes annotated.
+
+        Return: Queryset
+        Exceptions: None
+        """
+        return self.get_query_set().with_votes()
+
+    def hot(self):
+        """
+        Return a queryset of the ranked trials, hottest first.
+
+        Return: Queryset
+        Exceptions: None
+        """
+        return self.get_query_set().hot()
+
     def completed(self):
         """
         Return a queryset representing completed trials.
@@ -48,6 +95,7 @@ class RmTrialManager(models.Manager):
         Return: Trial
         Exceptions: None
         """
+        from rm.trials.models import Trial
 
         trial = self.get(**kwargs)
         parent = self.get(**kwargs)
@@ -56,4 +104,19 @@ class RmTrialManager(models.Manager):
         trial.featured    = None
         trial.owner       = owner
         trial.parent      = parent
+        for counter in Trial.COUNTERS:
+            setattr(trial, counter, 0)
         return trial
+
+
+class ReportManager(models.Manager):
+
+    def completed(self):
+        """
+        Return a queryset representing completed reports - those
+        with a date, or from offline trials.
+
+        Return: Queryset
+        Exceptions: None
+        """
+        return self.filter(models.Q(date__isnull=False) | models.Q(trial__offline=True))
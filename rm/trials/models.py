@@ -1,28 +1,30 @@
 """
 MODELS for trials we're running
 """
+import collections
 import datetime
-import random
-import traceback
+import logging
+import math
+import uuid
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes import generic
 from django.core.mail import send_mail
 from django.core.urlresolvers import reverse
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
 import letter
-import numpy as np
-from scipy import stats as scistats
 from sorl import thumbnail
-from statsmodels.stats.power import tt_ind_solve_power
-from statsmodels.stats.weightstats import ttest_ind
 
 from rm import exceptions
 from rm.suffrage.models import VotableMixin, Vote
-from rm.trials import managers, tasks
+from rm.suffrage.signals import vote_cast
+from rm.trials import mailing, managers, search, tasks
+from rm.widgets import fragments
 
 td = lambda: datetime.date.today()
+logger = logging.getLogger(__name__)
 POSTIE = letter.DjangoPostman()
 Avg = models.Avg
 User = get_user_model()
@@ -138,8 +140,9 @@ class Trial(VotableMixin, models.Model):
     offline           = models.BooleanField(default=False)
     featured          = models.BooleanField(default=False)
     stopped           = models.BooleanField(default=False)
+    randomisation_seed = models.BigIntegerField(blank=True, null=True)
     is_edited         = models.BooleanField(default=False)
-    created           = models.DateTimeField(default=lambda: datetime.datetime.now())
+    created           = models.DateTimeField(default=lambda: datetime.datetime.now(), db_index=True)
     private           = models.BooleanField(default=False)
     hide              = models.NullBooleanField(default=False, blank=True, null=True)
     parent            = models.ForeignKey('self', blank=True, null=True,
@@ -148,6 +151,13 @@ class Trial(VotableMixin, models.Model):
     # Currently unused advanced user participants
     participants      = models.TextField(help_text=HELP_PART, blank=True, null=True)
 
+    # Denormalised counts, maintained by Participant and Report
+    participant_count = models.IntegerField(default=0)
+    report_count      = models.IntegerField(default=0)
+    group_a_count     = models.IntegerField(default=0)
+    group_b_count     = models.IntegerField(default=0)
+    COUNTERS = ('participant_count', 'report_count', 'group_a_count', 'group_b_count')
+
 
     objects = managers.RmTrialManager()
 
@@ -160,16 +170,106 @@ class Trial(VotableMixin, models.Model):
     def get_absolute_url(self):
         return reverse('trial-detail', kwargs={'pk': self.pk})
 
-    def save(self):
+    def to_json(self):
+        """
+        Return the public summary of this trial used by our JSON
+        listings.
+
+        Return: dict
+        Exceptions: None
+        """
+        return dict(
+            pk=self.pk,
+            title=self.title,
+            url=self.get_absolute_url(),
+            created=self.created.isoformat(),
+            n1trial=self.n1trial,
+            stopped=self.stopped,
+            score=self.suffrage.score,
+            )
+
+    def save(self, *args, **kwargs):
         """
-        Check for recruiting status
+        Check for recruiting status, keep our entries in the search
+        index up to date, and invalidate the dashboards of our owner and
+        participants, and our compiled emails.
+
+        Our counters are kept up to date by UPDATEs of their own, so
+        our copy of them may be stale - we leave them alone when saving
+        an existing trial.
 
         Return: None
         Exceptions: None
         """
         if self.recruitment == self.INVITATION:
             self.private = True
-        return super(Trial, self).save()
+        if self.pk is not None and not self._state.adding and 'update_fields' not in kwargs:
+            kwargs['update_fields'] = [f.name for f in self._meta.local_fields
+                                       if not f.primary_key and f.name not in self.COUNTERS]
+        super(Trial, self).save(*args, **kwargs)
+        search.index(self)
+        self.bump_dashboards()
+        mailing.bump(self)
+        return
+
+    def bump_dashboards(self):
+        """
+        Invalidate the dashboards of our owner and every participant,
+        as they all show our title, description and counters.
+
+        Return: None
+        Exceptions: None
+        """
+        fragments.bump(self.owner_id, *self.participant_set.values_list('user', flat=True))
+        return
+
+    @staticmethod
+    def group_counter(name):
+        """
+        Return the name of the counter for the group called NAME.
+
+        Return: str or None
+        Exceptions: None
+        """
+        return {Group.GROUP_A: 'group_a_count', Group.GROUP_B: 'group_b_count'}.get(name)
+
+    def adjust_counts(self, **deltas):
+        """
+        Add DELTAS to our counters in a single UPDATE, and to this
+        instance.
+
+        Return: None
+        Exceptions: None
+        """
+        deltas = dict((name, delta) for name, delta in deltas.items() if delta)
+        if not deltas:
+            return
+        Trial.objects.filter(pk=self.pk).update(
+            **dict((name, models.F(name) + delta) for name, delta in deltas.items()))
+        for name, delta in deltas.items():
+            setattr(self, name, getattr(self, name) + delta)
+        return
+
+    def recount(self):
+        """
+        Recompute our counters from scratch.
+
+        Return: None
+        Exceptions: None
+        """
+        counts = dict(participant_count=self.participant_set.count(),
+                      report_count=Report.objects.completed().filter(trial=self).count(),
+                      group_a_count=0, group_b_count=0)
+        groups = self.participant_set.exclude(group__isnull=True).values(
+            'group__name').annotate(n=models.Count('pk'))
+        for row in groups:
+            counter = self.group_counter(row['group__name'])
+            if counter:
+                counts[counter] = row['n']
+        Trial.objects.filter(pk=self.pk).update(**counts)
+        for name, count in counts.items():
+            setattr(self, name, count)
+        return
 
     def image_url(self):
         """
@@ -190,9 +290,26 @@ class Trial(VotableMixin, models.Model):
         Return: dict
         Exceptions: None
         """
-        anal = self.trialanalysis_set.get()
-        return [dict(name='Group A', avg=anal.meana),
-                dict(name='Group B', avg=anal.meanb)]
+        stats = self.group_statistics()
+        return [dict(name='Group A', avg=stats[Group.GROUP_A].mean),
+                dict(name='Group B', avg=stats[Group.GROUP_B].mean)]
+
+    def group_statistics(self):
+        """
+        Return the running statistics for each of our groups, keyed
+        by group name.
+
+        Groups that have no reports yet get an empty, unsaved instance.
+
+        Return: dict
+        Exceptions: None
+        """
+        stats = dict((s.group.name, s) for s in
+                     self.groupstatistics_set.select_related('group'))
+        for name in [Group.GROUP_A, Group.GROUP_B]:
+            if name not in stats:
+                stats[name] = GroupStatistics(trial=self)
+        return stats
 
 
     @property
@@ -293,7 +410,7 @@ class Trial(VotableMixin, models.Model):
         Return: bool
         Exceptions: None
         """
-        return (self.min_participants - self.participant_set.count() )
+        return (self.min_participants - self.participant_count)
 
     def needs_participants(self):
         """
@@ -327,6 +444,9 @@ class Trial(VotableMixin, models.Model):
 
         If nobody has joined yet, we go to Group A, else Group A if
         the groups are equal, else Group B.
+
+        Instructions are emailed from the task queue, straight away or
+        by the ScheduledMessage sweeper.
         """
         if self.stopped:
             raise exceptions.TrialFinishedError()
@@ -335,33 +455,51 @@ class Trial(VotableMixin, models.Model):
         part = Participant(trial=self, user=user).randomise()
         part.save()
         if self.instruction_delivery == self.IMMEDIATE:
-            part.send_instructions()
+            tasks.send_instructions.delay(self.pk, [part.pk])
         if self.instruction_delivery == self.HOURS:
-            eta = datetime.utcnow() + datetime.timedelta(seconds=60*60*self.instruction_hours_after)
-            tasks.instruct_later.apply_async((participant.pk), eta=eta)
+            due = timezone.now() + datetime.timedelta(hours=self.instruction_hours_after)
+            ScheduledMessage.instruct(part, due)
         return
 
-    def randomise(self):
+    def randomise(self, seed=None):
         """
         Randomise the participants of this trial.
 
+        Allocations are made in memory from an RNG seeded with SEED (or
+        a fresh seed), which we store on the trial so that the
+        allocation can be reproduced for audit. They are written with
+        one UPDATE per group.
+
         If we have already randomised the participants, raise AlreadyRandomisedError.
 
         Return: None
         Exceptions: AlreadyRandomisedError
         """
+        from rm.trials import randomisation
+
         if self.participant_set.filter(group__isnull=False).count() > 0:
             raise exceptions.AlreadyRandomisedError()
-        groupa, groupb = self.ensure_groups()
-        for participant in self.participant_set.all():
-            participant.group = random.choice([groupa, groupb])
-            participant.save()
+        if seed is None:
+            seed = randomisation.new_seed()
+        groups = list(self.ensure_groups())
+        pks = self.participant_set.order_by('pk').values_list('pk', flat=True)
+        allocation = randomisation.allocate(list(pks), groups, seed)
+        with transaction.commit_on_success():
+            randomisation.write(self.participant_set.all(), allocation)
+            self.adjust_counts(**dict((self.group_counter(group.name), len(pks))
+                                      for group, pks in allocation.items()))
+            self.randomisation_seed = seed
+            Trial.objects.filter(pk=self.pk).update(randomisation_seed=seed)
+        # The UPDATEs skip Participant.save(), so invalidate dashboards here.
+        self.bump_dashboards()
         return
 
     def send_instructions(self):
         """
         Email the participants of this trial with their instructions.
 
+        The emails go out from the task queue, in batches.
+
         Return: None
         Exceptions:
             - TrialFinishedError: The trial has finished
@@ -371,8 +509,22 @@ class Trial(VotableMixin, models.Model):
         #     raise exceptions.TrialNotStartedError()
         if self.stopped:
             raise exceptions.TrialFinishedError()
-        for participant in self.participant_set.all():
-            participant.send_instructions()
+        tasks.send_instructions.delay(self.pk)
+        return
+
+    def forget_exports(self):
+        """
+        If we're stopped, forget our cached exports, as our data has
+        changed since they were built. Downloads read the database
+        until build_exports builds them again.
+
+        Return: None
+        Exceptions: None
+        """
+        from rm.trials import exportcache
+
+        if self.stopped:
+            exportcache.invalidate(self.pk)
         return
 
     def stop(self):
@@ -382,13 +534,19 @@ class Trial(VotableMixin, models.Model):
         Return: None
         Exceptions: None
         """
+        from rm.trials import exportcache
+
         self.stopped = True
-        self.save()
+        self.save() # Which invalidates our participants' dashboards
         TrialAnalysis.report_on(self)
+        try:
+            exportcache.build(self)
+            exportcache.evict()
+        except EnvironmentError:
+            pass # Downloads fall back to reading the database
         if self.offline:
             return
-        for participant in self.participant_set.exclude(user=self.owner):
-            participant.send_ended_notification()
+        tasks.send_ended_notifications.delay(self.pk)
         return
 
     def num_reports(self):
@@ -398,7 +556,7 @@ class Trial(VotableMixin, models.Model):
         Return: int
         Exceptions: None
         """
-        return self.report_set.exclude(date__isnull=True).count()
+        return self.report_count
 
 
 class Invitation(models.Model):
@@ -412,6 +570,19 @@ class Invitation(models.Model):
     def __unicode__(self):
         return '{0} - {1}'.format(self.email, self.trial.title)
 
+    @staticmethod
+    def progress(trial):
+        """
+        Return how far we've got with sending TRIAL's invitations.
+
+        Return: dict
+        Exceptions: None
+        """
+        counts = dict(trial.invitation_set.values_list('sent').annotate(models.Count('pk')))
+        sent = counts.get(True, 0)
+        invited = sent + counts.get(False, 0)
+        return dict(invited=invited, sent=sent, pending=invited - sent)
+
     def invite(self):
         """
         Send an invitation email to this invitee.
@@ -420,20 +591,8 @@ class Invitation(models.Model):
         Exceptions: None
         """
         subject = 'Invitation to participate in {0}'.format(self.trial.title)
-        class Message(letter.Letter):
-            Postie   = POSTIE
-
-            From     = settings.DEFAULT_FROM_EMAIL
-            To       = self.email;
-            Subject  = subject
-            Template = 'email/rm_invitation'
-            Context  = {
-                'href'        : settings.DEFAULT_DOMAIN + self.trial.get_absolute_url(),
-                'owner'       : self.trial.owner,
-                'name'        : self.trial.title
-                }
-
-        Message.send()
+        plain, html = mailing.invitation_body(self.trial)
+        mailing.message(self.email, subject, plain, html).send()
         self.sent = True
         self.save()
         return
@@ -464,6 +623,35 @@ class Variable(models.Model):
     def __unicode__(self):
         return u'<Variable {0} ({1})>'.format(self.name, self.style)
 
+    def save(self, *args, **kwargs):
+        """
+        Save the variable, re-indexing our trial for search and
+        invalidating its compiled emails, which ask our question.
+
+        Return: None
+        Exceptions: None
+        """
+        super(Variable, self).save(*args, **kwargs)
+        search.index(self.trial)
+        mailing.bump(self.trial_id)
+        return
+
+    @property
+    def value_field(self):
+        """
+        The name of the Report field that holds values for this
+        variable's style.
+
+        Return: str or None
+        Exceptions: None
+        """
+        return {
+            self.SCORE:  'score',
+            self.BINARY: 'binary',
+            self.COUNT:  'count',
+            self.TIME:   'seconds'
+            }.get(self.style)
+
     def report_form(self):
         """
         Return the relevant report form with this as it's
@@ -508,6 +696,104 @@ class Group(models.Model):
         return self.name
 
 
+class AllocationSequence(models.Model):
+    """
+    A precomputed permuted-block allocation sequence for a trial.
+
+    SEQUENCE holds one group name per slot and CURSOR is the next slot
+    to hand out. We keep the trial's groups here as well, so claiming a
+    slot needs nothing else from the database.
+    """
+    BLOCK_SIZE = 4
+    BLOCKS     = 256
+
+    trial    = models.OneToOneField(Trial, related_name='allocation')
+    group_a  = models.ForeignKey(Group, related_name='+')
+    group_b  = models.ForeignKey(Group, related_name='+')
+    seed     = models.BigIntegerField()
+    sequence = models.TextField(default='')
+    cursor   = models.IntegerField(default=0)
+
+    def __unicode__(self):
+        return u'{0} ({1}/{2})'.format(self.trial_id, self.cursor, len(self.sequence))
+
+    def extend(self):
+        """
+        Grow our sequence, at least doubling it.
+
+        Slots we've already handed out don't change.
+
+        Return: None
+        Exceptions: None
+        """
+        from rm.trials import randomisation
+        blocks = max(self.BLOCKS, 2 * len(self.sequence) // self.BLOCK_SIZE)
+        self.sequence = randomisation.permuted_blocks(
+            self.seed, blocks, (Group.GROUP_A, Group.GROUP_B), self.BLOCK_SIZE)
+        return
+
+    def groups(self):
+        """
+        Return our trial's groups keyed by name, without a query.
+
+        Return: dict
+        Exceptions: None
+        """
+        return {
+            Group.GROUP_A: Group(pk=self.group_a_id, trial_id=self.trial_id,
+                                 name=Group.GROUP_A),
+            Group.GROUP_B: Group(pk=self.group_b_id, trial_id=self.trial_id,
+                                 name=Group.GROUP_B),
+            }
+
+    @staticmethod
+    def take(trial, count):
+        """
+        Take the next COUNT slots of TRIAL's allocation sequence,
+        creating the sequence the first time we're asked.
+
+        The sequence row is locked until the caller's transaction ends,
+        so concurrent callers can't take the same slot. Callers must
+        manage that transaction themselves - most want claim().
+
+        Return: list of Groups
+        Exceptions: None
+        """
+        from rm.trials import randomisation
+        try:
+            sequence = AllocationSequence.objects.select_for_update().get(trial=trial)
+        except AllocationSequence.DoesNotExist:
+            groupa, groupb = trial.ensure_groups()
+            try:
+                sequence = AllocationSequence.objects.select_for_update().get_or_create(
+                    trial=trial, defaults=dict(group_a=groupa, group_b=groupb,
+                                               seed=randomisation.new_seed()))[0]
+            except IntegrityError:
+                # Another caller created the sequence after we looked for it
+                sequence = AllocationSequence.objects.select_for_update().get(trial=trial)
+        fields = ['cursor']
+        while sequence.cursor + count > len(sequence.sequence):
+            sequence.extend()
+            fields = ['cursor', 'sequence']
+        names = sequence.sequence[sequence.cursor:sequence.cursor + count]
+        sequence.cursor += count
+        sequence.save(update_fields=fields)
+        groups = sequence.groups()
+        return [groups[name] for name in names]
+
+    @staticmethod
+    def claim(trial, count=1):
+        """
+        Claim the next COUNT slots of TRIAL's allocation sequence in a
+        transaction of their own.
+
+        Return: list of Groups
+        Exceptions: None
+        """
+        with transaction.commit_on_success():
+            return AllocationSequence.take(trial, count)
+
+
 class Participant(models.Model):
     """
     A participant in a trial
@@ -524,15 +810,71 @@ class Participant(models.Model):
         """
         return u'<{0} - {1} ({2})>'.format(self.user, self.trial, self.group)
 
+    def save(self, *args, **kwargs):
+        """
+        Save the participant, keeping the trial's participant and
+        group counters in step within the same transaction, then
+        invalidate the dashboards of the participant - and of the user
+        who was, if they've just left - and of the trial owner.
+
+        Return: None
+        Exceptions: None
+        """
+        with transaction.commit_on_success():
+            previous = []
+            if self.pk is not None:
+                previous = list(Participant.objects.filter(pk=self.pk).values_list(
+                        'group__name', 'user'))
+            super(Participant, self).save(*args, **kwargs)
+            deltas = collections.Counter()
+            previous_user = None
+            if previous:
+                previous_group, previous_user = previous[0]
+                deltas[Trial.group_counter(previous_group)] -= 1
+            else:
+                deltas['participant_count'] += 1
+            if self.group_id is not None:
+                deltas[Trial.group_counter(self.group.name)] += 1
+            deltas.pop(None, None)
+            self.trial.adjust_counts(**deltas)
+        # Leaving a trial saves us with no user, so the user who left
+        # needs their dashboard invalidating too.
+        fragments.bump(self.user_id, previous_user, self.trial.owner_id)
+        self.trial.forget_exports()
+        return
+
+    def delete(self, *args, **kwargs):
+        """
+        Delete the participant, taking them off the trial's counters.
+
+        Return: None
+        Exceptions: None
+        """
+        with transaction.commit_on_success():
+            deltas = {'participant_count': -1}
+            if self.group_id is not None:
+                deltas[Trial.group_counter(self.group.name)] = -1
+            deltas.pop(None, None)
+            self.trial.adjust_counts(**deltas)
+            super(Participant, self).delete(*args, **kwargs)
+        fragments.bump(self.user_id, self.trial.owner_id)
+        self.trial.forget_exports()
+        return
+
     def randomise(self):
         """
-        Randomise this participant into a group
+        Randomise this participant into the next slot of the trial's
+        allocation sequence.
+
+        The slot is taken and we are saved in the same transaction, so
+        a failed save doesn't use up a slot.
 
         Return: Participant
         Exceptions: None
         """
-        self.group = random.choice(self.trial.ensure_groups())
-        self.save()
+        with transaction.commit_on_success():
+            self.group = AllocationSequence.take(self.trial, 1)[0]
+            self.save()
         return self
 
     def send_instructions(self):
@@ -548,25 +890,8 @@ class Participant(models.Model):
             raise exceptions.NoEmailError()
 
         subject = u'Randomise.me - instructions for {0}'.format(self.trial.title)
-        instructions = self.group.name == 'A' and self.trial.group_a or self.trial.group_b
-        question = self.trial.variable_set.all()[0].question
-
-        class Message(letter.Letter):
-            Postie   = POSTIE
-
-            From     = settings.DEFAULT_FROM_EMAIL
-            To       = self.user.email
-            Subject  = subject
-            Template = 'email/rm_instructions'
-            Context  = {
-                'href'        : settings.DEFAULT_DOMAIN + self.trial.get_absolute_url(),
-                'instructions': instructions,
-                'name'        : self.trial.title,
-                'group'       : self.group.name,
-                'question'    : question
-                }
-
-        self.user.send_message(Message)
+        plain, html = mailing.instructions_body(self.trial, self.group.name)
+        self.user.send_message(mailing.message(self.user.email, subject, plain, html))
         return
 
     def send_ended_notification(self):
@@ -578,19 +903,8 @@ class Participant(models.Model):
         Exceptions: None
         """
         subject = 'Randomise Me - Trial {0} has ended'.format(self.trial.title)
-        class Message(letter.Letter):
-            Postie   = POSTIE
-
-            From     = settings.DEFAULT_FROM_EMAIL
-            To       = self.user.email
-            Subject  = subject
-            Template = 'email/rm_ended'
-            Context  = {
-                'href'        : settings.DEFAULT_DOMAIN + self.trial.get_absolute_url(),
-                'name'        : self.trial.title,
-                }
-
-        self.user.send_message(Message)
+        plain, html = mailing.ended_body(self.trial)
+        self.user.send_message(mailing.message(self.user.email, subject, plain, html))
         return
 
 
@@ -607,6 +921,8 @@ class Report(models.Model):
     count        = models.IntegerField(blank=True, null=True)
     seconds      = models.IntegerField(blank=True, null=True)
 
+    objects = managers.ReportManager()
+
     def __unicode__(self):
         return '<Report for {0} {1} on {2}>'.format(self.trial.title,
                                                     getattr(self.group, 'name', 'noname'),
@@ -615,6 +931,88 @@ class Report(models.Model):
     def get_absolute_url(self):
         return reverse('trial-detail', kwargs={'pk': self.trial.pk})
 
+    def save(self, *args, **kwargs):
+        """
+        Save the report, keeping the running statistics for its
+        group and the trial's report counter in step within the
+        same transaction.
+
+        Return: None
+        Exceptions: None
+        """
+        with transaction.commit_on_success():
+            previous, was_completed = None, False
+            if self.pk is not None:
+                try:
+                    old = Report.objects.select_related(
+                        'trial', 'variable', 'group').get(pk=self.pk)
+                    previous, was_completed = old.tally(), old.completed()
+                except Report.DoesNotExist:
+                    pass
+            super(Report, self).save(*args, **kwargs)
+            GroupStatistics.record(self.trial, previous, self.tally())
+            self.trial.adjust_counts(report_count=int(self.completed()) - int(was_completed))
+        self.bump_dashboards()
+        self.trial.forget_exports()
+        return
+
+    def delete(self, *args, **kwargs):
+        """
+        Delete this report, and remove it from its group's running
+        statistics.
+
+        Return: None
+        Exceptions: None
+        """
+        with transaction.commit_on_success():
+            if self.completed():
+                self.trial.adjust_counts(report_count=-1)
+            super(Report, self).delete(*args, **kwargs)
+            GroupStatistics.record(self.trial, self.tally(), None)
+        self.bump_dashboards()
+        self.trial.forget_exports()
+        return
+
+    def bump_dashboards(self):
+        """
+        Invalidate the dashboards of everyone in this report's trial,
+        as they all show its report count.
+
+        Return: None
+        Exceptions: None
+        """
+        self.trial.bump_dashboards()
+        return
+
+    def completed(self):
+        """
+        Predicate method to determine whether this report counts
+        as a completed observation: it has a date, or it belongs to
+        an offline trial.
+
+        Return: bool
+        Exceptions: None
+        """
+        return self.date is not None or self.trial.offline
+
+    def tally(self):
+        """
+        Return the (group, value) pair that this report contributes to
+        the running statistics of its trial, or None if it doesn't count.
+
+        Reports count once they have a group and a value, and either a
+        date or belong to an offline trial.
+
+        Return: tuple or None
+        Exceptions: None
+        """
+        value = self.get_value()
+        if value is None or self.group_id is None:
+            return None
+        if self.date is None and not self.trial.offline:
+            return None
+        return self.group, float(value)
+
     def reported(self):
         """
         Predicate method to determine whether this report instance
@@ -657,23 +1055,8 @@ class Report(models.Model):
         """
         user = self.participant.user
         subject = 'We recently randomised you...'
-        question = self.trial.variable_set.all()[0].question
-
-        class Message(letter.Letter):
-            Postie   = POSTIE
-
-            From     = settings.DEFAULT_FROM_EMAIL
-            To       = user.email
-            Subject  = subject
-            Template = 'email/rm_reminder'
-            Context  = {
-                'href'        : settings.DEFAULT_DOMAIN + self.trial.get_absolute_url(),
-                'group'       : self.group.name,
-                'question'    : question,
-                'name'       : self.trial.title
-                }
-
-        user.send_message(Message)
+        plain, html = mailing.reminder_body(self.trial, self.group.name)
+        user.send_message(mailing.message(user.email, subject, plain, html))
         return
 
 
@@ -725,71 +1108,500 @@ class TrialAnalysis(models.Model):
     def report_on(trial):
         """
         Calculate headline stats for TRIAL once
+
+        The statistics libraries are expensive to import, so the
+        work happens in rm.trials.analysis, which we only load here.
         """
-        tr = TrialAnalysis.objects.get_or_create(trial=trial)[0]
+        from rm.trials import analysis
+        return analysis.report_on(trial)
 
-        if trial.report_set.count() < 2:
-            return
 
-        nobs1 = int(trial.report_set.count()/2)
-        if trial.offline:
-            reports = trial.report_set.all()
+class GroupStatistics(models.Model):
+    """
+    Running sufficient statistics for the reports in one group of
+    a trial.
+
+    We keep the count, sum and Welford's M2 (the sum of squared
+    deviations from the mean) so that means, variances and standard
+    errors are available without re-reading every report. For binary
+    variables we also keep the success/failure counts.
+    """
+    trial     = models.ForeignKey(Trial)
+    group     = models.ForeignKey(Group)
+    nobs      = models.IntegerField(default=0)
+    total     = models.FloatField(default=0)
+    m2        = models.FloatField(default=0)
+    successes = models.IntegerField(default=0)
+    failures  = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = (('trial', 'group'),)
+
+    def __unicode__(self):
+        return u'<Statistics for {0} group {1}>'.format(self.trial_id,
+                                                      getattr(self.group, 'name', None))
+
+    @property
+    def mean(self):
+        """
+        The mean of the values in this group, or None if empty.
+
+        Return: float or None
+        Exceptions: None
+        """
+        if not self.nobs:
+            return None
+        return self.total / self.nobs
+
+    @property
+    def variance(self):
+        """
+        The sample variance of the values in this group, or None
+        if we have fewer than two.
+
+        Return: float or None
+        Exceptions: None
+        """
+        if self.nobs < 2:
+            return None
+        return self.m2 / (self.nobs - 1)
+
+    @property
+    def sd(self):
+        """
+        The population standard deviation of the values in this group.
+
+        Return: float or None
+        Exceptions: None
+        """
+        if not self.nobs:
+            return None
+        return math.sqrt(self.m2 / self.nobs)
+
+    @property
+    def sem(self):
+        """
+        The standard error of the mean for this group.
+
+        Return: float or None
+        Exceptions: None
+        """
+        if self.nobs < 2:
+            return None
+        return math.sqrt(self.variance / self.nobs)
+
+    def add(self, value):
+        """
+        Add VALUE to our running statistics.
+
+        Arguments:
+        - `value`: float
+
+        Return: None
+        Exceptions: None
+        """
+        old_mean = self.mean or 0.0
+        self.nobs += 1
+        self.total += value
+        self.m2 += (value - old_mean) * (value - self.mean)
+        if value == 1:
+            self.successes += 1
+        elif value == 0:
+            self.failures += 1
+        return
+
+    def remove(self, value):
+        """
+        Remove a previously added VALUE from our running statistics.
+
+        Arguments:
+        - `value`: float
+
+        Return: None
+        Exceptions: None
+        """
+        old_mean = self.mean
+        self.nobs -= 1
+        self.total -= value
+        if self.nobs:
+            self.m2 -= (value - self.mean) * (value - old_mean)
         else:
-            reports = trial.report_set.exclude(date__isnull=True)
-        points = [t.get_value() for t in reports]
-        pointsa = [t.get_value() for t in reports.filter(group__name=Group.GROUP_A)]
-        pointsb = [t.get_value() for t in reports.filter(group__name=Group.GROUP_B)]
-        sd = np.std(points)
-        mean = np.mean(points)
-
-        nobsa = len(pointsa)
-        nobsb = len(pointsb)
-        meana = np.mean(pointsa)
-        meanb = np.mean(pointsb)
-        stderrmeana = scistats.sem(pointsa)
-        stderrmeanb = scistats.sem(pointsb)
-
-        small = tt_ind_solve_power(effect_size=0.1, alpha=0.05, nobs1=nobs1, power=None)
-        med = tt_ind_solve_power(effect_size=0.2, alpha=0.05, nobs1=nobs1, power=None)
-        large = tt_ind_solve_power(effect_size=0.5, alpha=0.05, nobs1=nobs1, power=None)
-        if trial.variable_set.get().style == Variable.BINARY:
-            obs = np.array([[len([p for p in pointsa if p == True]),
-                             len([p for p in pointsa if p == False])],
-                            [len([p for p in pointsb if p == True]),
-                             len([p for p in pointsb if p == False])]])
+            self.total, self.m2 = 0.0, 0.0
+        if value == 1:
+            self.successes -= 1
+        elif value == 0:
+            self.failures -= 1
+        return
+
+    @staticmethod
+    def from_values(values):
+        """
+        Return an unsaved instance describing the array of VALUES.
+
+        Arguments:
+        - `values`: numpy.array
+
+        Return: GroupStatistics
+        Exceptions: None
+        """
+        stats = GroupStatistics()
+        if len(values) == 0:
+            return stats
+        stats.nobs = len(values)
+        stats.total = float(values.sum())
+        stats.m2 = float(((values - values.mean()) ** 2).sum())
+        stats.successes = int((values == 1).sum())
+        stats.failures = int((values == 0).sum())
+        return stats
+
+    @staticmethod
+    def combine(*stats):
+        """
+        Return an unsaved instance holding the pooled statistics
+        of all of STATS.
+
+        Return: GroupStatistics
+        Exceptions: None
+        """
+        pooled = GroupStatistics()
+        for other in stats:
+            if not other.nobs:
+                continue
+            if pooled.nobs:
+                delta = other.mean - pooled.mean
+                nobs = pooled.nobs + other.nobs
+                pooled.m2 += other.m2 + delta * delta * pooled.nobs * other.nobs / nobs
+            else:
+                pooled.m2 = other.m2
+            pooled.nobs += other.nobs
+            pooled.total += other.total
+            pooled.successes += other.successes
+            pooled.failures += other.failures
+        return pooled
+
+    @staticmethod
+    def record(trial, previous, current):
+        """
+        Given the PREVIOUS and CURRENT (group, value) tallies of a
+        report in TRIAL, update the running statistics to match.
+
+        Rows are locked while we update them, so concurrent reports
+        can't lose each other's updates.
+
+        If there's no row to update, or nothing left in it to remove,
+        the running statistics can't be trusted (the trial's reports
+        predate them), so we recompute them from the reports instead.
+        The report must already be saved or deleted when this is called.
+
+        Return: None
+        Exceptions: None
+        """
+        if previous == current:
+            return
+        changes = []
+        if previous is not None:
+            changes.append((previous, GroupStatistics.remove))
+        if current is not None:
+            changes.append((current, GroupStatistics.add))
+        for (group, value), apply in changes:
+            stats, created = GroupStatistics.objects.select_for_update().get_or_create(
+                trial=trial, group=group)
+            if created or (apply == GroupStatistics.remove and stats.nobs < 1):
+                GroupStatistics.recompute(trial)
+                return
+            apply(stats, value)
+            stats.save()
+        return
+
+    @staticmethod
+    def recompute(trial):
+        """
+        Recompute the running statistics for TRIAL from its reports
+        as part of the current transaction.
+
+        Return: None
+        Exceptions: None
+        """
+        from rm.trials import analysis
+        values = analysis.reported_values(trial)
+        for group in trial.group_set.all():
+            fresh = GroupStatistics.from_values(values.get(group.name, []))
+            stats = GroupStatistics.objects.select_for_update().get_or_create(
+                trial=trial, group=group)[0]
+            for field in ['nobs', 'total', 'm2', 'successes', 'failures']:
+                setattr(stats, field, getattr(fresh, field))
+            stats.save()
+        return
+
+    @staticmethod
+    def rebuild(trial):
+        """
+        Recompute the running statistics for TRIAL from its reports.
+
+        Return: None
+        Exceptions: None
+        """
+        with transaction.commit_on_success():
+            GroupStatistics.recompute(trial)
+        return
+
+
+class TrialRanking(models.Model):
+    """
+    How hot a listed trial is.
+
+    A trial is as hot as its vote score, halving every HALF_LIFE days
+    since it was created. Rather than decay every row as time passes,
+    we store a key that orders trials the same way at any time: the
+    log of the score plus the number of half lives between EPOCH and
+    the trial's creation, negated for negative scores. Rows exist only
+    for public, visible trials that have been voted on, so the most
+    popular trials are the first few rows of one indexed query - see
+    TrialQuerySet.hot().
+
+    TrialRanking.update() keeps a trial's row in step as it is voted on,
+    and the rank_trials task calls TrialRanking.rebuild() now and then
+    to repair anything that has drifted.
+    """
+    HALF_LIFE = 7
+    EPOCH     = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+    trial   = models.OneToOneField(Trial, related_name='ranking')
+    score   = models.IntegerField(default=0)
+    hotness = models.FloatField(default=0, db_index=True)
+
+    def __unicode__(self):
+        return u'{0}: {1}'.format(self.trial_id, self.hotness)
+
+    @staticmethod
+    def hotness_of(score, created):
+        """
+        Return the ranking key of a trial CREATED at a given time with
+        SCORE.
+
+        Keys compare the way SCORE * 0.5 ** (age / HALF_LIFE) would at
+        any single moment, without depending on when that is.
+
+        Return: float
+        Exceptions: None
+        """
+        if not score:
+            return 0.0
+        if timezone.is_naive(created):
+            created = timezone.make_aware(created, timezone.get_default_timezone())
+        half_lives = max((created - TrialRanking.EPOCH).total_seconds(), 0) / (
+            86400.0 * TrialRanking.HALF_LIFE)
+        return math.copysign(math.log(abs(score), 2) + half_lives, score)
+
+    @staticmethod
+    def listed():
+        """
+        Return a queryset of the trials that may appear in rankings.
+
+        Return: Queryset
+        Exceptions: None
+        """
+        return Trial.objects.filter(private=False).exclude(hide=True)
+
+    @staticmethod
+    def update(trial):
+        """
+        Bring TRIAL's ranking up to date with its votes, adding or
+        removing its row as required.
+
+        Return: None
+        Exceptions: None
+        """
+        from rm.suffrage.models import VoteTally
+
+        tally = VoteTally.lookup(trial.suffrage._content_id, trial.pk)
+        if tally.pk is None or trial.private or trial.hide:
+            TrialRanking.objects.filter(trial=trial).delete()
+            return
+        ranking = TrialRanking.objects.get_or_create(trial=trial)[0]
+        ranking.score = tally.score
+        ranking.hotness = TrialRanking.hotness_of(tally.score, trial.created)
+        ranking.save()
+        return
+
+    @staticmethod
+    def rebuild():
+        """
+        Recompute the ranking of every listed trial.
+
+        Return: int, the number of ranked trials
+        Exceptions: None
+        """
+        from django.contrib.contenttypes.models import ContentType
+        from rm.suffrage.models import VoteTally
+
+        voted = VoteTally.objects.filter(
+            content_type=ContentType.objects.get_for_model(Trial)).values('object_id')
+        trials = TrialRanking.listed().filter(pk__in=voted).with_votes()
+        rankings = [
+            TrialRanking(trial_id=pk, score=score,
+                         hotness=TrialRanking.hotness_of(score, created))
+            for pk, created, score in trials.values_list('pk', 'created', 'vote_score')]
+        with transaction.commit_on_success():
+            TrialRanking.objects.all().delete()
+            TrialRanking.objects.bulk_create(rankings)
+        return len(rankings)
+
+
+class SearchTerm(models.Model):
+    """
+    An entry in the search index: TERM appears in TRIAL, with WEIGHT
+    depending on where. Maintained by rm.trials.search.
+    """
+    term   = models.CharField(max_length=search.MAX_TERM)
+    trial  = models.ForeignKey(Trial)
+    weight = models.IntegerField(default=1)
+
+    class Meta:
+        unique_together = (('term', 'trial'),)
+
+    def __unicode__(self):
+        return u'{0}: {1} ({2})'.format(self.term, self.trial_id, self.weight)
+
+
+class ScheduledMessage(models.Model):
+    """
+    An email to a participant that isn't due yet: a reminder to report
+    on an N=1 trial, or instructions delivered some hours after they
+    joined.
+
+    Rather than a countdown task per message sitting in the broker (and
+    in the workers' memory) until it's due, we keep them here and sweep
+    up those that are due every few minutes.
+    """
+    REMINDER     = 're'
+    INSTRUCTIONS = 'in'
+    KIND_CHOICES = (
+        (REMINDER,     'Reminder to report'),
+        (INSTRUCTIONS, 'Instructions'),
+        )
+    LEASE = datetime.timedelta(minutes=10)
+    SWEEP_BATCH = 200
+
+    kind        = models.CharField(max_length=2, choices=KIND_CHOICES)
+    due         = models.DateTimeField(db_index=True)
+    participant = models.ForeignKey(Participant)
+    report      = models.ForeignKey(Report, blank=True, null=True)
+    claim       = models.CharField(max_length=32, blank=True)
+
+    def __unicode__(self):
+        return u'{0} for {1} at {2}'.format(self.get_kind_display(), self.participant_id, self.due)
+
+    @staticmethod
+    def remind(report, due):
+        """
+        Remind the participant of REPORT to fill it in at DUE, unless
+        they have by then. A report only gets the one reminder, so
+        asking again just moves it.
+
+        Return: None
+        Exceptions: None
+        """
+        pending = ScheduledMessage.objects.filter(kind=ScheduledMessage.REMINDER, report=report)
+        if not pending.update(due=due, claim=''):
+            ScheduledMessage(kind=ScheduledMessage.REMINDER, due=due, report=report,
+                             participant_id=report.participant_id).save()
+        return
+
+    @staticmethod
+    def instruct(participant, due):
+        """
+        Email PARTICIPANT their instructions at DUE.
+
+        Return: None
+        Exceptions: None
+        """
+        ScheduledMessage(kind=ScheduledMessage.INSTRUCTIONS, due=due,
+                         participant=participant).save()
+        return
+
+    @staticmethod
+    def claim_due(size, now=None):
+        """
+        Claim up to SIZE messages that are due.
+
+        The claim is a conditional update, so two sweepers can never
+        claim the same message, and lasts for LEASE in case the one
+        that claimed it dies.
+
+        Return: list of ScheduledMessage
+        Exceptions: None
+        """
+        now = now or timezone.now()
+        due = ScheduledMessage.objects.filter(due__lte=now)
+        pks = list(due.order_by('due', 'pk').values_list('pk', flat=True)[:size])
+        if not pks:
+            return []
+        token = uuid.uuid4().hex
+        due.filter(pk__in=pks).update(claim=token, due=now + ScheduledMessage.LEASE)
+        return list(ScheduledMessage.objects.filter(pk__in=pks, claim=token).select_related(
+                'participant', 'report__group', 'report__trial', 'report__participant__user'))
+
+    @staticmethod
+    def send_all(messages):
+        """
+        Send MESSAGES. Instructions for the same trial go out together.
+
+        A message that can't be sent is logged rather than retried:
+        retrying delivery is the outbox's job, so what's left is
+        something wrong with the message itself.
+
+        Return: None
+        Exceptions: None
+        """
+        instructions = collections.defaultdict(list)
+        for message in messages:
+            if message.kind == ScheduledMessage.INSTRUCTIONS:
+                instructions[message.participant.trial_id].append(message.participant_id)
+                continue
             try:
-                chi2, pval, dof, expected = scistats.chi2_contingency(obs)
-            except ValueError:
-                exc = traceback.format_exc()
-                class Message(letter.Letter):
-                    Postie = POSTIE
-                    From = 'chisquare@randomiseme.org'
-                    To = 'david@deadpansincerity.com'
-                    Subject = 'Chi2 failure instance'
-                    Body = "Couldn't run chi2 for {0}\n\n{1}".format(str(obs), exc)
-                try:
-                    Message.send()
-                except:
-                    print exc
+                if message.report.date is None:
+                    message.report.send_reminder()
+            except Exception:
+                logger.exception('Could not send the reminder for report %s', message.report_id)
+        for trial in Trial.objects.filter(pk__in=instructions.keys()):
+            try:
+                mailing.instructions(trial, instructions[trial.pk])
+            except Exception:
+                logger.exception('Could not send instructions for trial %s', trial.pk)
+        return
 
-                pval = None
+    @staticmethod
+    def sweep(batch_size=SWEEP_BATCH, now=None):
+        """
+        Send every message that's due, BATCH_SIZE at a time.
 
-        else:
-            tstat, pval, df = ttest_ind(pointsa, pointsb)
-
-
-        tr.power_small=small
-        tr.power_med=med
-        tr.power_large=large
-        tr.sd=sd
-        tr.mean=mean
-        tr.nobsa = nobsa
-        tr.nobsb = nobsb
-        tr.meana = meana
-        tr.meanb = meanb
-        tr.stderrmeana = stderrmeana
-        tr.stderrmeanb = stderrmeanb
-        tr.pval = pval
-
-        tr.save()
+        Return: int, the number of messages sent
+        Exceptions: None
+        """
+        swept = 0
+        while True:
+            messages = ScheduledMessage.claim_due(batch_size, now)
+            if not messages:
+                break
+            ScheduledMessage.send_all(messages)
+            ScheduledMessage.objects.filter(pk__in=[m.pk for m in messages]).delete()
+            swept += len(messages)
+        return swept
+
+
+def rank_voted_trial(sender, object_id, **kw):
+    """
+    Re-rank a trial once someone has voted on it.
+
+    Return: None
+    Exceptions: None
+    """
+    try:
+        trial = Trial.objects.get(pk=object_id)
+    except Trial.DoesNotExist:
         return
+    TrialRanking.update(trial)
+    return
+
+vote_cast.connect(rank_voted_trial, sender=Trial)
@@ -0,0 +1,91 @@
+"""
+Allocation of participants to trial groups.
+
+Allocations are computed in memory from a seeded RNG, so that given
+the seed and the participants (in primary key order) anyone can
+reproduce who went where.
+"""
+import random
+
+# Keep pk__in lists under SQLite's limit on query parameters.
+UPDATE_BATCH = 500
+
+_seeds = random.SystemRandom()
+
+
+def new_seed():
+    """
+    Return a fresh seed suitable for storing alongside a trial.
+
+    Return: int
+    Exceptions: None
+    """
+    return _seeds.randint(0, 2 ** 63 - 1)
+
+
+def allocate(pks, groups, seed):
+    """
+    Allocate each of PKS to one of GROUPS using an RNG seeded with SEED.
+
+    Arguments:
+    - `pks`: sequence of participant primary keys, in a stable order
+    - `groups`: sequence of groups
+    - `seed`: int
+
+    Return: dict of group -> list of pks
+    Exceptions: None
+    """
+    rng = random.Random(seed)
+    allocation = dict((group, []) for group in groups)
+    for pk in pks:
+        allocation[rng.choice(groups)].append(pk)
+    return allocation
+
+
+def write(queryset, allocation):
+    """
+    Write ALLOCATION to the participants in QUERYSET.
+
+    We issue one UPDATE per group (per UPDATE_BATCH participants), rather
+    than saving each participant in turn. Callers should wrap this in a
+    transaction.
+
+    Arguments:
+    - `queryset`: QuerySet of Participants
+    - `allocation`: dict of group -> list of pks
+
+    Return: None
+    Exceptions: None
+    """
+    for group, pks in allocation.items():
+        for i in range(0, len(pks), UPDATE_BATCH):
+            queryset.filter(pk__in=pks[i:i + UPDATE_BATCH]).update(group=group)
+    return
+
+
+def permuted_blocks(seed, blocks, names, block_size):
+    """
+    Return a permuted-block allocation sequence of BLOCKS blocks as a
+    string with one group name per slot.
+
+    Each block holds BLOCK_SIZE slots, split evenly between NAMES and
+    shuffled, so group sizes never drift apart by more than half a
+    block. The same SEED always gives the same sequence, and a longer
+    sequence starts with the shorter one.
+
+    Arguments:
+    - `seed`: int
+    - `blocks`: int
+    - `names`: sequence of single character group names
+    - `block_size`: int, a multiple of len(NAMES)
+
+    Return: str
+    Exceptions: None
+    """
+    rng = random.Random(seed)
+    sequence = []
+    for i in range(blocks):
+        block = list(names) * (block_size // len(names))
+        rng.shuffle(block)
+        sequence.extend(block)
+    return ''.join(sequence)
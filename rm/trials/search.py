@@ -0,0 +1,195 @@
+"""
+Full text search over trials.
+
+We keep an inverted index in the SearchTerm table: one row per
+(term, trial), weighted by where in the trial the term appears. Only
+trials that anyone may see are indexed, so a search can never turn up
+a private or hidden trial.
+
+Searching ranks trials by how many of the query's terms they contain,
+then by the total weight of those terms, and works a page at a time.
+"""
+import collections
+import re
+
+from django.db.models import Count, Sum
+
+WORD = re.compile(r'\w+', re.UNICODE)
+MAX_TERM = 50
+STOPWORDS = frozenset("""
+a an and are as at be but by do does for from has have how i if in is it
+its me my no not of on or our so than that the their them then there they
+this to was we were what when which who will with you your
+""".split())
+
+FIELDS = (
+    ('title',       5),
+    ('group_a',     2),
+    ('group_b',     2),
+    ('description', 1),
+    )
+QUESTION_WEIGHT = 2
+PAGE_SIZE = 20
+REBUILD_BATCH = 500
+
+
+def tokenise(text):
+    """
+    Return the searchable terms in TEXT, in order.
+
+    Return: list of unicode
+    Exceptions: None
+    """
+    if not text:
+        return []
+    return [word[:MAX_TERM] for word in WORD.findall(text.lower())
+            if len(word) > 1 and word not in STOPWORDS]
+
+
+def listed(trial):
+    """
+    Predicate function to determine whether TRIAL belongs in the index.
+
+    Return: bool
+    Exceptions: None
+    """
+    return not (trial.private or trial.hide)
+
+
+def terms(trial, questions=None):
+    """
+    Return the weight of each term in TRIAL, whose variables ask
+    QUESTIONS. We look the questions up if they aren't given.
+
+    Return: Counter of term -> weight
+    Exceptions: None
+    """
+    if questions is None:
+        questions = trial.variable_set.values_list('question', flat=True)
+    weights = collections.Counter()
+    for field, weight in FIELDS:
+        for term in tokenise(getattr(trial, field)):
+            weights[term] += weight
+    for question in questions:
+        for term in tokenise(question):
+            weights[term] += QUESTION_WEIGHT
+    return weights
+
+
+def index(trial):
+    """
+    Replace TRIAL's entries in the index, removing them altogether if
+    it shouldn't be listed.
+
+    We don't start a transaction of our own, so that we're part of the
+    caller's if they have one.
+
+    Return: None
+    Exceptions: None
+    """
+    from rm.trials.models import SearchTerm
+
+    SearchTerm.objects.filter(trial=trial).delete()
+    if not listed(trial):
+        return
+    SearchTerm.objects.bulk_create([
+            SearchTerm(term=term, trial_id=trial.pk, weight=weight)
+            for term, weight in terms(trial).items()])
+    return
+
+
+def entries(trials):
+    """
+    Generator yielding unsaved index entries for each of TRIALS, with
+    one query for all of their variables' questions.
+    """
+    from rm.trials.models import SearchTerm, Variable
+
+    questions = collections.defaultdict(list)
+    for trial_id, question in Variable.objects.filter(trial__in=trials).values_list(
+        'trial', 'question'):
+        questions[trial_id].append(question)
+    for trial in trials:
+        for term, weight in terms(trial, questions[trial.pk]).items():
+            yield SearchTerm(term=term, trial_id=trial.pk, weight=weight)
+
+
+def rebuild():
+    """
+    Rebuild the whole index from scratch.
+
+    Return: int, the number of trials indexed
+    Exceptions: None
+    """
+    from django.db import transaction
+    from rm.trials.ingest import chunked
+    from rm.trials.models import SearchTerm, Trial
+
+    fields = ['pk', 'private', 'hide'] + [field for field, _ in FIELDS]
+    trials = Trial.objects.filter(private=False).exclude(hide=True).only(*fields)
+    count = 0
+    with transaction.commit_on_success():
+        SearchTerm.objects.all().delete()
+        for chunk in chunked(trials.iterator(), REBUILD_BATCH):
+            SearchTerm.objects.bulk_create(list(entries(chunk)))
+            count += len(chunk)
+    return count
+
+
+class Results(object):
+    """
+    The trials matching a query, best first.
+
+    Behaves enough like a queryset for the paginator: counting costs
+    one query, and each slice one query for the ranking and one for
+    the trials themselves.
+    """
+    def __init__(self, query):
+        from rm.trials.models import SearchTerm
+
+        self.query = query
+        self.terms = sorted(set(tokenise(query)))
+        self.matches = SearchTerm.objects.filter(term__in=self.terms)
+
+    def count(self):
+        if not self.terms:
+            return 0
+        return self.matches.values('trial').distinct().count()
+
+    def __len__(self):
+        return self.count()
+
+    def ranked(self):
+        """
+        Return a queryset of trial ids with their hits and score,
+        best first.
+
+        Return: Queryset
+        Exceptions: None
+        """
+        return self.matches.values('trial').annotate(
+            hits=Count('pk'), score=Sum('weight')).order_by('-hits', '-score', '-trial')
+
+    def __getitem__(self, key):
+        from rm.trials.models import Trial
+
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        if not self.terms:
+            return []
+        pks = [row['trial'] for row in self.ranked()[key]]
+        trials = Trial.objects.filter(pk__in=pks).with_votes().in_bulk(pks)
+        return [trials[pk] for pk in pks if pk in trials]
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+def search(query):
+    """
+    Return the trials matching QUERY, best first.
+
+    Return: Results
+    Exceptions: None
+    """
+    return Results(query)
@@ -4,6 +4,7 @@ Celery tasks for the trials package
 import datetime
 import time
 from celery import task
+from celery.task import periodic_task
 
 from rm import exceptions
 
@@ -38,6 +39,9 @@ def instruct_later(participant_pk):
     """
     Email instructions to participants of trials that specified that
     this should be done X hours after randomisation
+
+    Nothing queues this any more - see send_due_messages - but tasks
+    already waiting in the broker still need it.
     """
     from rm.trials import models
 
@@ -45,6 +49,44 @@ def instruct_later(participant_pk):
     participant.send_instructions()
     return True
 
+@task
+def send_instructions(trial_pk, participant_pks=None):
+    """
+    Email the participants of a trial (or just those in PARTICIPANT_PKS)
+    their instructions.
+
+    Return: int, the number of messages sent
+    Exceptions: None
+    """
+    from rm.trials import mailing
+    from rm.trials.models import Trial
+    return mailing.instructions(Trial.objects.get(pk=trial_pk), participant_pks)
+
+@task
+def send_ended_notifications(trial_pk):
+    """
+    Tell the participants of a trial that it has ended.
+
+    Return: int, the number of messages sent
+    Exceptions: None
+    """
+    from rm.trials import mailing
+    from rm.trials.models import Trial
+    return mailing.ended(Trial.objects.get(pk=trial_pk))
+
+@task
+def send_invitations(trial_pk):
+    """
+    Email everyone invited to a trial who hasn't had their invitation
+    yet.
+
+    Return: int, the number of messages sent
+    Exceptions: None
+    """
+    from rm.trials import mailing
+    from rm.trials.models import Trial
+    return mailing.invitations(Trial.objects.get(pk=trial_pk))
+
 @task
 def close_dated_trials():
     """
@@ -64,6 +106,9 @@ def randomise_me_reminder(pk):
     Given the PK of a report, send the user a reminder if it
     still has no data left.
 
+    Nothing queues this any more - see send_due_messages - but tasks
+    already waiting in the broker still need it.
+
 
     Arguments:
     - `pk`: int
@@ -76,3 +121,26 @@ def randomise_me_reminder(pk):
     if report.date is None:
         report.send_reminder()
     return
+
+@periodic_task(run_every=datetime.timedelta(minutes=5))
+def send_due_messages():
+    """
+    Send the reminders and delayed instructions that have come due.
+
+    Return: int, the number of messages sent
+    Exceptions: None
+    """
+    from rm.trials.models import ScheduledMessage
+    return ScheduledMessage.sweep()
+
+@periodic_task(run_every=datetime.timedelta(days=1))
+def rank_trials():
+    """
+    Recompute the hot trial rankings. Votes keep them up to date, so
+    this only repairs anything that has drifted.
+
+    Return: int, the number of ranked trials
+    Exceptions: None
+    """
+    from rm.trials.models import TrialRanking
+    return TrialRanking.rebuild()
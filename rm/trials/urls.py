@@ -9,6 +9,7 @@ from rm.trials.views import (MyTrials, TrialCreateLanding,
                              EditTrial, TrialQuestion, StopTrial,
                              ToggleTrialPublicityView,
                              LeaveTrial, PeekTrial, InviteTrial,
+                             BulkInviteTrial, InvitationProgress,
                              ReproduceTrial, TrialAsCsvView,
                              AllTrials, FeaturedTrialsList,
                              ActiveTrialsView, PastTrialsView)
@@ -34,6 +35,9 @@ urlpatterns = patterns(
     url(r'(?P<pk>\d+)/toggle-publicity$', ToggleTrialPublicityView.as_view(),
         name='trial-toggle-public'),
     url(r'(?P<pk>\d+)/invite$', InviteTrial.as_view(), name='trial-invite'),
+    url(r'(?P<pk>\d+)/invite/bulk$', BulkInviteTrial.as_view(), name='trial-invite-bulk'),
+    url(r'(?P<pk>\d+)/invite/progress$', InvitationProgress.as_view(),
+        name='trial-invite-progress'),
     url(r'(?P<pk>\d+)/peek$', PeekTrial.as_view(), name='trial-peek'),
     url(r'(?P<pk>\d+)/leave$', LeaveTrial.as_view(), name='leave-trial'),
     url(r'(?P<pk>\d+)/reproduce$', ReproduceTrial.as_view(),
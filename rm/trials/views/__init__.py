@@ -13,20 +13,23 @@ from django.contrib.auth.decorators import login_required
 from django.forms.formsets import all_valid
 from django.forms.models import inlineformset_factory
 from django.http import (HttpResponse, HttpResponseRedirect, HttpResponseForbidden,
-                         HttpResponseBadRequest)
+                         HttpResponseBadRequest, StreamingHttpResponse, Http404)
 from django.utils.decorators import method_decorator
+from django.utils import timezone
 from django.views.generic import DetailView, TemplateView, View, ListView
 from django.views.generic.edit import CreateView, BaseCreateView, UpdateView, FormView
 from extra_views import CreateWithInlinesView, InlineFormSet
 from extra_views import NamedFormsetsMixin, ModelFormSetView
 from extra_views.advanced import BaseCreateWithInlinesView
-import ffs
 from letter.contrib.contact import ContactView
 
 from rm import exceptions
-from rm.http import JsonResponse, LoginRequiredMixin, serve_maybe
-from rm.trials.forms import (TrialForm, VariableForm, N1TrialForm, TutorialForm)
-from rm.trials.models import Trial, Report, Variable, Invitation, TutorialExample
+from rm.http import Download, JsonResponse, LoginRequiredMixin, serve_maybe
+from rm.trials import export, exportcache, ingest, keyset, search, tasks
+from rm.trials.forms import (TrialForm, VariableForm, N1TrialForm, TutorialForm,
+                             BulkInvitationForm)
+from rm.trials.models import (Trial, Report, Variable, Invitation, TutorialExample,
+                              ScheduledMessage)
 from rm.trials.utils import n1_with_sane_defaults
 from rm.userprofiles.models import RMUser
 from rm.userprofiles.utils import sign_me_up
@@ -153,7 +156,7 @@ class ReportView(CreateView):
 
         # Checking for closing criteria
         if self.trial.ending_style == self.trial.REPORT_NUM:
-            if self.trial.report_set.count() >= self.trial.ending_reports:
+            if report.trial.report_count >= self.trial.ending_reports:
                 self.trial.stop()
 
         return HttpResponseRedirect(self.trial.get_absolute_url())
@@ -567,6 +570,48 @@ class InviteTrial(View):
         return HttpResponseForbidden('NO')
 
 
+class BulkInviteTrial(TrialByPkMixin, OwnsTrialMixin, FormView):
+    """
+    Invite a whole list of people to an invitation only trial at once.
+
+    The invitations are sent in the background: we reply with how many
+    we'll send, and where to follow their progress.
+    """
+    form_class = BulkInvitationForm
+    http_method_names = ['post']
+
+    def form_invalid(self, form):
+        """
+        Handle a badly constructed request.
+        """
+        return JsonResponse(form.errors, status=400)
+
+    def form_valid(self, form):
+        """
+        Add the invitations, and queue them to be sent.
+        """
+        if self.trial.recruitment != self.trial.INVITATION:
+            return HttpResponseForbidden('NO')
+        try:
+            invited = ingest.invitations(self.trial, form.lines())
+        except exceptions.TooManyInvitationsError as err:
+            return JsonResponse(
+                "We can only invite {0} people at a time".format(err.args[0]), status=400)
+        if invited.invited:
+            tasks.send_invitations.delay(self.trial.pk)
+        return JsonResponse(dict(
+                invited._asdict(),
+                progress=reverse('trial-invite-progress', kwargs={'pk': self.trial.pk})))
+
+
+class InvitationProgress(TrialByPkMixin, OwnsTrialMixin, View):
+    """
+    How far we've got with sending a trial's invitations.
+    """
+    def get(self, *args, **kw):
+        return JsonResponse(Invitation.progress(self.trial))
+
+
 class StopTrial(TrialByPkMixin, OwnsTrialMixin, View):
 
     def get(self, *args, **kw):
@@ -685,30 +730,49 @@ class LeaveTrial(LoginRequiredMixin, TemplateView):
 class TrialAsCsvView(View):
     """
     Download the trial's raw data as a csv.
+
+    Pass ?format=ndjson for newline delimited JSON instead, and
+    ?compress=gzip to have the download gzipped.
+
+    Stopped trials are served from the export cache when we can.
     """
 
-    @serve_maybe
     def get(self, request, pk):
         """
-        We want to serve a CSV of this trial's raw data!
+        We want to stream this trial's raw data!
 
-        Return: str
+        Return: HttpResponse
         Exceptions: None
         """
+        format = request.GET.get('format', export.CSV)
+        compress = request.GET.get('compress') == 'gzip'
+        if format not in export.FORMATS:
+            return HttpResponseBadRequest('Unknown format')
+        name = export.filename('reports', format, compress)
+        download = export.filename('trial-{0}'.format(pk), format, compress)
+
+        cached = exportcache.lookup(pk, name)
+        if cached:
+            return self.serve_cached(cached, download)
+
         trial = Trial.objects.get(pk=pk)
-        rows = [
-            (report.group.name, report.date.isoformat(), report.get_value())
-            for report in trial.report_set.exclude(date__isnull=True)
-            ]
+        resp = StreamingHttpResponse(
+            export.encode(export.REPORT_FIELDS, export.report_rows(trial),
+                          format=format, compress=compress),
+            content_type=export.content_type(format, compress))
+        resp['Content-Disposition'] = 'attachment; filename={0}'.format(download)
+        return resp
+
+    @serve_maybe
+    def serve_cached(self, cached, name):
+        """
+        Hand off a cached export.
 
-        raw = ffs.Path.newfile()
-        with raw.csv() as csv:
-            csv.writerows([[
-                    'group',
-                    'date',
-                    'value'
-                    ]] + rows)
-        return raw
+        Return: Download
+        Exceptions: None
+        """
+        path, etag = cached
+        return Download(path, etag=etag, name=name)
 
 
 # Views for trial discovery - lists, featured, etc.
@@ -720,57 +784,163 @@ class AllTrials(TemplateView):
     template_name = 'trials/browse.html'
 
 
-class ActiveTrialsView(ListView):
+class KeysetListMixin(object):
+    """
+    Page through a list of trials by cursor rather than page number,
+    newest first, and render the page as JSON if asked for
+    ?format=json.
+
+    Every page costs the same single query however many trials
+    there are.
+    """
+    keys = ('created', 'pk')
+    paginate_by = keyset.PAGE_SIZE
+
+    def get_keys(self):
+        """
+        Return the fields we sort by, descending.
+
+        Return: tuple
+        Exceptions: None
+        """
+        return self.keys
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Return the page after the cursor in our GET params.
+
+        Return: (None, keyset.Page, list, bool)
+        Exceptions: Http404 for a bad cursor
+        """
+        try:
+            page = keyset.page(queryset, self.get_keys(),
+                               cursor=self.request.GET.get('cursor'), size=page_size)
+        except exceptions.InvalidCursorError:
+            raise Http404
+        return None, page, page.object_list, page.has_next() or bool(page.cursor)
+
+    def next_url(self, page):
+        """
+        Return the url of the page after PAGE, or None.
+
+        Return: str or None
+        Exceptions: None
+        """
+        if not page.has_next():
+            return None
+        params = self.request.GET.copy()
+        params['cursor'] = page.next_cursor
+        return '{0}?{1}'.format(self.request.path, params.urlencode())
+
+    def get_context_data(self, **kwargs):
+        context = super(KeysetListMixin, self).get_context_data(**kwargs)
+        context['next_url'] = self.next_url(context['page_obj'])
+        return context
+
+    def render_to_response(self, context, **kwargs):
+        if self.request.GET.get('format') != 'json':
+            return super(KeysetListMixin, self).render_to_response(context, **kwargs)
+        return JsonResponse(dict(
+                trials=[trial.to_json() for trial in context['object_list']],
+                next=context['next_url']))
+
+
+class HotOrderMixin(object):
+    """
+    Order a list of trials by how hot they are if asked for ?order=hot.
+    """
+    def hot(self):
+        return self.request.GET.get('order') == 'hot'
+
+    def get_keys(self):
+        if self.hot():
+            return ('ranking__hotness', 'pk')
+        return super(HotOrderMixin, self).get_keys()
+
+    def get_queryset(self):
+        trials = super(HotOrderMixin, self).get_queryset()
+        if self.hot():
+            trials = trials.hot().select_related('ranking')
+        return trials
+
+
+class ActiveTrialsView(HotOrderMixin, KeysetListMixin, ListView):
     """
     All active Trials
     """
-    queryset = Trial.objects.filter(
-        private=False,
-        stopped=False).exclude(hide=True).order_by('-created')
     context_object_name = 'trials'
     template_name = 'trials/active_trial_list.html'
 
+    def get_queryset(self):
+        return Trial.objects.filter(
+            private=False,
+            stopped=False).exclude(hide=True).with_votes()
+
 
-class PastTrialsView(ListView):
+class PastTrialsView(HotOrderMixin, KeysetListMixin, ListView):
     """
     All past trials
     """
-    queryset = Trial.objects.filter(
-        stopped=True, private=False).exclude(
-        hide=True).order_by(
-        '-created')
     context_object_name = 'trials'
     template_name = 'trials/past_trial_list.html'
 
+    def get_queryset(self):
+        return Trial.objects.filter(
+            stopped=True, private=False).exclude(
+            hide=True).with_votes()
+
 
-class FeaturedTrialsList(ListView):
+class FeaturedTrialsList(KeysetListMixin, ListView):
     """
     This is the list view for featured Trials - an editorially
     decided subset of all trials.
     """
-    queryset            = Trial.objects.filter(featured=True, private=False)
     context_object_name = 'trials'
     template_name       = 'trials/featured_trial_list.html'
 
+    def get_queryset(self):
+        return Trial.objects.filter(featured=True, private=False).with_votes()
+
 
-class TrialSearchView(ListView):
+class TrialSearchView(KeysetListMixin, ListView):
     """
     Called from the search bar in the top right corner.
+
+    Search results are ranked rather than sorted by date, so we page
+    through those by number instead of by cursor.
     """
     context_object_name = 'trials'
     template_name = 'trials/search_results_list.html'
+    paginate_by = search.PAGE_SIZE
+
+    def paginate_queryset(self, queryset, page_size):
+        if isinstance(queryset, search.Results):
+            return ListView.paginate_queryset(self, queryset, page_size)
+        return super(TrialSearchView, self).paginate_queryset(queryset, page_size)
+
+    def next_url(self, page):
+        if isinstance(page, keyset.Page):
+            return super(TrialSearchView, self).next_url(page)
+        if not page.has_next():
+            return None
+        params = self.request.GET.copy()
+        params['page'] = page.next_page_number()
+        return '{0}?{1}'.format(self.request.path, params.urlencode())
 
     def get_queryset(self):
         """
         Return our queryset please.
 
-        Return: Queryset
+        With no query, that's the listed trials, newest first, otherwise the
+        matches from the search index, best first.
+
+        Return: Queryset or search.Results
         Exceptions: None
         """
         q = self.request.GET.get('q', '')
-        if not q:
-            return Trial.objects.all()
-        return Trial.objects.filter(title__icontains=q)
+        if not q.strip():
+            return Trial.objects.filter(private=False).exclude(hide=True).with_votes()
+        return search.search(q)
 
 
 class RandomiseMeView(TrialByPkMixin, LoginRequiredMixin, View):
@@ -795,9 +965,8 @@ class RandomiseMeView(TrialByPkMixin, LoginRequiredMixin, View):
             variable=self.trial.variable_set.all()[0])[0]
         report.group = group
         report.save()
-        from rm.trials.tasks import randomise_me_reminder
-        randomise_me_reminder.apply_async(args=[report.pk],
-                                          countdown=settings.RM_REMINDER_DELAY)
+        ScheduledMessage.remind(
+            report, timezone.now() + datetime.timedelta(seconds=settings.RM_REMINDER_DELAY))
         return HttpResponse(group.name.lower())
 
 
@@ -1,17 +1,16 @@
 """
 Views related to offline trials.
 """
-import re
-
 from django.http import HttpResponseRedirect
 from django.views.generic import View, FormView
 import ffs
-from ffs.formats import CSV
 
-from rm.http import LoginRequiredMixin, JsonResponse, serve_maybe
+from rm import exceptions
+from rm.http import Download, LoginRequiredMixin, JsonResponse, serve_maybe
+from rm.trials import export, exportcache, ingest
 from rm.trials.forms import (OfflineTrialForm, OfflineParticipantsForm,
                              OfflineResultsForm)
-from rm.trials.models import Trial, Variable, Participant, Report
+from rm.trials.models import Trial, Variable
 from rm.trials.views import TrialByPkMixin, OwnsTrialMixin
 
 class CreateOfflineTrialView(LoginRequiredMixin, FormView):
@@ -70,17 +69,11 @@ class UploadOfflineParticipantsView(TrialByPkMixin, OwnsTrialMixin, FormView):
         """
         Handle the uploaded participants.
         """
-        participant_list = [l.strip()
-                            for l in
-                            form.cleaned_data['participants'].readlines()]
-        if not all(re.match(r'^[a-zA-Z0-9_]+$', part)
-                   for part in participant_list):
+        try:
+            ingest.participants(self.trial, form.cleaned_data['participants'])
+        except exceptions.InvalidIdentifierError:
             return JsonResponse('Your participant identifiers are not ^[a-zA-Z0-9_]+$', status=401)
 
-        for part in participant_list:
-            participant = Participant(identifier=part, trial=self.trial)
-            participant.randomise()
-
         return JsonResponse(True)
 
 
@@ -102,39 +95,10 @@ class UploadOfflineResultsView(TrialByPkMixin, OwnsTrialMixin, FormView):
         """
         Handle the uploaded results.
         """
-        csv = [r.strip().split(',')
-               for r in form.cleaned_data['results'].readlines()]
-        if csv[0] == ['identifier', 'group', 'result']:
-            csv = csv[1:]
         try:
-            for identifier, group, result in csv:
-                try:
-                    participant = Participant.objects.get(
-                        identifier=identifier,
-                        trial=self.trial
-                        )
-                    variable = self.trial.variable_set.get()
-                    report = Report(trial=self.trial,
-                                    participant=participant,
-                                    variable=variable,
-                                    group=participant.group)
-                    if variable.style == Variable.SCORE:
-                        report.score = int(result)
-                    elif variable.style == Variable.COUNT:
-                        report.score = float(count)
-                    elif variable.style == Variable.BINARY:
-                        report.binary = bool(result)
-
-                    report.save()
-
-                except Participant.DoesNotExist:
-                    return JsonResponse('No participant {0}'.format(identifier),
-                                        status=401)
-                except Exception as err:
-                    raise
-        except ValueError:
-            err = "We couldn't find an identifier, group and result for every row :("
-            return JsonResponse(err, status=401)
+            ingest.results(self.trial, form.cleaned_data['results'])
+        except exceptions.InvalidResultsError as err:
+            return JsonResponse(err.args[0], status=401)
 
         self.trial.stop()
         return JsonResponse(True)
@@ -150,13 +114,15 @@ class DownloadOfflineParticipantsView(TrialByPkMixin, OwnsTrialMixin, View):
         """
         Serve a CSV of this trial's grouped participants
         """
-        rows = [['identifier', 'group', 'result']]
-        rows += [
-            (participant.identifier, participant.group, '')
-            for participant in self.trial.participant_set.all()
-            ]
+        name = export.filename('participants')
+        cached = exportcache.lookup(self.trial.pk, name)
+        if cached:
+            path, etag = cached
+            return Download(path, etag=etag, name=name)
 
         raw = ffs.Path.newfile()
-        with raw.csv() as csv:
-            csv.writerows(rows)
+        with open(str(raw), 'wb') as fh:
+            for line in export.encode(export.PARTICIPANT_FIELDS,
+                                      export.participant_rows(self.trial)):
+                fh.write(line)
         return raw
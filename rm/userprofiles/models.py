@@ -133,14 +133,14 @@ won't send you any more.
 
     def send_message(self, message):
         """
-        Given a letter.Letter subclass representing our email,
-        send the message.
+        Given a letter.Letter subclass or Django EmailMessage
+        representing our email, send the message.
 
         This api allows us to respect user preferences re. us
         not spamming them
 
         Arguments:
-        - `message`: letter.Letter
+        - `message`: letter.Letter or EmailMessage
 
         Return: none
         Exceptions: none
@@ -0,0 +1,110 @@
+"""
+Per-user caching of dashboard fragments.
+
+Each user has a data version in the cache. Fragments are cached under
+keys that include it, so bumping the version - whenever something that
+appears on their dashboard changes - makes every fragment for that user
+miss at once, without our having to know which ones it affected.
+
+The cache itself is the DASHBOARD_CACHE alias in CACHES. It needs to be
+one that all our processes share, or a bump in one won't be seen by
+the others.
+"""
+import functools
+import uuid
+
+from django.conf import settings
+from django.core.cache import get_cache
+from django.template.loader import render_to_string
+
+VERSION_TIMEOUT = 30 * 86400
+
+
+def _cache():
+    return get_cache(settings.DASHBOARD_CACHE)
+
+
+def _version_key(user_pk):
+    return 'dashboard-version:{0}'.format(user_pk)
+
+
+def _pk(user):
+    return getattr(user, 'pk', user)
+
+
+def version(user):
+    """
+    Return the current data version of USER, starting one if they
+    haven't got one.
+
+    Return: str
+    Exceptions: None
+    """
+    cache = _cache()
+    key = _version_key(_pk(user))
+    current = cache.get(key)
+    if current is None:
+        cache.add(key, uuid.uuid4().hex, VERSION_TIMEOUT)
+        current = cache.get(key)
+    return current
+
+
+def bump(*users):
+    """
+    Give each of USERS (instances or primary keys, Nones are ignored)
+    a new data version, invalidating their cached fragments.
+
+    Return: None
+    Exceptions: None
+    """
+    pks = set(_pk(user) for user in users) - set([None])
+    if pks:
+        _cache().set_many(dict((_version_key(pk), uuid.uuid4().hex) for pk in pks),
+                          VERSION_TIMEOUT)
+    return
+
+
+def cached(request, name, build):
+    """
+    Return the value of the fragment NAME for the user making REQUEST
+    from the cache, or from calling BUILD (and caching it) if it's not
+    there.
+
+    We only look the user's version up once per request.
+
+    Return: object
+    Exceptions: None
+    """
+    user = request.user
+    if not user.is_authenticated():
+        return build()
+    if getattr(request, '_dashboard_version', None) is None:
+        request._dashboard_version = version(user)
+    cache = _cache()
+    key = 'dashboard:{0}:{1}:{2}'.format(name, user.pk, request._dashboard_version)
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, settings.DASHBOARD_CACHE_TIMEOUT)
+    return value
+
+
+def user_fragment(register, template_name):
+    """
+    Decorator registering a dashboard tag like an inclusion tag that
+    takes the context, except that the rendered fragment is cached
+    per user.
+
+    The decorated function should return the context for TEMPLATE_NAME.
+    """
+    def decorator(func):
+
+        @functools.wraps(func)
+        def render(context):
+            build = lambda: render_to_string(template_name, func(context))
+            return cached(context['request'], func.__name__, build)
+
+        register.simple_tag(takes_context=True)(render)
+        return render
+
+    return decorator
@@ -0,0 +1,76 @@
+"""
+Load everything the dashboard shows about a user in one go.
+
+The dashboard widgets all want slices of the same two lists - the
+trials a user owns and the trials they take part in - so we fetch each
+list once per request and let the widgets slice them in Python.
+"""
+from rm.trials.models import Trial
+
+
+class DashboardData(object):
+    """
+    The trials USER owns and takes part in, newest first.
+
+    Two queries, whichever widgets ask for what.
+    """
+    def __init__(self, user):
+        self.owned = list(Trial.objects.filter(owner=user).order_by('-created'))
+        self.participated = list(Trial.objects.filter(
+                participant__user=user).distinct().order_by('-created'))
+
+    @property
+    def virgin(self):
+        """
+        Has this user yet to make more than one trial?
+        """
+        return len(self.owned) <= 1
+
+    @property
+    def randomising_me(self):
+        """
+        Running trials that randomise this user: their own n=1 trials
+        and those they've joined.
+        """
+        seen, trials = set(), []
+        mine = [t for t in self.owned if t.n1trial]
+        for trial in mine + self.participated:
+            if trial.stopped or trial.pk in seen:
+                continue
+            seen.add(trial.pk)
+            trials.append(trial)
+        return trials
+
+    @property
+    def randomising_others(self):
+        """
+        Running trials this user owns that randomise other people.
+        """
+        return [t for t in self.owned if not t.stopped and not t.n1trial]
+
+    @property
+    def participated_over(self):
+        """
+        Finished trials this user took part in.
+        """
+        return [t for t in self.participated if t.stopped]
+
+    @property
+    def ran_over(self):
+        """
+        Finished trials this user ran for other people.
+        """
+        return [t for t in self.owned if t.stopped and not t.n1trial]
+
+
+def load(request):
+    """
+    Return the DashboardData for the user making REQUEST, loading it
+    the first time we're asked during the request.
+
+    Return: DashboardData
+    Exceptions: None
+    """
+    if getattr(request, '_dashboard_data', None) is None:
+        request._dashboard_data = DashboardData(request.user)
+    return request._dashboard_data
@@ -2,12 +2,12 @@
 Render the my trials table for a given user
 """
 import datetime
-import itertools
 
 from django import template
 from faq.models import Question
 
-from rm.trials.models import Trial, Participant, TutorialExample
+from rm.trials.models import Trial, TutorialExample
+from rm.widgets import fragments, loader
 
 td = datetime.date.today
 
@@ -21,13 +21,10 @@ def dashboard(context):
     Return: dict
     Exceptions: None
     """
-    user               = context['request'].user
-    my_trials = Trial.objects.filter(owner=user)
+    request            = context['request']
 
-    virgin = True
+    virgin = fragments.cached(request, 'virgin', lambda: loader.load(request).virgin)
     tutorial_prompt = True
-    if my_trials.count() > 1:
-        virgin = False
 
     context['virgin'] = virgin
     context['tutorial_prompt'] = tutorial_prompt
@@ -48,7 +45,7 @@ def featured_trials_full_widget(num):
     featured = Trial.objects.filter(featured=True)[:num]
     return dict(featured=featured)
 
-@register.inclusion_tag('dashboard/randomising_me_widget.html', takes_context=True)
+@fragments.user_fragment(register, 'dashboard/randomising_me_widget.html')
 def randomising_me_widget(context):
     """
     List of trials randomising this user
@@ -56,13 +53,7 @@ def randomising_me_widget(context):
     Return: dict
     Exceptions: None
     """
-    user               = context['request'].user
-    participated       = user.participant_set
-
-    randomising_me = set(list(itertools.chain(
-            Trial.objects.filter(owner=user, stopped=False, n1trial=True),
-            [p.trial for p in participated.filter(trial__stopped=False)]
-            )))
+    randomising_me = loader.load(context['request']).randomising_me
 
     num = len(randomising_me)
     if num > 0:
@@ -72,7 +63,7 @@ def randomising_me_widget(context):
     return dict(show=False)
 
 
-@register.inclusion_tag('dashboard/randomising_others_widget.html', takes_context=True)
+@fragments.user_fragment(register, 'dashboard/randomising_others_widget.html')
 def randomising_others_widget(context):
     """
     List of trials randomising this user
@@ -80,12 +71,11 @@ def randomising_others_widget(context):
     Return: dict
     Exceptions: None
     """
-    user               = context['request'].user
-    randomising_others = Trial.objects.filter(owner=user, stopped=False, n1trial=False)
+    randomising_others = loader.load(context['request']).randomising_others
 
-    if randomising_others.count() > 0:
+    if randomising_others:
         return dict(randomising_others=randomising_others, show=True,
-                    num=randomising_others.count())
+                    num=len(randomising_others))
     return dict(show=False)
 
 
@@ -174,11 +164,9 @@ def virgin_widget():
 def offline_soon_widget():
     return {}
 
-@register.inclusion_tag('dashboard/reports_part_widget.html', takes_context=True)
+@fragments.user_fragment(register, 'dashboard/reports_part_widget.html')
 def reports_part_widget(context):
-    user = context['request'].user
-    participated = user.participant_set
-    participated_over = [p.trial for p in participated.filter(trial__stopped=True)]
+    participated_over = loader.load(context['request']).participated_over
     num = len(participated_over)
     return dict(
         participated=participated_over,
@@ -186,11 +174,10 @@ def reports_part_widget(context):
         num=num
         )
 
-@register.inclusion_tag('dashboard/reports_ran_widget.html', takes_context=True)
+@fragments.user_fragment(register, 'dashboard/reports_ran_widget.html')
 def reports_ran_widget(context):
-    user = context['request'].user
-    over = Trial.objects.filter(owner=user, stopped=True, n1trial=False)
-    num = over.count()
+    over = loader.load(context['request']).ran_over
+    num = len(over)
     return dict(
         participated=over,
         show=num > 0,
@@ -202,10 +189,7 @@ def active_trials_widget(context):
     """
     Widget for active trials before we move to full page active trials.
     """
-    active = list(set(Trial.objects.filter(
-        private=False,
-        stopped=False,
-        votes__isnull=False).exclude(hide=True).order_by('-votes__val')))[:7]
+    active = Trial.objects.filter(stopped=False).hot().with_votes()[:7]
     return dict(active=active)
 
 @register.inclusion_tag('trials/widgets/past_trials_widget.html', takes_context=True)
@@ -213,11 +197,7 @@ def past_trials_widget(context):
     """
     Widget for past trials before we move to full page past trials.
     """
-    past = Trial.objects.filter(
-        stopped=True, private=False,
-        votes__isnull=False).exclude(
-        hide=True).order_by(
-        '-votes__val')[:7]
+    past = Trial.objects.filter(stopped=True).hot().with_votes()[:7]
     return dict(past=past)
 
 @register.inclusion_tag('trials/widgets/latest_trials_widget.html', takes_context=True)
@@ -229,5 +209,5 @@ def latest_trials_widget(context):
         offline=False,
         private=False).exclude(
         hide=True).order_by(
-        '-created')[:7]
+        '-created').with_votes()[:7]
     return dict(latest=latest)